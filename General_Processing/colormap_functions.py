@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+COLORTABLE REGISTRY
+
+- register_colortable()
+- read_cpt()
+- load_cpt()
+- get_colormap()
+
+CPT (GMT) colortables are parsed only once: all color lines are converted
+at once (RGB or HSV), saved as .npz files (in a "cache" folder next to the
+colortable) and turned into a colormap kept in memory. Colortables are
+requested by name (see COLORTABLES) or by path, so each figure only looks up
+a ready-made colormap, e.g.:
+
+    sys.path.insert(0, os.path.join(os.path.dirname(
+        os.path.abspath(__file__)), '..', 'General_Processing'))
+    from colormap_functions import get_colormap
+
+    cmap = get_colormap('IR4AVHRR6')
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import os
+import zipfile
+import hashlib
+
+import numpy as np
+from matplotlib.colors import LinearSegmentedColormap, hsv_to_rgb
+
+# Colortables folder and colortables known by name
+COLORTABLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'Data', 'GENERAL', 'colortables')
+COLORTABLES = {
+    'Square Root Visible Enhancement': os.path.join(
+        COLORTABLES_PATH, 'Square Root Visible Enhancement.cpt'),
+    'SVGAIR2_TEMP': os.path.join(COLORTABLES_PATH, 'SVGAIR2_TEMP.cpt'),
+    'SVGAWVX_TEMP': os.path.join(COLORTABLES_PATH, 'SVGAWVX_TEMP.cpt'),
+    'IR4AVHRR6': os.path.join(COLORTABLES_PATH, 'IR4AVHRR6.cpt'),
+}
+
+# Colortables (x, rgb) and colormaps, kept in memory
+_COLORTABLES = {}
+_COLORMAPS = {}
+
+
+def register_colortable(name, path):
+    """
+    Add a colortable to the registry, so it can be requested by name.
+
+    Parameters
+    ----------
+    name: colortable name
+    path: CPT file
+    """
+
+    COLORTABLES[name] = path
+
+
+def _get_path(name):
+    path = COLORTABLES.get(name, name)
+    if not os.path.isfile(path) and os.path.isfile(path + '.cpt'):
+        path = path + '.cpt'
+    return path
+
+
+def read_cpt(path, cache_path=None):
+    """
+    Read a CPT colortable (RGB or HSV color model), from memory, from the
+    disk cache or parsing the file.
+
+    Parameters
+    ----------
+    path: CPT file or name of a registered colortable
+    cache_path: folder of the cache files. None uses a "cache" folder next to
+        the colortable
+
+    Returns
+    -------
+    x: colortable values (two per color line, start and end)
+    rgb: (N, 3) array of RGB colors (0 to 1) of each value
+    """
+
+    path = _get_path(path)
+    if path in _COLORTABLES:
+        return _COLORTABLES[path]
+
+    if cache_path is None:
+        cache_path = os.path.join(os.path.dirname(path), 'cache')
+    key = hashlib.sha1(
+        str((os.path.abspath(path), os.path.getmtime(path))).encode()
+    ).hexdigest()[:16]
+    filename = os.path.join(
+        cache_path,
+        os.path.splitext(os.path.basename(path))[0] + '_' + key + '.npz')
+    if os.path.isfile(filename):
+        try:
+            with np.load(filename) as cached:
+                _COLORTABLES[path] = cached['x'], cached['rgb']
+            return _COLORTABLES[path]
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            # Unreadable cache file: parsed (and written) again
+            pass
+
+    with open(path) as f:
+        lines = f.read().splitlines()
+
+    hsv = any(line.startswith('#') and line.split()[-1:] == ['HSV']
+              for line in lines)
+    # Color lines: x0 c0 c0 c0 x1 c1 c1 c1 (B, F and N lines are background,
+    # foreground and NaN colors)
+    table = np.array(
+        [line.split()[:8] for line in lines
+         if line.strip() and not line.startswith('#')
+         and line.split()[0] not in ['B', 'F', 'N']], dtype=float)
+
+    x = table[:, [0, 4]].ravel()
+    colors = table[:, [1, 2, 3, 5, 6, 7]].reshape(-1, 3)
+    if hsv:
+        rgb = hsv_to_rgb(colors / [360.0, 1.0, 1.0])
+    else:
+        rgb = colors / 255.0
+
+    # Written under another name first, since render processes may parse
+    # the same colortable at the same time
+    os.makedirs(cache_path, exist_ok=True)
+    temporary = filename[:-4] + '_' + str(os.getpid()) + '.npz'
+    np.savez(temporary, x=x, rgb=rgb)
+    os.replace(temporary, filename)
+
+    _COLORTABLES[path] = x, rgb
+    return x, rgb
+
+
+def load_cpt(path):
+    """
+    Read a CPT colortable as a LinearSegmentedColormap dictionary (same as
+    the old cpt_convert.loadCPT()).
+
+    Parameters
+    ----------
+    path: CPT file or name of a registered colortable
+
+    Returns
+    -------
+    colorDict: dictionary with red, green and blue segments. None if the
+        file is not found
+    """
+
+    if not os.path.isfile(_get_path(path)):
+        print('File ', path, 'not found')
+        return None
+
+    x, rgb = read_cpt(path)
+    xNorm = (x - x[0]) / (x[-1] - x[0])
+    colorDict = {}
+    for i, color in enumerate(['red', 'green', 'blue']):
+        colorDict[color] = np.column_stack(
+            [xNorm, rgb[:, i], rgb[:, i]]).tolist()
+    return colorDict
+
+
+def get_colormap(name, reverse=False, N=256):
+    """
+    Get the colormap of a CPT colortable (created once per process).
+
+    Parameters
+    ----------
+    name: name of a registered colortable or CPT file
+    reverse: True to reverse the colormap
+    N: number of colors of the colormap
+
+    Returns
+    -------
+    cmap: LinearSegmentedColormap
+    """
+
+    key = (_get_path(name), reverse, N)
+    if key not in _COLORMAPS:
+        cmap = LinearSegmentedColormap('cpt', load_cpt(name), N=N)
+        if reverse:
+            cmap = cmap.reversed(name='cpt_r')
+        _COLORMAPS[key] = cmap
+    return _COLORMAPS[key]
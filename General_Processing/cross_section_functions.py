@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+VERTICAL CROSS SECTIONS OF GRIDDED RADAR DATA
+
+- get_section_sampler_xy()
+- get_section_sampler()
+- get_cross_section()
+
+The sampling of a cross section (grid indexes and bilinear weights of each
+point along the A -> B line) is calculated once per grid and line, and then
+applied to any number of fields at the same time, returning an xarray
+DataArray (field, z, distance). Categorical fields (hydrometeor
+classes, FH) are sampled at the nearest grid point instead, so there are no
+mixed classes.
+
+Used by Radar_Processing and MultiDoppler_Processing, e.g.:
+
+    sys.path.insert(0, os.path.join(os.path.dirname(
+        os.path.abspath(__file__)), "..", "General_Processing"))
+    from cross_section_functions import get_section_sampler, get_cross_section
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import numpy as np
+import xarray as xr
+
+import pyart
+
+# Samplers of each (grid, line), kept in memory
+_SAMPLERS = {}
+# Fields sampled at the nearest grid point (classes can't be interpolated)
+CATEGORICAL_FIELDS = ["FH"]
+
+
+def _grid_key(grid):
+    return (
+        float(grid.origin_latitude["data"][0]),
+        float(grid.origin_longitude["data"][0]),
+        float(grid.x["data"][0]),
+        float(grid.x["data"][-1]),
+        grid.nx,
+        float(grid.y["data"][0]),
+        float(grid.y["data"][-1]),
+        grid.ny,
+    )
+
+
+def get_section_sampler_xy(grid, xy1, xy2, n_points=None):
+    """
+    Get grid indexes and bilinear weights of the points of a cross section
+    between two points in grid coordinates.
+
+    Parameters
+    ----------
+    grid: gridded radar data
+    xy1, xy2: start (A) and end (B) of the cross section
+        (x, y) in meters
+    n_points: number of points along the section. None uses about one point
+        per grid spacing
+
+    Returns
+    -------
+    sampler: dictionary with indexes ('iy', 'ix'), weights ('weights', of
+        the 4 surrounding grid points), indexes of the nearest of them
+        ('iy_nearest', 'ix_nearest', the corner with the largest weight),
+        'inside' (points inside the grid), 'x', 'y', 'lon', 'lat' and
+        'distance' (km from A) of each point
+    """
+
+    key = (_grid_key(grid), tuple(map(float, xy1)), tuple(map(float, xy2)),
+           n_points)
+    if key in _SAMPLERS:
+        return _SAMPLERS[key]
+
+    x_grid, y_grid = grid.x["data"], grid.y["data"]
+    dx = (x_grid[-1] - x_grid[0]) / (grid.nx - 1)
+    dy = (y_grid[-1] - y_grid[0]) / (grid.ny - 1)
+    if n_points is None:
+        length = np.hypot(xy2[0] - xy1[0], xy2[1] - xy1[1])
+        n_points = int(np.ceil(length / min(abs(dx), abs(dy)))) + 1
+
+    x = np.linspace(xy1[0], xy2[0], n_points)
+    y = np.linspace(xy1[1], xy2[1], n_points)
+
+    # Fractional indexes (rounded, so points on the grid get exact indexes)
+    fx = np.round((x - x_grid[0]) / dx, 6)
+    fy = np.round((y - y_grid[0]) / dy, 6)
+    inside = (fx >= 0) & (fx <= grid.nx - 1) & (fy >= 0) & (fy <= grid.ny - 1)
+    ix = np.clip(np.floor(fx).astype(int), 0, grid.nx - 2)
+    iy = np.clip(np.floor(fy).astype(int), 0, grid.ny - 2)
+    tx = np.clip(fx - ix, 0, 1)
+    ty = np.clip(fy - iy, 0, 1)
+    # Corners: (iy, ix), (iy, ix + 1), (iy + 1, ix), (iy + 1, ix + 1)
+    weights = np.array(
+        [(1 - ty) * (1 - tx), (1 - ty) * tx, ty * (1 - tx), ty * tx]
+    )
+
+    corner_iy = np.array([iy, iy, iy + 1, iy + 1])
+    corner_ix = np.array([ix, ix + 1, ix, ix + 1])
+    nearest = np.argmax(weights, axis=0)
+    points = np.arange(n_points)
+
+    lon, lat = pyart.core.cartesian_to_geographic_aeqd(
+        x,
+        y,
+        grid.origin_longitude["data"][0],
+        grid.origin_latitude["data"][0],
+    )
+
+    sampler = {
+        "iy": corner_iy,
+        "ix": corner_ix,
+        "weights": weights,
+        "iy_nearest": corner_iy[nearest, points],
+        "ix_nearest": corner_ix[nearest, points],
+        "inside": inside,
+        "x": x,
+        "y": y,
+        "lon": lon,
+        "lat": lat,
+        "distance": 0.001 * np.hypot(x - x[0], y - y[0]),
+    }
+    _SAMPLERS[key] = sampler
+    return sampler
+
+
+def get_section_sampler(grid, coord1, coord2, n_points=None):
+    """
+    Get grid indexes and bilinear weights of the points of a cross section
+    between two lon, lat points (see get_section_sampler_xy()).
+
+    Parameters
+    ----------
+    grid: gridded radar data
+    coord1, coord2: start (A) and end (B) of the cross section
+        (lon, lat) in degrees
+    n_points: number of points along the section. None uses about one point
+        per grid spacing
+
+    Returns
+    -------
+    sampler: see get_section_sampler_xy()
+    """
+
+    x, y = pyart.core.geographic_to_cartesian_aeqd(
+        np.array([coord1[0], coord2[0]]),
+        np.array([coord1[1], coord2[1]]),
+        grid.origin_longitude["data"][0],
+        grid.origin_latitude["data"][0],
+    )
+    return get_section_sampler_xy(
+        grid, (x[0], y[0]), (x[1], y[1]), n_points=n_points
+    )
+
+
+def get_cross_section(grid, fields, sampler, categorical=None):
+    """
+    Get the cross section of several fields at once, interpolated
+    (bilinear) or, for categorical fields, from the nearest grid point.
+    Points are masked (NaN) outside the grid or where most of the
+    surrounding grid points (the nearest one, for categorical fields) are
+    missing.
+
+    Parameters
+    ----------
+    grid: gridded radar data
+    fields: list of fields
+    sampler: from get_section_sampler() or get_section_sampler_xy()
+    categorical: list of fields sampled at the nearest grid point. None uses
+        CATEGORICAL_FIELDS
+
+    Returns
+    -------
+    section: xarray DataArray (field, z, distance), with lon and lat of each
+        point and z in meters
+    """
+
+    data = np.ma.stack(
+        [np.ma.asarray(grid.fields[field]["data"], dtype="f8")
+         for field in fields]
+    )
+    values = np.ma.getdata(data)
+    valid = ~np.ma.getmaskarray(data) & np.isfinite(values)
+
+    # Gathering the 4 corners of all points, levels and fields at once:
+    # (field, z, corner, point)
+    corners = values[:, :, sampler["iy"], sampler["ix"]]
+    corners_valid = valid[:, :, sampler["iy"], sampler["ix"]]
+    weights = sampler["weights"] * corners_valid
+    weight_sum = weights.sum(axis=2)
+    section = np.where(corners_valid, corners, 0.0)
+    section = (section * weights).sum(axis=2) / np.where(
+        weight_sum > 0, weight_sum, 1.0
+    )
+    section[(weight_sum < 0.5) | ~sampler["inside"]] = np.nan
+
+    # Categorical fields: value of the nearest grid point
+    if categorical is None:
+        categorical = CATEGORICAL_FIELDS
+    nearest = [i for i, field in enumerate(fields) if field in categorical]
+    if nearest:
+        iy, ix = sampler["iy_nearest"], sampler["ix_nearest"]
+        section[nearest] = np.where(
+            valid[nearest][:, :, iy, ix] & sampler["inside"],
+            values[nearest][:, :, iy, ix],
+            np.nan,
+        )
+
+    return xr.DataArray(
+        section,
+        dims=("field", "z", "distance"),
+        coords={
+            "field": list(fields),
+            "z": grid.z["data"],
+            "distance": sampler["distance"],
+            "lon": ("distance", sampler["lon"]),
+            "lat": ("distance", sampler["lat"]),
+        },
+        name="cross_section",
+    )
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+BULK DOWNLOADS
+
+- read_manifest()
+- download_file()
+- download_files()
+
+Files are downloaded by a pool of threads. Each file is written to a .part
+file that is renamed when complete, so interrupted downloads are never
+taken as complete files, and resumed (HTTP Range) in the next try or run.
+Failed requests are retried with exponential backoff. Completed files are
+recorded in a JSON manifest with size and SHA-256, and skipped in the next
+runs, e.g.:
+
+    jobs = [(url, filename) for url, filename in zip(urls, filenames)]
+    download_files(jobs, nworkers=4, manifest='manifest.json')
+
+Used by Satellite_Processing/get_g13_data.py.
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from http.client import HTTPException
+from urllib import request
+from urllib.error import HTTPError, URLError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# HTTP errors that may work in a new try
+RETRY_STATUS = [408, 429, 500, 502, 503, 504]
+
+
+def read_manifest(manifest):
+    """
+    Read a download manifest.
+
+    Parameters
+    ----------
+    manifest: JSON file
+
+    Returns
+    -------
+    files: dictionary of {filename: {'url', 'size', 'sha256', 'completed'}}
+        (empty if the manifest doesn't exist)
+    """
+
+    if manifest is None or not os.path.isfile(manifest):
+        return {}
+    with open(manifest) as f:
+        return json.load(f)
+
+
+def _write_manifest(manifest, files):
+    temporary = manifest + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(files, f, indent=1, sort_keys=True)
+    os.replace(temporary, manifest)
+
+
+def _sha256(filename, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest
+
+
+def download_file(url, filename, retries=5, backoff=2.0, timeout=60,
+                  chunk_size=1 << 20):
+    """
+    Download a file to filename + '.part', resuming it if it exists, and
+    rename it when complete.
+
+    Parameters
+    ----------
+    url: file URL
+    filename: destination file
+    retries: number of tries after the first one
+    backoff: seconds before the first retry (doubled at each retry)
+    timeout: seconds without response before a try fails
+    chunk_size: bytes read at a time
+
+    Returns
+    -------
+    size, sha256: size in bytes and SHA-256 (hexadecimal) of the file
+    """
+
+    part = filename + '.part'
+    for attempt in range(retries + 1):
+        try:
+            offset = os.path.getsize(part) if os.path.isfile(part) else 0
+            headers = {'Range': 'bytes=' + str(offset) + '-'} if offset else {}
+            try:
+                response = request.urlopen(
+                    request.Request(url, headers=headers), timeout=timeout)
+            except HTTPError as error:
+                if error.code == 416 and offset:
+                    # Range after the end: the .part file is complete
+                    break
+                raise
+
+            with response:
+                if offset and response.status != 206:
+                    # Server doesn't resume: start again
+                    offset = 0
+                with open(part, 'ab' if offset else 'wb') as f:
+                    for chunk in iter(lambda: response.read(chunk_size), b''):
+                        f.write(chunk)
+                length = response.headers.get('Content-Length')
+                if length is not None and (os.path.getsize(part) - offset !=
+                                           int(length)):
+                    raise URLError('incomplete download')
+            break
+        except (HTTPError, URLError, OSError, HTTPException) as error:
+            # HTTPException: e.g. IncompleteRead of chunked responses
+            if (isinstance(error, HTTPError) and
+                    error.code not in RETRY_STATUS):
+                raise
+            if attempt == retries:
+                raise
+            wait = backoff * 2 ** attempt
+            print(filename, ':', error, '- retrying in', wait, 'seconds')
+            time.sleep(wait)
+
+    digest = _sha256(part)
+    os.replace(part, filename)
+    return os.path.getsize(filename), digest.hexdigest()
+
+
+def download_files(jobs, nworkers=4, manifest='manifest.json', retries=5,
+                   backoff=2.0, timeout=60, verify=False):
+    """
+    Download files with a pool of threads, skipping the ones in the
+    manifest (see download_file()).
+
+    Parameters
+    ----------
+    jobs: list of (url, filename)
+    nworkers: number of simultaneous downloads
+    manifest: JSON file of completed files. None doesn't keep a manifest
+        (only existing files are skipped)
+    retries, backoff, timeout: see download_file()
+    verify: True to check size and SHA-256 of files in the manifest before
+        skipping them (only size is checked otherwise)
+
+    Returns
+    -------
+    failed: dictionary of {filename: error} of the files not downloaded
+    """
+
+    files = read_manifest(manifest)
+    lock = threading.Lock()
+
+    def is_complete(url, filename):
+        if not os.path.isfile(filename):
+            return False
+        if manifest is None:
+            return True
+        entry = files.get(filename)
+        if entry is None or entry['size'] != os.path.getsize(filename):
+            return False
+        return not verify or _sha256(filename).hexdigest() == entry['sha256']
+
+    def run(url, filename):
+        size, sha256 = download_file(url, filename, retries, backoff,
+                                     timeout)
+        if manifest is not None:
+            with lock:
+                files[filename] = {
+                    'url': url, 'size': size, 'sha256': sha256,
+                    'completed': time.strftime('%Y-%m-%dT%H:%M:%S')}
+                _write_manifest(manifest, files)
+        return size
+
+    pending = [(url, filename) for url, filename in jobs
+               if not is_complete(url, filename)]
+    print(len(jobs) - len(pending), 'files already downloaded,',
+          len(pending), 'to download')
+
+    bt = time.time()
+    failed = {}
+    total = 0
+    with ThreadPoolExecutor(max_workers=nworkers) as executor:
+        futures = {executor.submit(run, url, filename): filename
+                   for url, filename in pending}
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                total += future.result()
+                print('Downloaded', filename)
+            except Exception as error:
+                failed[filename] = error
+                print('Failed', filename, ':', error)
+
+    elapsed = time.time() - bt
+    print(time.time() - bt, ' seconds to download', len(pending) -
+          len(failed), 'files,', total / 1e6 / max(elapsed, 1e-6), ' MB/s')
+    return failed
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+PARALLEL FIGURE RENDERING
+
+- RenderQueue
+
+Figure jobs (top-level plotting functions and their arguments) are sent to a
+pool of processes using the Agg backend (no screen needed). Each process
+runs a setup function once (colormaps, shapefile caches, ...) and then only
+plots. Figures are the same as plotting one by one, since they are drawn by
+the same functions with the same Agg renderer used by savefig for .png.
+
+Used by Satellite_Processing/main_goes16.py and
+Reanalysis_Processing/main_era5.py, e.g.:
+
+    with RenderQueue(nprocs=4, setup=init_render_worker) as queue:
+        for data in all_data:
+            queue.submit(plot_function, data, fig_asp)
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+
+def _init_worker(setup, setup_args):
+    """
+    Start a worker process: Agg backend and setup function (once).
+    """
+
+    import matplotlib.pyplot as plt
+
+    plt.switch_backend('Agg')
+    if setup is not None:
+        setup(*setup_args)
+
+
+def _run_job(job):
+    """
+    Run one figure job, returning its result and seconds taken.
+    """
+
+    function, args, kwargs = job
+    bt = time.time()
+    result = function(*args, **kwargs)
+    return result, time.time() - bt
+
+
+class RenderQueue(object):
+    """
+    Queue of figure jobs rendered in a process pool.
+
+    Parameters
+    ----------
+    nprocs: number of processes. None uses all CPUs, 0 renders in this
+        process, one job after the other (serial path)
+    setup: top-level function run once in each process (e.g. loading
+        colormaps and shapefile caches). None does nothing
+    setup_args: tuple of arguments of setup
+    max_pending: maximum number of jobs waiting, so data of all jobs is not
+        kept in memory at once. None uses 4 * nprocs (or 16)
+    """
+
+    def __init__(self, nprocs=None, setup=None, setup_args=(),
+                 max_pending=None):
+        self.executor = None
+        if nprocs == 0:
+            if setup is not None:
+                setup(*setup_args)
+        else:
+            self.executor = ProcessPoolExecutor(
+                max_workers=nprocs, initializer=_init_worker,
+                initargs=(setup, setup_args))
+        self.max_pending = max_pending or 4 * (nprocs or 4)
+        self.pending = set()
+        self.futures = []
+        self.results = []
+        self.render_seconds = 0.0
+        self.start = time.time()
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Add a figure job: function(*args, **kwargs), with function defined at
+        module level (so it can be sent to the processes).
+        """
+
+        if self.executor is None:
+            result, seconds = _run_job((function, args, kwargs))
+            self.results.append(result)
+            self.render_seconds += seconds
+            return result
+
+        if len(self.pending) >= self.max_pending:
+            done, self.pending = wait(self.pending,
+                                      return_when=FIRST_COMPLETED)
+        future = self.executor.submit(_run_job, (function, args, kwargs))
+        self.pending.add(future)
+        self.futures.append(future)
+        return future
+
+    def close(self):
+        """
+        Wait for all jobs and report throughput.
+
+        Returns
+        -------
+        results: list of results of the jobs, in the order they were
+            submitted
+        """
+
+        for future in self.futures:
+            result, seconds = future.result()
+            self.results.append(result)
+            self.render_seconds += seconds
+        if self.executor is not None:
+            self.executor.shutdown()
+
+        elapsed = time.time() - self.start
+        n_jobs = len(self.results)
+        print(n_jobs, 'figures in', elapsed, ' seconds')
+        if n_jobs and elapsed > 0:
+            print(n_jobs / elapsed, ' figures per second,',
+                  self.render_seconds / n_jobs, ' seconds per figure,',
+                  self.render_seconds / elapsed, ' times faster than serial')
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        elif self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+        return False
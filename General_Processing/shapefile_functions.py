@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+SHAPEFILE GEOMETRY CACHE
+
+- get_shape_segments()
+- get_shape_collection()
+
+Shapefiles (estadosl_2007, ne_10m_admin_0_countries, sao_paulo) are parsed
+only once per process. Their lines are clipped to the figure extent,
+simplified and projected, and saved as .npz files (in a "cache" folder next
+to the shapefile) named by a key of (shapefile, projection, extent,
+tolerance). Figures then only add a ready-made LineCollection to the axes.
+
+Used by Radar_Processing, MultiDoppler_Processing, Reanalysis_Processing and
+Satellite_Processing, e.g.:
+
+    sys.path.insert(0, os.path.join(os.path.dirname(
+        os.path.abspath(__file__)), "..", "General_Processing"))
+    from shapefile_functions import get_shape_collection
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import os
+import zipfile
+import hashlib
+
+import numpy as np
+from matplotlib.collections import LineCollection
+import shapely.geometry as sgeom
+from cartopy.io.shapereader import Reader
+
+# Geometries of each shapefile and segments of each key, kept in memory
+_GEOMETRIES = {}
+_SEGMENTS = {}
+
+
+def _read_lines(shapefile):
+    """
+    Read (once) the geometries of a shapefile, as lines (polygon boundaries).
+    """
+
+    if shapefile not in _GEOMETRIES:
+        lines = []
+        for geometry in Reader(shapefile).geometries():
+            if geometry is None or geometry.is_empty:
+                continue
+            if geometry.geom_type in ["Polygon", "MultiPolygon"]:
+                geometry = geometry.boundary
+            lines.append(geometry)
+        _GEOMETRIES[shapefile] = lines
+    return _GEOMETRIES[shapefile]
+
+
+def _projection_key(projection):
+    """
+    Text describing a projection: cartopy CRS, Basemap or None (lon, lat).
+    """
+
+    if projection is None:
+        return "lonlat"
+    if hasattr(projection, "proj4_init"):
+        return projection.proj4_init
+    # Basemap: coordinates also depend on the corners
+    return str(
+        (
+            sorted(projection.projparams.items()),
+            projection.llcrnrlon,
+            projection.llcrnrlat,
+            projection.urcrnrlon,
+            projection.urcrnrlat,
+        )
+    )
+
+
+def _project(projection, lon, lat):
+    """
+    Project lon, lat points with a cartopy CRS or a Basemap.
+    """
+
+    if projection is None:
+        return lon, lat
+    if hasattr(projection, "transform_points"):
+        import cartopy.crs as ccrs
+
+        points = projection.transform_points(ccrs.PlateCarree(), lon, lat)
+        return points[:, 0], points[:, 1]
+    return projection(lon, lat)
+
+
+def _line_parts(geometry):
+    if geometry.is_empty:
+        return []
+    if geometry.geom_type == "LineString":
+        return [geometry]
+    if geometry.geom_type in ["MultiLineString", "GeometryCollection"]:
+        parts = []
+        for part in geometry.geoms:
+            parts.extend(_line_parts(part))
+        return parts
+    return []
+
+
+def get_shape_segments(
+    shapefile, extent=None, projection=None, tolerance=0.0, cache_path=None
+):
+    """
+    Get the lines of a shapefile clipped to an extent, simplified and
+    projected, from memory, from the disk cache or processing the shapefile.
+
+    Parameters
+    ----------
+    shapefile: shapefile path (with or without .shp)
+    extent: [min lon, max lon, min lat, max lat] in degrees. None keeps all
+    projection: cartopy CRS, Basemap or None (lon, lat)
+    tolerance: simplification tolerance in degrees. 0 keeps all points
+    cache_path: folder of the cache files. None uses a "cache" folder next to
+        the shapefile
+
+    Returns
+    -------
+    segments: list of (N, 2) arrays of projected points
+    """
+
+    if shapefile.endswith(".shp"):
+        shapefile = shapefile[:-4]
+    if cache_path is None:
+        cache_path = os.path.join(os.path.dirname(shapefile), "cache")
+
+    key = hashlib.sha1(
+        str(
+            (
+                os.path.abspath(shapefile),
+                os.path.getmtime(shapefile + ".shp"),
+                None if extent is None else [float(e) for e in extent],
+                _projection_key(projection),
+                float(tolerance),
+            )
+        ).encode()
+    ).hexdigest()[:16]
+    if key in _SEGMENTS:
+        return _SEGMENTS[key]
+
+    filename = os.path.join(
+        cache_path, os.path.basename(shapefile) + "_" + key + ".npz"
+    )
+    if os.path.isfile(filename):
+        try:
+            with np.load(filename) as cached:
+                segments = np.split(cached["points"], cached["offsets"])
+            _SEGMENTS[key] = segments
+            return segments
+        except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+            # Unreadable cache file: computed (and written) again
+            pass
+
+    clip = None
+    if extent is not None:
+        # Small margin, so lines don't end inside the figure
+        margin_x = 0.05 * (extent[1] - extent[0])
+        margin_y = 0.05 * (extent[3] - extent[2])
+        clip = sgeom.box(
+            extent[0] - margin_x,
+            extent[2] - margin_y,
+            extent[1] + margin_x,
+            extent[3] + margin_y,
+        )
+
+    segments = []
+    for geometry in _read_lines(shapefile):
+        if clip is not None:
+            if not geometry.intersects(clip):
+                continue
+            geometry = geometry.intersection(clip)
+        if tolerance > 0:
+            geometry = geometry.simplify(tolerance, preserve_topology=False)
+        for line in _line_parts(geometry):
+            lon, lat = np.asarray(line.coords)[:, :2].T
+            x, y = _project(projection, lon, lat)
+            segments.append(np.column_stack([x, y]))
+
+    os.makedirs(cache_path, exist_ok=True)
+    if segments:
+        points = np.concatenate(segments)
+        offsets = np.cumsum([len(segment) for segment in segments])[:-1]
+    else:
+        points, offsets = np.empty((0, 2)), np.array([], dtype=int)
+    # Written under another name first, since render processes may compute
+    # the same segments at the same time
+    temporary = filename[:-4] + "_" + str(os.getpid()) + ".npz"
+    np.savez(temporary, points=points, offsets=offsets)
+    os.replace(temporary, filename)
+
+    _SEGMENTS[key] = segments
+    return segments
+
+
+def get_shape_collection(
+    shapefile,
+    extent=None,
+    projection=None,
+    tolerance=0.0,
+    cache_path=None,
+    **kwargs
+):
+    """
+    Get the lines of a shapefile as a LineCollection, to be added to axes
+    with ax.add_collection() (see get_shape_segments()).
+
+    Parameters
+    ----------
+    shapefile, extent, projection, tolerance, cache_path: see
+        get_shape_segments()
+    **kwargs: LineCollection arguments (linewidth, edgecolor, zorder, ...)
+
+    Returns
+    -------
+    collection: LineCollection
+    """
+
+    segments = get_shape_segments(
+        shapefile, extent, projection, tolerance, cache_path
+    )
+    kwargs.setdefault("facecolor", "none")
+    return LineCollection(segments, **kwargs)
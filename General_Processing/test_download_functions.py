@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+TESTS OF download_functions.py
+
+Files are served by a local http.server with HTTP Range support, a path
+failing with 503 before answering, a path cut before the end and missing
+files (404). Run with:
+
+    python -m pytest General_Processing/test_download_functions.py
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from download_functions import download_file, download_files
+
+FILES = {
+    '/a.bin': bytes(range(256)) * 4000,
+    '/b.bin': b'GOES-13 ' * 50000,
+    '/flaky.bin': b'retry me ' * 1000,
+    '/cut.bin': b'cut short ' * 1000,
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Serve FILES, with Range requests. /flaky.bin fails (503) the first
+    times, /cut.bin is cut in the middle the first time.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.headers.get('Range')))
+            count = sum(path == self.path for path, _ in server.requests)
+        if self.path not in FILES:
+            self.send_error(404)
+            return
+        if self.path == '/flaky.bin' and count <= server.failures:
+            self.send_error(503)
+            return
+
+        data = FILES[self.path]
+        start = 0
+        if self.headers.get('Range'):
+            start = int(self.headers['Range'].split('=')[1].split('-')[0])
+            if start >= len(data):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes ' + str(start) + '-' +
+                             str(len(data) - 1) + '/' + str(len(data)))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(data) - start))
+        self.end_headers()
+        if self.path == '/cut.bin' and count == 1:
+            self.wfile.write(data[start:len(data) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(data[start:])
+
+
+class DownloadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.failures = 2
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:' + str(self.server.server_port)
+        self.folder = tempfile.mkdtemp()
+        self.manifest = os.path.join(self.folder, 'manifest.json')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.folder)
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def download(self, names):
+        jobs = [(self.url + '/' + name, self.path(name)) for name in names]
+        return download_files(jobs, nworkers=2, manifest=self.manifest,
+                              retries=3, backoff=0.01, timeout=10)
+
+    def test_resume(self):
+        # Half of the file from an interrupted run
+        with open(self.path('a.bin') + '.part', 'wb') as f:
+            f.write(FILES['/a.bin'][:300000])
+        size, sha256 = download_file(self.url + '/a.bin', self.path('a.bin'),
+                                     backoff=0.01)
+
+        self.assertEqual(self.server.requests, [('/a.bin', 'bytes=300000-')])
+        with open(self.path('a.bin'), 'rb') as f:
+            self.assertEqual(f.read(), FILES['/a.bin'])
+        self.assertEqual(size, len(FILES['/a.bin']))
+        self.assertEqual(sha256,
+                         hashlib.sha256(FILES['/a.bin']).hexdigest())
+        self.assertFalse(os.path.exists(self.path('a.bin') + '.part'))
+
+    def test_retry_503(self):
+        failed = self.download(['flaky.bin'])
+
+        self.assertEqual(failed, {})
+        self.assertEqual(len(self.server.requests), 3)
+        with open(self.path('flaky.bin'), 'rb') as f:
+            self.assertEqual(f.read(), FILES['/flaky.bin'])
+
+    def test_retry_incomplete(self):
+        failed = self.download(['cut.bin'])
+
+        self.assertEqual(failed, {})
+        # The second try resumes after the bytes of the first one
+        self.assertEqual(self.server.requests[1][1], 'bytes=5000-')
+        with open(self.path('cut.bin'), 'rb') as f:
+            self.assertEqual(f.read(), FILES['/cut.bin'])
+
+    def test_missing_file(self):
+        failed = self.download(['a.bin', 'missing.bin'])
+
+        self.assertEqual(list(failed), [self.path('missing.bin')])
+        self.assertEqual(failed[self.path('missing.bin')].code, 404)
+        # 404 isn't retried
+        self.assertEqual(
+            [path for path, _ in self.server.requests].count('/missing.bin'),
+            1)
+        self.assertTrue(os.path.isfile(self.path('a.bin')))
+
+    def test_skip_second_run(self):
+        self.assertEqual(self.download(['a.bin', 'b.bin']), {})
+        with open(self.manifest) as f:
+            files = json.load(f)
+        for name in ['a.bin', 'b.bin']:
+            entry = files[self.path(name)]
+            self.assertEqual(entry['size'], len(FILES['/' + name]))
+            self.assertEqual(
+                entry['sha256'],
+                hashlib.sha256(FILES['/' + name]).hexdigest())
+
+        del self.server.requests[:]
+        self.assertEqual(self.download(['a.bin', 'b.bin']), {})
+        self.assertEqual(self.server.requests, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,7 +9,9 @@ from datetime import datetime
 
 import pyart
 
-from multidop_functions import read_dealise_region, read_dealise_4dd
+from multidop_functions import (read_dealise_region, read_dealise_4dd,
+                                acquire_sounding_wind_data)
+from dealise_functions import read_dealise_radars
 from radar_functions import read_radar
 
 # Reading filenames
@@ -21,8 +23,13 @@ files = (open("cases/2017-11-15_21h30/filenames.txt").read().split('\n')[:-1])
 date = datetime(2017, 11, 15, 12)
 
 # Read and correct radar data according to notes
-radars = [read_dealise_4dd(files[0], date, "SBMT"),
-          read_dealise_4dd(files[1], date, "SBMT", vel_field='velocity')]
+# - Sweeps of all radars are dealised in parallel
+radars, timings = read_dealise_radars(
+    files[:2], names=['SR', 'FCTH'], methods=['4dd', '4dd'],
+    sounding=acquire_sounding_wind_data(date, "SBMT"),
+    vel_fields=['corrected_velocity', 'velocity'])
+# radars = [read_dealise_4dd(files[0], date, "SBMT"),
+#           read_dealise_4dd(files[1], date, "SBMT", vel_field='velocity')]
           # read_dealise_region(files[3], vel_field='velocity'),
           # read_dealise_region(files[4]),
           # read_dealise_4dd(files[5], date, "SBMT", vel_field='velocity'),
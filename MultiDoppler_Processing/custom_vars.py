@@ -111,9 +111,31 @@ lg_spc = 1.0
 # General
 # -- run_multidop
 filenames_uf = open(path + "filenames_uf.txt").read().split("\n")
+# - cases processed together by run_multidop (filenames_uf.txt in each path)
+multidop_cases = [path]
+radar_names = ["SR", "FCTH", "XPOL"]  # order in filenames_uf.txt
+# -- run_multidop, run_pydda (retrieval only over the storm: lon, lat limits
+#    of the area of interest, or None for the whole grid, and halo in meters)
+retrieval_aoi = None  # e.g. ((-47.5, -47.0), (-23.2, -22.8))
+retrieval_halo = 10000.0
+# -- run_multidop, run_pydda (log of each retrieval, see
+#    instrumentation_functions.compare_runs)
+retrieval_log = "Data/retrievals.jsonl"
+# -- run_multidop (azimuth, elevation and dual/triple-Doppler lobes of each
+#    grid, see geometry_functions)
+geometry_cache = "Data/GENERAL/multidop_geometry/"
+lobes_file = "Data/GENERAL/dual_doppler_lobes.csv"
+# -- run_multidop (HID and water masses on the grid of these radars, with
+#    the sounding of each case, for get_upvol_im)
+microphysics_radars = []  # e.g. ["FCTH"]
+microphysics_soundings = {}  # e.g. {path: "Data/SOUNDINGS/83779_2017111512Z.txt"}
 # dda_path = '/home/camila/Documentos/MultiDop-master/src/DDA'
+# -- run_multidop, run_pydda (local store of Wyoming soundings, see
+#    misc_functions.populate_sounding_store)
+sounding_store = "Data/SOUNDINGS/wind_profiles/"
 
 # -- plot_multidop
-filenames_pkl = glob(path + "*.pkl")
+filenames_pkl = glob(path + "*.pkl")  # older outputs
+filenames_grid = glob(path + "*_cf.nc")  # see misc.save_grid_store
 shp_path = "Data/GENERAL/shapefiles/sao_paulo"
 cptpath = "Data/GENERAL/colortables/"
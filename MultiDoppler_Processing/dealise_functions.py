@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+PARALLEL VELOCITY DEALISING
+
+- dealise_radars_sweeps()
+- read_dealise_radars()
+
+Each sweep of each radar is dealised in a separate process, with pyart
+region-based or FourDD algorithms (both work sweep by sweep when FourDD uses
+only a sounding), and put back in the original ray order.
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import pyart
+from pyart.core import HorizontalWindProfile
+
+from radar_functions import read_radar, alias_field
+
+
+def _dealise_sweep(task):
+    """
+    Dealise one sweep (extracted as a single-sweep radar). Runs in a worker
+    process.
+
+    Parameters
+    ----------
+    task: tuple of (radar name, sweep number, single-sweep radar, method,
+        reflectivity field, velocity field, sounding profile)
+
+    Returns
+    -------
+    name, sweep, corr_vel, elapsed: radar name, sweep number, dealised
+        velocity field dictionary and time taken in seconds
+    """
+
+    name, sweep, radar, method, dbz_field, vel_field, sounding = task
+    bt = time.time()
+
+    if method == 'region':
+        gatefilter = pyart.correct.GateFilter(radar)
+        gatefilter.exclude_masked(dbz_field)
+        corr_vel = pyart.correct.dealias_region_based(radar,
+                                                      vel_field=vel_field,
+                                                      keep_original=False,
+                                                      gatefilter=gatefilter,
+                                                      centered=True)
+    elif method == '4dd':
+        gatefilter = pyart.correct.GateFilter(radar)
+        gatefilter.exclude_transition()
+        gatefilter.exclude_invalid(vel_field)
+        gatefilter.exclude_invalid(dbz_field)
+        gatefilter.exclude_outside(dbz_field, 0, 80)
+        corr_vel = pyart.correct.dealias_fourdd(radar, sonde_profile=sounding,
+                                                gatefilter=gatefilter,
+                                                vel_field=vel_field)
+    else:
+        raise ValueError("method must be 'region' or '4dd', not " +
+                         repr(method))
+
+    return name, sweep, corr_vel, time.time() - bt
+
+
+def dealise_radars_sweeps(radars, methods, dbz_fields, vel_fields,
+                          sweeps=None, sounding=None, nprocs=None):
+    """
+    Dealise several radars at once, sending each sweep to a process pool.
+
+    Parameters
+    ----------
+    radars: dictionary of Py-ART radar data, by radar name
+    methods: dictionary of dealising method ('region' or '4dd'), by radar name
+    dbz_fields: dictionary of reflectivity field names, by radar name
+    vel_fields: dictionary of velocity field names, by radar name
+    sweeps: list of sweeps to be dealised (e.g. only those used by the DDA
+        analysis). None dealises all sweeps. Other sweeps are masked. Raises
+        ValueError if a radar has none of these sweeps
+    sounding: sounding wind data (needed for '4dd'), with height, u_wind and
+        v_wind
+    nprocs: number of processes. None uses all CPUs
+
+    Returns
+    -------
+    corr_vels: dictionary of dealised velocity fields, by radar name
+    timings: dictionary of {sweep: seconds} dictionaries, by radar name
+    """
+
+    # The sounding goes to every worker, so it has to be picklable
+    if sounding is not None:
+        sounding = HorizontalWindProfile.from_u_and_v(
+            sounding.height, sounding.u_wind, sounding.v_wind)
+
+    tasks = []
+    for name, radar in radars.items():
+        if sweeps is None:
+            radar_sweeps = range(radar.nsweeps)
+        else:
+            radar_sweeps = [sweep for sweep in sweeps
+                            if sweep < radar.nsweeps]
+            if not radar_sweeps:
+                raise ValueError(
+                    name + ' has ' + str(radar.nsweeps) + ' sweeps, none '
+                    'of the selected sweeps ' + str(list(sweeps)))
+        for sweep in radar_sweeps:
+            tasks.append((name, sweep, radar.extract_sweeps([sweep]),
+                          methods[name], dbz_fields[name], vel_fields[name],
+                          sounding))
+
+    bt = time.time()
+    with ProcessPoolExecutor(max_workers=nprocs) as executor:
+        results = list(executor.map(_dealise_sweep, tasks))
+    del tasks
+
+    # Putting sweeps back in the original ray order
+    corr_vels = {}
+    timings = {name: {} for name in radars}
+    for name, sweep, corr_vel, elapsed in results:
+        radar = radars[name]
+        if name not in corr_vels:
+            corr_vels[name] = {key: value for key, value in corr_vel.items()
+                               if key != 'data'}
+            corr_vels[name]['data'] = np.ma.masked_all(
+                radar.fields[vel_fields[name]]['data'].shape,
+                dtype=corr_vel['data'].dtype)
+        corr_vels[name]['data'][radar.get_slice(sweep)] = corr_vel['data']
+        timings[name][sweep] = elapsed
+        print(name, 'sweep', sweep, ':', elapsed, ' seconds to dealise')
+
+    print(time.time() - bt, ' seconds to dealise all radars')
+
+    return corr_vels, timings
+
+
+def read_dealise_radars(filenames, names, methods, sounding=None,
+                        dbz_fields=None, vel_fields=None, sweeps=None,
+                        nprocs=None):
+    """
+    Reading several radars with radar_funs and, as read_dealise_region() and
+    read_dealise_4dd() do for one radar:
+    - Dealise data per sweep, in parallel (see dealise_radars_sweeps())
+    - Add a mising_value (and _FillValue if not available) field inside
+      reflectivity (DT) and velocity (VT) fields
+
+    Parameters
+    ----------
+    filenames: list of .mvol or .HDF5 files
+    names: list of radar names (e.g. ['SR', 'FCTH', 'XPOL'])
+    methods: list of dealising methods ('region' or '4dd') for each radar
+    sounding: sounding wind data (needed for '4dd'), from
+        acquire_sounding_wind_data()
+    dbz_fields: list of reflectivity field names. None uses
+        'corrected_reflectivity' for all radars
+    vel_fields: list of velocity field names. None uses 'corrected_velocity'
+        for all radars
+    sweeps: list of sweeps to be dealised. None dealises all sweeps
+    nprocs: number of processes. None uses all CPUs
+
+    Returns
+    -------
+    radars: list of dealised Py-ART radar data, in the same order as filenames
+    timings: dictionary of {sweep: seconds} dictionaries, by radar name
+    """
+
+    if dbz_fields is None:
+        dbz_fields = ['corrected_reflectivity'] * len(filenames)
+    if vel_fields is None:
+        vel_fields = ['corrected_velocity'] * len(filenames)
+
+    # Reading
+    radars = {}
+    for filename, name, dbz_field in zip(filenames, names, dbz_fields):
+        radar = read_radar(filename)
+        radars[name] = alias_field(radar, dbz_field, 'DT')
+
+    # Dealising
+    corr_vels, timings = dealise_radars_sweeps(
+        radars, dict(zip(names, methods)), dict(zip(names, dbz_fields)),
+        dict(zip(names, vel_fields)), sweeps=sweeps, sounding=sounding,
+        nprocs=nprocs)
+
+    for name, vel_field in zip(names, vel_fields):
+        radar = radars[name]
+        radar.add_field('VT', corr_vels[name], replace_existing=True)
+
+        # Adding missing_value
+        for field in ['DT', 'VT']:
+            if '_FillValue' not in radar.fields[field]:
+                radar.fields[field]['_FillValue'] = (
+                    radar.fields[field]['data'].fill_value)
+            radar.fields[field]['missing_value'] = [
+                1.0 * radar.fields[field]['_FillValue']]
+
+        # Defining original and corrected velocity fieds
+        if vel_field == 'corrected_velocity':
+            radar = alias_field(radar, vel_field, 'velocity')
+        radar = alias_field(radar, 'VT', 'corrected_velocity')
+
+    return [radars[name] for name in names], timings
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+MULTIDOPPLER GEOMETRY CACHE
+
+- grid_spec_key()
+- add_geometry_fields()
+- get_lobe_mask()
+- get_lobe_window()
+- apply_lobe_mask()
+- export_lobes()
+
+Azimuth and elevation of each grid point (seen from each radar) only depend
+on the radar location and the grid specifications, not on time. They are
+computed once with multidop and saved as .npz files, named by the radar and a
+key of the grid specifications, and then reused for every time and case. The
+same goes for the dual/triple-Doppler lobes (points with beam crossing angles
+between min_cba and 180 - min_cba), which are used to crop the retrieval
+domain to the lobes, mask velocities outside them and to plot the lobes
+(General_Processing/plot_dual-doppler_lobes.R).
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import os
+import zipfile
+import hashlib
+from copy import copy
+from itertools import combinations
+
+import numpy as np
+import numpy.ma as ma
+import pandas as pd
+import scipy.ndimage as ndimage
+
+import multidop
+
+
+def grid_spec_key(grid, radar=True):
+    """
+    Key of the grid specifications (origin, x, y, z and, if radar=True,
+    radar location), to name the cache files.
+
+    Parameters
+    ----------
+    grid: gridded radar data
+    radar: True to include the radar location in the key
+
+    Returns
+    -------
+    key: hexadecimal string
+    """
+
+    parts = [grid.origin_latitude['data'], grid.origin_longitude['data'],
+             grid.origin_altitude['data'], grid.x['data'], grid.y['data'],
+             grid.z['data']]
+    if radar:
+        parts += [grid.radar_latitude['data'], grid.radar_longitude['data'],
+                  grid.radar_altitude['data']]
+
+    key = hashlib.sha1()
+    for part in parts:
+        # Rounding to avoid different keys from float noise
+        key.update(np.round(np.asarray(part, dtype='f8'), 4).tobytes())
+    return key.hexdigest()[:16]
+
+
+def _load_cache(filename, names):
+    """
+    Load arrays from a cache file. None if missing or unreadable (e.g.
+    written by another process when it crashed), so it's computed again.
+    """
+
+    if not os.path.isfile(filename):
+        return None
+    try:
+        with np.load(filename) as cached:
+            return [cached[name] for name in names]
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+        return None
+
+
+def _save_cache(filename, **arrays):
+    """
+    Save arrays in a cache file, written under another name first, since
+    parallel processes may compute the same arrays.
+    """
+
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    temporary = filename[:-4] + '_' + str(os.getpid()) + '.npz'
+    np.savez(temporary, **arrays)
+    os.replace(temporary, filename)
+
+
+def _get_geometry(grid, cache_path=None):
+    """
+    Get azimuth and elevation (in degrees) of all grid points, from the cache
+    or computing with multidop.
+    """
+
+    filename = None
+    if cache_path is not None:
+        filename = os.path.join(cache_path,
+                                'geometry_' + grid_spec_key(grid) + '.npz')
+        cached = _load_cache(filename, ['azimuth', 'elevation'])
+        if cached is not None:
+            return cached[0], cached[1]
+
+    # Computing on a copy with a dummy reflectivity field (DT, as in
+    # grid_radar) without gaps, so angles are defined everywhere
+    template = copy(grid)
+    template.fields = {'DT': {'data': ma.zeros(
+        (grid.nz, grid.ny, grid.nx), dtype='f4')}}
+    template = multidop.angles.add_azimuth_as_field(template)
+    template = multidop.angles.add_elevation_as_field(template)
+    azimuth = ma.getdata(template.fields['AZ']['data']).astype('f4')
+    elevation = ma.getdata(template.fields['EL']['data']).astype('f4')
+
+    if filename is not None:
+        _save_cache(filename, azimuth=azimuth, elevation=elevation)
+    return azimuth, elevation
+
+
+def add_geometry_fields(grid, cache_path=None, dz_name='DT', bad=-32768):
+    """
+    Add azimuth (AZ) and elevation (EL) as fields of grid, like
+    multidop.angles.add_azimuth_as_field() and add_elevation_as_field(), but
+    using the cache.
+
+    Parameters
+    ----------
+    grid: gridded radar data
+    cache_path: folder of the cache files. None computes without caching
+    dz_name: reflectivity field (angles are masked where it is missing)
+    bad: fill value
+
+    Returns
+    -------
+    grid: gridded radar data with AZ and EL fields
+    """
+
+    azimuth, elevation = _get_geometry(grid, cache_path)
+    mask = ma.getmaskarray(grid.fields[dz_name]['data'])
+    for name, long_name, data in [('AZ', 'Azimuth', azimuth),
+                                  ('EL', 'Elevation', elevation)]:
+        field = ma.masked_where(mask, data.copy())
+        field.set_fill_value(bad)
+        grid.add_field(name, {'data': field, 'long_name': long_name,
+                              'units': 'degrees', '_FillValue': bad},
+                       replace_existing=True)
+    return grid
+
+
+def get_lobe_mask(grids, min_cba=20.0, cache_path=None):
+    """
+    Get the dual/triple-Doppler lobes of a radar combination: columns where
+    at least one pair of radars has beam crossing angle between min_cba and
+    180 - min_cba.
+
+    Parameters
+    ----------
+    grids: list of gridded radar data of each radar, in the same grid
+    min_cba: minimum beam crossing angle in degrees
+        (MultiDop min_cba parameter)
+    cache_path: folder of the cache files. None computes without caching
+
+    Returns
+    -------
+    lobe: 2D boolean array (y, x), True inside the lobes
+    """
+
+    filename = None
+    if cache_path is not None:
+        keys = sorted(grid_spec_key(grid) for grid in grids)
+        filename = os.path.join(
+            cache_path, 'lobe_' + '-'.join(keys) + '_' + str(min_cba) + '.npz')
+        cached = _load_cache(filename, ['lobe'])
+        if cached is not None:
+            return cached[0]
+
+    # Azimuth doesn't change with height
+    azimuths = [_get_geometry(grid, cache_path)[0][0]
+                for grid in grids]
+    lobe = np.zeros(azimuths[0].shape, dtype=bool)
+    for az_1, az_2 in combinations(azimuths, 2):
+        cba = np.abs(az_1 - az_2) % 360.0
+        cba = np.where(cba > 180.0, 360.0 - cba, cba)
+        lobe |= (cba >= min_cba) & (cba <= 180.0 - min_cba)
+
+    if filename is not None:
+        _save_cache(filename, lobe=lobe)
+    return lobe
+
+
+def get_lobe_window(lobe, halo=2):
+    """
+    Get the smallest window of grid points covering the lobes (plus a halo
+    of points), to crop the retrieval domain (see crop_grid()).
+
+    Parameters
+    ----------
+    lobe: 2D boolean array (y, x), from get_lobe_mask()
+    halo: number of points added around the lobes
+
+    Returns
+    -------
+    window: tuple of (y slice, x slice) of grid points
+    """
+
+    iy, ix = np.where(lobe)
+    if iy.size == 0:
+        raise ValueError('No grid point inside the lobes')
+    ny, nx = lobe.shape
+    return (slice(max(iy.min() - halo, 0), min(iy.max() + halo + 1, ny)),
+            slice(max(ix.min() - halo, 0), min(ix.max() + halo + 1, nx)))
+
+
+def apply_lobe_mask(grid, lobe, fields=('VT',)):
+    """
+    Mask fields outside the lobes, so the retrieval doesn't use their
+    velocities (only a data mask: the domain is cropped with
+    get_lobe_window()).
+
+    Parameters
+    ----------
+    grid: gridded radar data
+    lobe: 2D boolean array (y, x), from get_lobe_mask()
+    fields: fields to be masked (radial velocity)
+
+    Returns
+    -------
+    grid: gridded radar data with masked fields
+    """
+
+    for field in fields:
+        data = ma.masked_array(grid.fields[field]['data'], copy=True)
+        data[:, ~lobe] = ma.masked
+        grid.fields[field]['data'] = data
+    return grid
+
+
+def export_lobes(lobes, grid, filename):
+    """
+    Write the edges of the lobes as lon, lat points (CSV), to be plotted in
+    General_Processing/plot_dual-doppler_lobes.R.
+
+    Parameters
+    ----------
+    lobes: dictionary of {(combination, min_cba): lobe}, with combinations
+        named as in the R script (e.g. 'SR/FCTH')
+    grid: gridded radar data (grid of the lobes)
+    filename: CSV file
+
+    Returns
+    -------
+    points: pandas DataFrame with lon, lat, combination and angle
+    """
+
+    lons, lats = grid.get_point_longitude_latitude(0)
+    points = []
+    for (combination, min_cba), lobe in lobes.items():
+        edge = lobe & ~ndimage.binary_erosion(lobe)
+        points.append(pd.DataFrame({
+            'lon': lons[edge], 'lat': lats[edge],
+            'combination': combination, 'angle': min_cba}))
+    points = pd.concat(points, ignore_index=True)
+    points.to_csv(filename, index=False)
+    return points
@@ -15,6 +15,7 @@ UPDRAFT VOLUME AND ICE WATER MASS FROM MULTIDOP RETRIEVALS
 """
 
 import gc
+import os
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
@@ -215,32 +216,51 @@ def open_select_upvol_im(
     case,
     zero_height=cv.zerodeg_height,
     forty_height=cv.fortydeg_height,
+    filepath_hid=None,
 ):
     """
     """
 
+    # HID and water masses saved by run_multidop.py on the same grid
+    if filepath_hid is None:
+        filepath_hid = os.path.join(
+            os.path.dirname(filepath_m), "radar_fcth_hid.nc"
+        )
+
     # Reading merged radar + converting to xarray
-    grid = misc.open_object(filepath_m)
-    xgrid = grid.to_xarray().squeeze()
-    del grid
+    if filepath_m.endswith(".pkl"):
+        grid = misc.open_object(filepath_m)
+        xgrid = grid.to_xarray().squeeze()
+        del grid
+    else:
+        # - Grid store (see misc.save_grid_store): only needed fields are read
+        xgrid = misc.open_grid_store(
+            filepath_m, fields=["reflectivity", "upward_air_velocity"]
+        ).squeeze()
 
-    # Reading radar + gridding + calculating mass + converting to xarray
-    radar = rf.read_radar(filepath_r)
-    radar = rf.calculate_radar_hid(radar, sounding)
-    gradar = rf.grid_radar(
-        radar,
-        xlim=cv.grid_xlim,
-        ylim=cv.grid_ylim,
-        fields=["MI"],
-        grid_shape=cv.grid_shape,
-    )
-    xgradar = gradar.to_xarray().squeeze()
-    del radar, gradar
+    if os.path.isfile(filepath_hid):
+        # Joining by grid, without reading the radar volume again
+        xgrid = misc.join_grid_stores(
+            xgrid, misc.open_grid_store(filepath_hid, fields=["MI"]), ["MI"]
+        )
+    else:
+        # Reading radar + gridding + calculating mass + converting to xarray
+        radar = rf.read_radar(filepath_r)
+        radar = rf.calculate_radar_hid(radar, sounding)
+        gradar = rf.grid_radar(
+            radar,
+            xlim=cv.grid_xlim,
+            ylim=cv.grid_ylim,
+            fields=["MI"],
+            grid_shape=cv.grid_shape,
+        )
+        xgradar = gradar.to_xarray().squeeze()
+        del radar, gradar
 
-    # Merging files
-    xgrid = xgrid.assign({"MI": xgradar.MI})
+        # Merging files
+        xgrid = xgrid.assign({"MI": xgradar.MI})
+        del xgradar
     xgrid = xgrid.swap_dims({"x": "lon", "y": "lat"})
-    del xgradar
 
     # Selecting:
     # - Area of interest
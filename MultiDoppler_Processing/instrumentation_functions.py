@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+RETRIEVAL INSTRUMENTATION
+
+- reset_peak_rss()
+- get_peak_rss()
+- run_measured()
+- record_pydda_retrieval()
+- get_dd_wind_field_logged()
+- append_run_log()
+- read_run_log()
+- read_evaluations_log()
+- compare_runs()
+
+Each PyDDA or MultiDop retrieval is written as one JSON line (JSONL file) with
+its parameters, wall time, peak memory (RSS) of that run and, for PyDDA,
+every cost function evaluation (total cost, each term and gradient norm).
+compare_runs() groups runs by parameters (Cm, Cz, max_iterations, ...) to see
+which ones converge faster.
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import pydda
+
+# PyDDA cost function terms and their names in the log
+COST_TERMS = {
+    'calculate_radial_vel_cost_function': 'Jvel',
+    'calculate_mass_continuity': 'Jmass',
+    'calculate_smoothness_cost': 'Jsmooth',
+    'calculate_background_cost': 'Jbackground',
+    'calculate_vertical_vorticity_cost': 'Jvorticity',
+    'calculate_model_cost': 'Jmodel',
+    'calculate_point_cost': 'Jpoint',
+}
+
+
+def reset_peak_rss():
+    """
+    Reset the peak resident memory (RSS) of this process to its current
+    RSS, so get_peak_rss() measures from now on (Linux only).
+
+    Returns
+    -------
+    reset: False if the peak can't be reset (get_peak_rss() is then the
+        peak since the process started)
+    """
+
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def get_peak_rss():
+    """
+    Get peak resident memory (RSS) of this process in MB, since the last
+    reset_peak_rss() (or since the process started).
+    """
+
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    # ru_maxrss is in kB on Linux (never reset)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_measured(args):
+    """
+    Run a command (e.g. the MultiDop DDA engine) and measure that process
+    only (not other children of this process).
+
+    Parameters
+    ----------
+    args: command and arguments
+
+    Returns
+    -------
+    seconds, peak_rss: wall time and peak memory (RSS) in MB of the command
+    """
+
+    bt = time.time()
+    process = subprocess.Popen(args)
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, args)
+    # ru_maxrss is in kB on Linux
+    return time.time() - bt, usage.ru_maxrss / 1024.0
+
+
+def _to_json(value):
+    """
+    Convert parameter values to something JSON can write.
+    """
+
+    if isinstance(value, (str, bool, int, float)) or value is None:
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_to_json(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _float(value):
+    """
+    Float of a cost value (None for values that can't be converted, e.g.
+    traced JAX values).
+    """
+
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_references(names):
+    """
+    Every reference to some functions in the loaded PyDDA modules, as
+    (module, name, function). Functions imported by value (from ... import
+    ...) are found in each module that imported them, so the solver calls
+    the patched ones whatever the PyDDA version.
+    """
+
+    references = []
+    for module_name, module in list(sys.modules.items()):
+        if module is None or module_name.split('.')[0] != 'pydda':
+            continue
+        for name in names:
+            function = vars(module).get(name)
+            if callable(function):
+                references.append((module, name, function))
+    return references
+
+
+@contextmanager
+def record_pydda_retrieval(log_file=None, **run_info):
+    """
+    Record every cost function evaluation of PyDDA retrievals (J_function,
+    grad_J and cost terms are patched in every PyDDA module using them),
+    e.g.:
+
+        with record_pydda_retrieval('retrievals.jsonl', Cm=10.) as record:
+            Grids = pydda.retrieval.get_dd_wind_field(..., Cm=10.)
+        print(record['evaluations'], record['seconds'])
+
+    Parameters
+    ----------
+    log_file: JSONL file where the record is appended. None only returns it
+    **run_info: run name, parameters, etc. saved with the record
+
+    Returns
+    -------
+    record: dictionary with run info, 'evaluations' (# cost function
+        evaluations), 'seconds', 'peak_rss_mb' (peak memory during the
+        block, see reset_peak_rss()) and 'history' (list of {'J', terms,
+        'grad_norm'}), filled when the block ends
+    """
+
+    history = []
+    terms = {}
+    # Depth of J_function and grad_J calls, so only the outer call (from the
+    # solver) is recorded when a version calls another one
+    depth = {'J': 0, 'grad': 0}
+    record = {'engine': 'pydda',
+              'started': datetime.now().isoformat(timespec='seconds')}
+    record.update({key: _to_json(value) for key, value in run_info.items()})
+
+    def wrap_term(function, term):
+        def recorded_term(*args, **kwargs):
+            value = function(*args, **kwargs)
+            terms[term] = _float(value)
+            return value
+        return recorded_term
+
+    def wrap_J(function):
+        def recorded_J_function(*args, **kwargs):
+            if depth['J'] == 0:
+                terms.clear()
+            depth['J'] += 1
+            try:
+                value = function(*args, **kwargs)
+            finally:
+                depth['J'] -= 1
+            if depth['J'] == 0:
+                history.append(dict(terms, J=_float(value)))
+            return value
+        return recorded_J_function
+
+    def wrap_grad(function):
+        def recorded_grad_J(*args, **kwargs):
+            depth['grad'] += 1
+            try:
+                value = function(*args, **kwargs)
+            finally:
+                depth['grad'] -= 1
+            if depth['grad'] == 0 and history:
+                history[-1]['grad_norm'] = _float(
+                    np.linalg.norm(np.asarray(value)))
+            return value
+        return recorded_grad_J
+
+    patched = _get_references(['J_function', 'grad_J'] + list(COST_TERMS))
+    for module, function_name, function in patched:
+        if function_name == 'J_function':
+            setattr(module, function_name, wrap_J(function))
+        elif function_name == 'grad_J':
+            setattr(module, function_name, wrap_grad(function))
+        else:
+            setattr(module, function_name,
+                    wrap_term(function, COST_TERMS[function_name]))
+
+    reset = reset_peak_rss()
+    bt = time.time()
+    try:
+        yield record
+    finally:
+        for module, function_name, function in patched:
+            setattr(module, function_name, function)
+        record['seconds'] = time.time() - bt
+        record['peak_rss_mb'] = get_peak_rss()
+        # Peak of this run, or of the whole process if it can't be reset
+        record['peak_rss_scope'] = 'run' if reset else 'process'
+        record['evaluations'] = len(history)
+        record['history'] = history
+        if history:
+            record['final'] = history[-1]
+        if log_file is not None:
+            append_run_log(log_file, record)
+
+
+def get_dd_wind_field_logged(grids, u_init, v_init, w_init, log_file,
+                             run_name=None, **kwargs):
+    """
+    Retrieve winds with pydda.retrieval.get_dd_wind_field, recording the
+    retrieval (see record_pydda_retrieval()) with its parameters.
+
+    Parameters
+    ----------
+    grids: list of gridded radar data
+    u_init, v_init, w_init: initial wind field
+    log_file: JSONL file where the record is appended
+    run_name: name of the run (e.g. 'SR-FCTH-XPOL')
+    **kwargs: other arguments of pydda.retrieval.get_dd_wind_field (Co, Cm,
+        Cz, frz, max_iterations, ...)
+
+    Returns
+    -------
+    new_grids: retrieved grids
+    """
+
+    with record_pydda_retrieval(log_file, run_name=run_name,
+                                grid_shape=list(u_init.shape),
+                                **kwargs) as record:
+        new_grids = pydda.retrieval.get_dd_wind_field(
+            grids, u_init, v_init, w_init, **kwargs)
+    print(run_name, ':', record['evaluations'], 'cost function evaluations,',
+          record['seconds'], ' seconds,', record['peak_rss_mb'], ' MB')
+
+    return new_grids
+
+
+def append_run_log(log_file, record):
+    """
+    Append a retrieval record as one JSON line.
+    """
+
+    with open(log_file, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+def _read_records(log_files):
+    if isinstance(log_files, str):
+        log_files = [log_files]
+    records = []
+    for log_file in log_files:
+        with open(log_file) as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return records
+
+
+def read_run_log(log_files):
+    """
+    Read retrieval records, one row per run (final cost terms as
+    'final_<term>' columns).
+
+    Parameters
+    ----------
+    log_files: JSONL file or list of files
+
+    Returns
+    -------
+    runs: pandas DataFrame
+    """
+
+    rows = []
+    for record in _read_records(log_files):
+        row = {key: value for key, value in record.items()
+               if key not in ['history', 'final']}
+        for key, value in record.get('final', {}).items():
+            row['final_' + key] = value
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def read_evaluations_log(log_files):
+    """
+    Read every cost function evaluation of the PyDDA records, to plot
+    convergence (one row per evaluation, with run index and run name).
+
+    Parameters
+    ----------
+    log_files: JSONL file or list of files
+
+    Returns
+    -------
+    evaluations: pandas DataFrame
+    """
+
+    rows = []
+    for run, record in enumerate(_read_records(log_files)):
+        for evaluation, values in enumerate(record.get('history', [])):
+            row = {'run': run, 'run_name': record.get('run_name'),
+                   'evaluation': evaluation}
+            row.update(values)
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def compare_runs(log_files, parameters=('Co', 'Cm', 'Cz', 'max_iterations'),
+                 filename=None):
+    """
+    Compare retrievals made with different parameters: mean time,
+    evaluations, peak memory and final cost of the runs with each parameter
+    set, fastest first.
+
+    Parameters
+    ----------
+    log_files: JSONL file or list of files
+    parameters: parameters defining a set (missing ones are ignored)
+    filename: CSV file where the report is saved. None only returns it
+
+    Returns
+    -------
+    report: pandas DataFrame
+    """
+
+    runs = read_run_log(log_files)
+    by = [p for p in ['engine', 'run_name'] + list(parameters)
+          if p in runs.columns]
+    # Lists (e.g. itmax_frprmn) can't be grouped
+    for p in by:
+        runs[p] = runs[p].apply(
+            lambda v: str(v) if isinstance(v, list) else v)
+    metrics = {'seconds': 'mean', 'peak_rss_mb': 'max'}
+    for column in ['evaluations', 'final_J', 'final_grad_norm']:
+        if column in runs.columns:
+            metrics[column] = 'mean'
+
+    report = runs.groupby(by, dropna=False).agg(metrics)
+    report['runs'] = runs.groupby(by, dropna=False).size()
+    report = report.sort_values('seconds').reset_index()
+    if filename is not None:
+        report.to_csv(filename, index=False)
+    return report
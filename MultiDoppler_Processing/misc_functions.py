@@ -5,10 +5,20 @@ MISCELLANEOUS FUNCTIONS
 @author: Camila Lopes (camila.lopes@iag.usp.br)
 """
 
-import numpy as np
+import os
 import pickle
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import xarray as xr
 from matplotlib.colors import LinearSegmentedColormap
 
+import pyart
+
+SOUNDING_WIND_VARIABLES = ('height', 'u_wind', 'v_wind', 'speed',
+                           'direction', 'latitude', 'longitude')
+
 
 def save_object(obj, filename):
     """
@@ -43,6 +53,405 @@ def open_object(filename):
     return obj
 
 
+def _netcdf_attrs(attrs):
+    """
+    Keep only attributes that can be written to NetCDF/Zarr files.
+    """
+
+    clean = {}
+    for key, value in attrs.items():
+        if value is None:
+            continue
+        if isinstance(value, (bool, np.bool_)):
+            value = int(value)
+        if not isinstance(value, (str, int, float, np.number, np.ndarray,
+                                  list, tuple)):
+            value = str(value)
+        clean[key] = value
+    return clean
+
+
+def save_grid_store(grid, filename, fields=None, complevel=4):
+    """
+    Saving Py-ART grid fields in a compressed, chunked file (NetCDF4, or Zarr
+    if filename ends with .zarr), one chunk per level, so fields, levels or
+    sub-boxes can be read later without loading the whole grid (see
+    open_grid_store()). Dimensions and coordinates are the same as
+    grid.to_xarray() (time, z, y, x, with lat and lon).
+
+    Parameters
+    ----------
+    grid: Py-ART grid
+    filename: name of the saved file
+    fields: list of fields to be saved. None saves all fields
+    complevel: compression level (NetCDF4)
+    """
+
+    if fields is None:
+        fields = list(grid.fields.keys())
+
+    lon, lat = grid.get_point_longitude_latitude()
+    coords = {
+        'time': [pd.Timestamp(pyart.util.datetime_from_grid(grid).isoformat())],
+        'z': ('z', grid.z['data'], _netcdf_attrs(
+            {k: v for k, v in grid.z.items() if k != 'data'})),
+        'y': ('y', grid.y['data'], _netcdf_attrs(
+            {k: v for k, v in grid.y.items() if k != 'data'})),
+        'x': ('x', grid.x['data'], _netcdf_attrs(
+            {k: v for k, v in grid.x.items() if k != 'data'})),
+        'lat': ('y', lat[:, 0]),
+        'lon': ('x', lon[0, :]),
+    }
+
+    data_vars = {}
+    encoding = {}
+    chunks = (1, 1, len(grid.y['data']), len(grid.x['data']))
+    for field in fields:
+        attrs = {k: v for k, v in grid.fields[field].items()
+                 if k not in ('data', '_FillValue', 'fill_value',
+                              'missing_value')}
+        data = np.ma.filled(np.ma.asarray(grid.fields[field]['data'],
+                                          dtype=np.float32), np.nan)
+        data_vars[field] = (('time', 'z', 'y', 'x'), data[np.newaxis],
+                            _netcdf_attrs(attrs))
+        fill_value = grid.fields[field].get('_FillValue', np.nan)
+        if filename.endswith('.zarr'):
+            encoding[field] = {'chunks': chunks,
+                               '_FillValue': np.float32(fill_value)}
+        else:
+            encoding[field] = {'zlib': True, 'complevel': complevel,
+                               'chunksizes': chunks,
+                               '_FillValue': np.float32(fill_value)}
+
+    attrs = _netcdf_attrs(grid.metadata)
+    attrs['origin_latitude'] = float(grid.origin_latitude['data'][0])
+    attrs['origin_longitude'] = float(grid.origin_longitude['data'][0])
+    attrs['origin_altitude'] = float(grid.origin_altitude['data'][0])
+    ds = xr.Dataset(data_vars, coords=coords, attrs=attrs)
+
+    if filename.endswith('.zarr'):
+        ds.to_zarr(filename, mode='w', encoding=encoding)
+    else:
+        ds.to_netcdf(filename, format='NETCDF4', encoding=encoding)
+
+
+def open_grid_store(filenames, fields=None, levels=None, xlim=None,
+                    ylim=None):
+    """
+    Open grid files saved by save_grid_store() lazily: only the selected
+    fields, levels and sub-box are read, when the values are used. Several
+    files are joined along time.
+
+    Parameters
+    ----------
+    filenames: name (or list of names) of the saved files
+    fields: list of fields. None keeps all fields
+    levels: level index (or list/slice of level indexes). None keeps all
+    xlim, ylim: sub-box limits in lon, lat
+        (min, max) in degrees. None keeps the whole grid
+
+    Returns
+    -------
+    ds: xarray Dataset with (time, z, y, x) fields
+    """
+
+    if isinstance(filenames, str):
+        filenames = [filenames]
+    engine = 'zarr' if filenames[0].endswith('.zarr') else None
+    if len(filenames) == 1:
+        ds = xr.open_dataset(filenames[0], engine=engine)
+    else:
+        ds = xr.open_mfdataset(filenames, engine=engine, combine='by_coords')
+
+    if fields is not None:
+        ds = ds[fields]
+    if levels is not None:
+        ds = ds.isel(z=levels)
+    if xlim is not None:
+        x_index = np.where((ds.lon.values >= xlim[0]) &
+                           (ds.lon.values <= xlim[1]))[0]
+        ds = ds.isel(x=slice(x_index.min(), x_index.max() + 1))
+    if ylim is not None:
+        y_index = np.where((ds.lat.values >= ylim[0]) &
+                           (ds.lat.values <= ylim[1]))[0]
+        ds = ds.isel(y=slice(y_index.min(), y_index.max() + 1))
+
+    return ds
+
+
+def open_grid_store_as_grid(filename, fields=None, levels=None, time=0):
+    """
+    Open a grid file saved by save_grid_store() as a Py-ART grid, loading
+    only the selected fields and levels.
+
+    Parameters
+    ----------
+    filename: name of the saved file
+    fields: list of fields. None loads all fields
+    levels: level index (or list/slice of level indexes). None loads all
+    time: time index
+
+    Returns
+    -------
+    grid: Py-ART grid
+    """
+
+    ds = open_grid_store(filename, fields=fields, levels=levels).isel(
+        time=[time])
+
+    grid_time = pyart.config.get_metadata('grid_time')
+    grid_time['data'] = np.array([0.0])
+    grid_time['units'] = ('seconds since ' + pd.Timestamp(
+        ds.time.values[0]).strftime('%Y-%m-%dT%H:%M:%SZ'))
+
+    coords = {}
+    for name in ['x', 'y', 'z']:
+        coords[name] = dict(ds[name].attrs)
+        coords[name]['data'] = ds[name].values
+
+    grid_fields = {}
+    for field in ds.data_vars:
+        grid_fields[field] = dict(ds[field].attrs)
+        grid_fields[field]['data'] = np.ma.masked_invalid(
+            ds[field].values[0])
+        grid_fields[field]['_FillValue'] = ds[field].encoding.get(
+            '_FillValue', np.nan)
+
+    metadata = {key: value for key, value in ds.attrs.items()
+                if not key.startswith('origin_')}
+    grid = pyart.core.Grid(
+        grid_time, grid_fields, metadata,
+        {'data': np.array([ds.attrs['origin_latitude']])},
+        {'data': np.array([ds.attrs['origin_longitude']])},
+        {'data': np.array([ds.attrs['origin_altitude']])},
+        coords['x'], coords['y'], coords['z'])
+    ds.close()
+
+    return grid
+
+
+def join_grid_stores(ds, other, fields):
+    """
+    Join fields of another grid store (see open_grid_store()) to ds, when
+    both are on the same grid (same origin, x, y and z), without regridding
+    or reading the fields before they are used.
+
+    Parameters
+    ----------
+    ds: xarray Dataset from open_grid_store()
+    other: xarray Dataset from open_grid_store(), on the same grid
+    fields: list of fields of other to be joined
+
+    Returns
+    -------
+    ds: xarray Dataset with the joined fields
+    """
+
+    for coord in ['x', 'y', 'z']:
+        if (ds[coord].shape != other[coord].shape
+                or not np.allclose(ds[coord].values, other[coord].values)):
+            raise ValueError('Grids are not the same (' + coord + ')')
+    for attr in ['origin_latitude', 'origin_longitude']:
+        if (attr in ds.attrs and attr in other.attrs
+                and not np.isclose(ds.attrs[attr], other.attrs[attr])):
+            raise ValueError('Grids are not the same (' + attr + ')')
+
+    # Each grid has its own time, fields are joined by position
+    if 'time' in other.dims:
+        other = other.isel(time=0, drop=True)
+    return ds.assign({field: other[field].variable for field in fields})
+
+
+def get_sounding_store_filename(store_path, station, date):
+    """
+    Name of the file of a sounding in the local sounding store.
+
+    Parameters
+    ----------
+    store_path: path of the sounding store
+    station: name of the METAR sounding station
+    date: date of the sounding (datetime.datetime)
+
+    Returns
+    -------
+    filename: name of the .npz file of the sounding
+    """
+
+    return os.path.join(store_path,
+                        station + '_' + date.strftime('%Y%m%d%H') + '.npz')
+
+
+def save_sounding_wind_data(store_path, station, date, data):
+    """
+    Saving sounding wind data (height, u/v, speed, direction) in the local
+    sounding store, as a compressed .npz file.
+
+    Parameters
+    ----------
+    store_path: path of the sounding store
+    station: name of the METAR sounding station
+    date: date of the sounding (datetime.datetime)
+    data: dictionary of sounding arrays (see SOUNDING_WIND_VARIABLES)
+
+    Returns
+    -------
+    filename: name of the saved file
+    """
+
+    os.makedirs(store_path, exist_ok=True)
+    filename = get_sounding_store_filename(store_path, station, date)
+    # Writing to a temporary file first, so a crash never leaves a broken file
+    tmp_filename = filename[:-4] + '.tmp.npz'
+    np.savez_compressed(tmp_filename, **{
+        var: np.asarray(data[var], dtype=np.float32)
+        for var in SOUNDING_WIND_VARIABLES if var in data})
+    os.replace(tmp_filename, filename)
+    return filename
+
+
+def open_sounding_wind_data(store_path, station, date):
+    """
+    Open sounding wind data saved in the local sounding store.
+
+    Parameters
+    ----------
+    store_path: path of the sounding store
+    station: name of the METAR sounding station
+    date: date of the sounding (datetime.datetime)
+
+    Returns
+    -------
+    data: dictionary of sounding arrays, or None if not in the store
+    """
+
+    filename = get_sounding_store_filename(store_path, station, date)
+    if not os.path.exists(filename):
+        return None
+    with np.load(filename) as npz:
+        data = {var: npz[var] for var in npz.files}
+    return data
+
+
+def read_wyoming_text_sounding(filename):
+    """
+    Read a sounding saved as text from the University of Wyoming website
+    (TEXT:LIST), e.g. 83779_2017111512Z.txt, and extract wind data.
+
+    Parameters
+    ----------
+    filename: name of the text file
+
+    Returns
+    -------
+    station: name of the METAR sounding station
+    date: date of the sounding (datetime.datetime)
+    data: dictionary of sounding arrays (see SOUNDING_WIND_VARIABLES), with
+        speed, u_wind and v_wind in knots as in siphon
+    """
+
+    with open(filename) as f:
+        lines = f.read().splitlines()
+
+    # Header: "83779 SBMT Marte Civ Observations at 12Z 15 Nov 2017"
+    header = lines[0].split()
+    station = header[1]
+    date = datetime.strptime(' '.join(header[-4:]), '%HZ %d %b %Y')
+
+    # Data between the second and third dashed lines (or end of table),
+    # in fixed-width columns of 7 characters
+    dashes = [i for i, line in enumerate(lines) if line.startswith('-----')]
+    columns = lines[dashes[0] + 1].split()
+    rows = []
+    for line in lines[dashes[1] + 1:]:
+        if not line.strip() or line.startswith('-----') or ':' in line:
+            break
+        rows.append([line[i:i + 7].strip() for i in range(0, 7 * len(columns),
+                                                          7)])
+    table = np.array([[float(value) if value else np.nan for value in row]
+                      for row in rows])
+    table = table[~np.all(np.isnan(table[:, [columns.index('HGHT'),
+                                             columns.index('DRCT'),
+                                             columns.index('SKNT')]]),
+                          axis=1)]
+
+    speed = table[:, columns.index('SKNT')]
+    direction = table[:, columns.index('DRCT')]
+    data = {
+        'height': table[:, columns.index('HGHT')],
+        'speed': speed,
+        'direction': direction,
+        'u_wind': -speed * np.sin(np.deg2rad(direction)),
+        'v_wind': -speed * np.cos(np.deg2rad(direction)),
+    }
+
+    # Station position, if the "Station information" part was saved
+    for line in lines:
+        if 'Station latitude:' in line:
+            data['latitude'] = np.full_like(speed, float(line.split(':')[1]))
+        if 'Station longitude:' in line:
+            data['longitude'] = np.full_like(speed, float(line.split(':')[1]))
+
+    return station, date, data
+
+
+def populate_sounding_store(store_path, filenames):
+    """
+    Pre-populate the local sounding store with Wyoming text soundings, so
+    they can be used offline.
+
+    Parameters
+    ----------
+    store_path: path of the sounding store
+    filenames: list of text files (see read_wyoming_text_sounding())
+
+    Returns
+    -------
+    saved: list of saved .npz files
+    """
+
+    saved = []
+    for filename in filenames:
+        station, date, data = read_wyoming_text_sounding(filename)
+        saved.append(save_sounding_wind_data(store_path, station, date, data))
+    return saved
+
+
+def get_sounding_wind_data(date, station, fetcher, store_path=None):
+    """
+    Get sounding wind data from the local sounding store or, if not there,
+    with fetcher (saving the result in the store for the next time).
+
+    Parameters
+    ----------
+    date: date of the sounding (datetime.datetime)
+    station: name of the METAR sounding station
+    fetcher: function (date, station) returning a DataFrame with height,
+        speed, direction, u_wind and v_wind columns, as
+        WyomingUpperAir.request_data
+    store_path: path of the sounding store. None always uses fetcher
+
+    Returns
+    -------
+    data: dictionary of sounding arrays (see SOUNDING_WIND_VARIABLES)
+    """
+
+    if store_path is not None:
+        data = open_sounding_wind_data(store_path, station, date)
+        if data is not None:
+            return data
+
+    sounding = fetcher(date, station)
+    sounding = sounding.dropna(subset=('height', 'speed', 'direction',
+                                       'u_wind', 'v_wind'), how='all')
+    data = {var: sounding[var].values for var in SOUNDING_WIND_VARIABLES
+            if var in sounding}
+
+    if store_path is not None:
+        save_sounding_wind_data(store_path, station, date, data)
+
+    return data
+
+
 def check_sounding_for_montonic(sounding):
     """
     Force sounding data to be monotonic.
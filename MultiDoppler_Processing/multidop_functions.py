@@ -13,8 +13,10 @@ Based on MultiDop Sample Workflow Notebook by Timothy Lang.
 @author: Camila Lopes (camila.lopes@iag.usp.br)
 """
 
+import os
 import time
 from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import numpy.ma as ma
@@ -26,7 +28,11 @@ import pyart
 import multidop
 from siphon.simplewebservice.wyoming import WyomingUpperAir
 
-from radar_functions import read_radar, add_field_to_grid_object
+from radar_functions import (read_radar, add_field_to_grid_object,
+                             alias_field, crop_grid, paste_grid_fields)
+from misc_functions import get_sounding_wind_data
+from instrumentation_functions import run_measured, append_run_log
+from geometry_functions import apply_lobe_mask, get_lobe_window
 
 
 def read_uf(filename):
@@ -47,12 +53,8 @@ def read_uf(filename):
 
     radar = pyart.io.read_uf(filename)
 
-    cp = deepcopy(radar.fields['corrected_reflectivity']['data'])
-    radar.add_field_like('corrected_reflectivity', 'DT', cp,
-                         replace_existing=True)
-    cp = deepcopy(radar.fields['corrected_velocity']['data'])
-    radar.add_field_like('corrected_velocity', 'VT', cp,
-                         replace_existing=True)
+    radar = alias_field(radar, 'corrected_reflectivity', 'DT')
+    radar = alias_field(radar, 'corrected_velocity', 'VT')
 
     # Adding missing_value
     try:
@@ -97,8 +99,7 @@ def read_dealise_region(filename, dbz_field='corrected_reflectivity',
     radar = read_radar(filename)
 
     # Dealising
-    cp = deepcopy(radar.fields[dbz_field]['data'])
-    radar.add_field_like(dbz_field, 'DT', cp, replace_existing=True)
+    radar = alias_field(radar, dbz_field, 'DT')
     gatefilter = pyart.correct.GateFilter(radar)
     gatefilter.exclude_masked(dbz_field)
     corr_vel = pyart.correct.dealias_region_based(radar, vel_field=vel_field,
@@ -125,44 +126,39 @@ def read_dealise_region(filename, dbz_field='corrected_reflectivity',
 
     # Defining original and corrected velocity fieds
     if vel_field == 'corrected_velocity':
-        radar.add_field_like(vel_field, 'velocity',
-                             deepcopy(radar.fields[vel_field]['data']),
-                             replace_existing=True)
-        radar.add_field_like('VT', vel_field,
-                             deepcopy(radar.fields['VT']['data']),
-                             replace_existing=True)
-    else:
-        radar.add_field_like('VT', 'corrected_velocity',
-                             deepcopy(radar.fields['VT']['data']),
-                             replace_existing=True)
+        radar = alias_field(radar, vel_field, 'velocity')
+    radar = alias_field(radar, 'VT', 'corrected_velocity')
 
     return radar
 
 
-def acquire_sounding_wind_data(date, station):
+def acquire_sounding_wind_data(date, station, store_path=None,
+                               fetcher=WyomingUpperAir.request_data):
     """
-    Get sounding data using siphon, extract necessary variables and return a
-    dictionary with heigth and wind data for pyart FourDD algorithm.
+    Get sounding data using siphon (or the local sounding store, see
+    misc_functions.get_sounding_wind_data()), extract necessary variables and
+    return a dictionary with heigth and wind data for pyart FourDD algorithm.
 
     Parameters
     ----------
     date: date of the sounding (datetime.datetime)
     station: name of the METAR sounding station
+    store_path: path of the local sounding store. None always requests data
+        from the Wyoming website
+    fetcher: function used when the sounding is not in the store
 
     Returns
     -------
     d: "dictionary" of sounding wind data
     """
 
-    sounding = WyomingUpperAir.request_data(date, station)
-    sounding = sounding.dropna(subset=('height', 'speed', 'direction',
-                                       'u_wind', 'v_wind'), how='all')
+    sounding = get_sounding_wind_data(date, station, fetcher, store_path)
 
-    height = sounding['height'].values
-    speed = sounding['speed'].values
-    direction = sounding['direction'].values
-    u_wind = sounding['u_wind'].values
-    v_wind = sounding['v_wind'].values
+    height = sounding['height']
+    speed = sounding['speed']
+    direction = sounding['direction']
+    u_wind = sounding['u_wind']
+    v_wind = sounding['v_wind']
 
     class MyDict(dict):
         pass
@@ -179,7 +175,7 @@ def acquire_sounding_wind_data(date, station):
 
 def read_dealise_4dd(filename, date, station,
                      dbz_field='corrected_reflectivity',
-                     vel_field='corrected_velocity'):
+                     vel_field='corrected_velocity', store_path=None):
     """
     Reading radar data with radar_funs and:
     - Dealise data with pyart FourDD algorithm
@@ -193,6 +189,7 @@ def read_dealise_4dd(filename, date, station,
     station: name of the METAR sounding station
     dbz_field: name of the reflectivity field to be used
     vel_field: name of the velocity field to be used
+    store_path: path of the local sounding store
 
     Returns
     -------
@@ -203,11 +200,10 @@ def read_dealise_4dd(filename, date, station,
     radar = read_radar(filename)
 
     # Getting sounding data
-    sounding = acquire_sounding_wind_data(date, station)
+    sounding = acquire_sounding_wind_data(date, station, store_path)
 
     # Dealising
-    cp = deepcopy(radar.fields[dbz_field]['data'])
-    radar.add_field_like(dbz_field, 'DT', cp, replace_existing=True)
+    radar = alias_field(radar, dbz_field, 'DT')
     gatefilter = pyart.correct.GateFilter(radar)
     gatefilter.exclude_transition()
     gatefilter.exclude_invalid(vel_field)
@@ -236,15 +232,231 @@ def read_dealise_4dd(filename, date, station,
 
     # Defining original and corrected velocity fieds
     if vel_field == 'corrected_velocity':
-        radar.add_field_like(vel_field, 'velocity',
-                             deepcopy(radar.fields[vel_field]['data']),
-                             replace_existing=True)
-        radar.add_field_like('VT', vel_field,
-                             deepcopy(radar.fields['VT']['data']),
-                             replace_existing=True)
-    else:
-        radar.add_field_like('VT', 'corrected_velocity',
-                             deepcopy(radar.fields['VT']['data']),
-                             replace_existing=True)
+        radar = alias_field(radar, vel_field, 'velocity')
+    radar = alias_field(radar, 'VT', 'corrected_velocity')
 
     return radar
+
+
+def set_grid_params(params, grid, xlim, ylim, grid_spacing, grid_shape):
+    """
+    Update MultiDop parameters with the grid specifications.
+
+    Parameters
+    ----------
+    params: MultiDop parameters (see multidop_parameters.py)
+    grid: gridded radar data used as origin
+    xlim, ylim: grid limits in x, y
+        (min, max) in meters
+    grid_spacing: grid spacing in meters
+    grid_shape: grid shape specifications
+        (# points in z, # points in y, # points in x)
+
+    Returns
+    -------
+    params: updated copy of MultiDop parameters
+    """
+
+    params = deepcopy(params)
+    params['x'] = [xlim[0], grid_spacing, grid_shape[2]]
+    params['y'] = [ylim[0], grid_spacing, grid_shape[1]]
+    params['z'][1] = grid_spacing
+    params['grid'] = [grid.origin_longitude['data'][0],
+                      grid.origin_latitude['data'][0], 0.0]
+    return params
+
+
+def write_combination_params(params, name, radar_names, grid_files,
+                             sseq_trip, workdir):
+    """
+    Write MultiDop parameter files of a radar combination in its own working
+    directory, so several combinations can run at the same time.
+
+    Parameters
+    ----------
+    params: MultiDop parameters with grid specifications
+        (see set_grid_params())
+    name: name of the combination (e.g. 'sr-fcth')
+    radar_names: list of radar names (e.g. ['SR', 'FCTH'])
+    grid_files: list of gridded radar .nc files, in the same order
+    sseq_trip: sseq_trip parameter of the combination
+    workdir: working directory of the combination
+
+    Returns
+    -------
+    param_file: name of the MultiDop parameter file
+    writeout: name of the MultiDop output file
+    """
+
+    workdir = os.path.abspath(workdir)
+    os.makedirs(workdir, exist_ok=True)
+
+    params = deepcopy(params)
+    params['dir'] = workdir + os.sep
+    params['files'] = [os.path.abspath(f) for f in grid_files]
+    params['radar_names'] = radar_names
+    params['sseq_trip'] = sseq_trip
+    params['calc_params'] = os.path.join(workdir, 'calculations.dda')
+    params['writeout'] = os.path.join(workdir, name + '_output')
+
+    param_file = os.path.join(workdir, name + '.dda')
+    multidop.parameters.ParamFile(params, param_file)
+    multidop.parameters.CalcParamFile(params, params['calc_params'])
+
+    return param_file, params['writeout']
+
+
+def _run_combination(task):
+    """
+    Execute the DDA engine for one radar combination and make the final
+    grid. Runs in a worker process, inside the combination working directory.
+
+    Parameters
+    ----------
+    task: tuple of (case, combination name, parameter file, output file,
+        gridded radar files, DDA engine path, lobe window and full domain
+        gridded radar file). Results of a window are pasted back into the
+        full domain (window None uses the whole grid)
+
+    Returns
+    -------
+    case, name, final_grid, elapsed, peak_rss: case, combination name,
+        CF/Py-ART compliant grid, minutes taken by the DDA engine and its peak
+        memory in MB
+    """
+
+    (case, name, param_file, writeout, grid_files, dda_path, window,
+     full_file) = task
+    os.chdir(os.path.dirname(param_file))
+
+    # As multidop.execute.do_analysis(), measuring this DDA run only (a
+    # reused worker has run other ones before)
+    seconds, peak_rss = run_measured([dda_path, param_file])
+    elapsed = seconds / 60.0
+
+    # Baseline output is not CF or Py-ART compliant. This function fixes that.
+    grids = [pyart.io.read_grid(f) for f in grid_files]
+    final_grid = multidop.grid_io.make_new_grid(grids, writeout)
+    if window is not None:
+        final_grid = paste_grid_fields(
+            crop_grid(pyart.io.read_grid(full_file),
+                      (slice(None), slice(None)), fields=[]),
+            final_grid, window)
+
+    return case, name, final_grid, elapsed, peak_rss
+
+
+def write_lobe_masked_grids(grid_files, lobe, workdir, fields=('VT',)):
+    """
+    Write copies of gridded radar files cropped to the lobes of a
+    combination (see geometry_functions.get_lobe_mask() and
+    get_lobe_window()), so the DDA engine only builds and iterates over
+    that window, with fields masked outside the lobes.
+
+    Parameters
+    ----------
+    grid_files: list of gridded radar .nc files
+    lobe: 2D boolean array (y, x), True inside the lobes
+    workdir: working directory of the combination
+    fields: fields to be masked (radial velocity)
+
+    Returns
+    -------
+    masked_files: list of cropped and masked gridded radar .nc files
+    window: tuple of (y slice, x slice) of the crop
+    grid: first cropped grid (for the DDA grid specifications)
+    """
+
+    window = get_lobe_window(lobe)
+    masked_files = []
+    for grid_file in grid_files:
+        grid = apply_lobe_mask(
+            crop_grid(pyart.io.read_grid(grid_file), window),
+            lobe[window], fields)
+        masked_file = os.path.join(workdir, os.path.basename(grid_file))
+        pyart.io.write_grid(masked_file, grid)
+        masked_files.append(masked_file)
+        if len(masked_files) == 1:
+            first_grid = grid
+    return masked_files, window, first_grid
+
+
+def run_multidop_combinations(cases, params, combinations, dda_path,
+                              nprocs=None, log_file=None, lobe_masks=None):
+    """
+    Execute MultiDop for all radar combinations of all cases in a process
+    pool. Each combination gets its own working directory
+    (case path + 'multidop_' + combination name) with its parameter files.
+
+    Parameters
+    ----------
+    cases: dictionary of {case path: {radar name: gridded radar .nc file}}
+    params: MultiDop parameters with grid specifications
+        (see set_grid_params())
+    combinations: dictionary of {combination name: sseq_trip}, with radar
+        names joined by '-' (e.g. {'sr-fcth': [0.001, 1.0]})
+    dda_path: path of the DDA engine
+    nprocs: maximum number of simultaneous DDA runs. None uses all CPUs
+    log_file: JSONL file where each run (parameters, minutes and peak
+        memory) is appended, see instrumentation_functions.compare_runs()
+    lobe_masks: dictionary of {case path: {combination name: lobe}}. The
+        DDA engine only runs over the window of the lobes (velocities
+        outside them masked), and results are pasted back into the whole
+        grid. None uses the whole grid
+
+    Returns
+    -------
+    final_grids: dictionary of {(case path, combination name): grid}
+    """
+
+    tasks = []
+    task_params = {}
+    for case, grid_files in cases.items():
+        for name, sseq_trip in combinations.items():
+            radar_names = name.upper().split('-')
+            # Combination not available for this case
+            if not all(radar in grid_files for radar in radar_names):
+                continue
+            files = [grid_files[radar] for radar in radar_names]
+            full_file = os.path.abspath(files[0])
+            workdir = os.path.join(case, 'multidop_' + name)
+            combination_params = params
+            window = None
+            if lobe_masks is not None and name in lobe_masks.get(case, {}):
+                os.makedirs(workdir, exist_ok=True)
+                files, window, grid = write_lobe_masked_grids(
+                    files, lobe_masks[case][name], workdir)
+                combination_params = set_grid_params(
+                    params, grid, (grid.x['data'][0], grid.x['data'][-1]),
+                    (grid.y['data'][0], grid.y['data'][-1]),
+                    params['x'][1], (grid.nz, grid.ny, grid.nx))
+            param_file, writeout = write_combination_params(
+                combination_params, name, radar_names, files, sseq_trip,
+                workdir)
+            task_params[(case, name)] = combination_params
+            tasks.append((case, name, param_file, writeout,
+                          [os.path.abspath(f) for f in files], dda_path,
+                          window, full_file))
+
+    print('-- Starting DDA engine for', len(tasks), 'combinations --')
+    bt = time.time()
+    final_grids = {}
+    with ProcessPoolExecutor(max_workers=nprocs) as executor:
+        for case, name, final_grid, elapsed, peak_rss in executor.map(
+                _run_combination, tasks):
+            print(case, name, ':', elapsed, ' minutes to process')
+            final_grids[(case, name)] = final_grid
+            if log_file is not None:
+                record = {key: task_params[(case, name)][key] for key in
+                          ['C1b', 'C2b', 'C3b', 'C4b', 'C5b', 'C8b',
+                           'itmax_frprmn', 'itmax_dbrent', 'min_cba',
+                           'x', 'y', 'z']}
+                record.update({'engine': 'multidop', 'case': case,
+                               'run_name': name,
+                               'sseq_trip': combinations[name],
+                               'seconds': elapsed * 60.0,
+                               'peak_rss_mb': peak_rss})
+                append_run_log(log_file, record)
+    print((time.time() - bt) / 60.0, ' minutes to process all combinations')
+
+    return final_grids
@@ -38,3 +38,11 @@ params = {'dir': './',
 'cvg_bg': [0, 0, 0],
 'cvg_fil': [0, 0, 0],
 'sseq_trip': [0.0, 0.0, 0.0]}
+
+# Radar combinations (radar names joined by '-') and their sseq_trip
+combinations = {
+    'sr-fcth': [0.001, 1.0],
+    'sr-xpol': [0.001, 1.0],
+    'fcth-xpol': [1.0, 1.0],
+    'sr-fcth-xpol': [0.001, 1.0, 1.0],
+}
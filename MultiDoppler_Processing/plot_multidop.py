@@ -15,15 +15,20 @@ Based on MultiDop Sample Workflow Notebook by Timothy Lang.
 """
 
 
+import os
+
 import misc_functions as misc
 from radar_functions import plot_gridded_wind_dbz_panel
 import custom_vars as cv
 import custom_cbars
 
 # Reading/plotting results
-for filename in cv.filenames_pkl:
-    name = filename.split('/')[2].split('_')[0].replace('-', '/').upper()
-    grid = misc.open_object(filename)
+for filename in cv.filenames_grid:
+    name = os.path.basename(filename).split('_')[0].replace('-', '/').upper()
+    # - Loading only the fields used in the panel
+    grid = misc.open_grid_store_as_grid(
+        filename, fields=['reflectivity', 'eastward_wind', 'northward_wind',
+                          'upward_air_velocity'])
     grid.fields['reflectivity']['long_name'] = (
         "Refletividade Combinada dos Radares ")  # pt-br
     plot_gridded_wind_dbz_panel(
@@ -14,10 +14,12 @@ Based on MultiDop Sample Workflow Notebook by Timothy Lang.
 @author: Camila Lopes (camila.lopes@iag.usp.br)
 """
 
+import os
+import sys
+
 import numpy as np
 import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
-from cartopy.io.shapereader import Reader
 from cartopy.feature import ShapelyFeature
 
 import pyart
@@ -25,6 +27,11 @@ import pydda
 
 import custom_vars as cv
 
+# Shared shapefile geometry cache (General_Processing/shapefile_functions.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'General_Processing'))
+from shapefile_functions import get_shape_collection
+
 
 Grids = [pyart.io.read_grid('grid1_SR-FCTH-XPOL.nc'),
          pyart.io.read_grid('grid2_SR-FCTH-XPOL.nc'),
@@ -50,8 +57,10 @@ pydda.vis.plot_horiz_xsection_quiver_map(
     w_vel_contours=(5, 45), contour_alpha=0,
     quiver_spacing_x_km=5, quiver_spacing_y_km=5, quiverkey_len=5, quiver_width=0.005)
 # ax.add_feature(shape_feature)
-ax.add_geometries(Reader(shp_name).geometries(),
-                  ccrs.PlateCarree(), facecolor='none', edgecolor='gray')
+ax.add_collection(get_shape_collection(
+    shp_name, extent=[cv.xlim[0], cv.xlim[1], cv.ylim[0], cv.ylim[1]],
+    projection=ccrs.PlateCarree(), edgecolor='gray', linewidth=1.0),
+    autolim=False)
 plt.plot(cv.hailpad[0], cv.hailpad[1], 'kX',
          markersize=15, markerfacecolor='w', alpha=0.75)
 ax.set_xlim(cv.xlim)
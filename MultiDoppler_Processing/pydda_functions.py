@@ -14,20 +14,25 @@ Based on MultiDop Sample Workflow Notebook by Timothy Lang.
 """
 
 import time
-from copy import deepcopy
 
 import numpy as np
 import numpy.ma as ma
+import scipy.ndimage as ndimage
 import matplotlib.pyplot as plt
 from matplotlib.gridspec import GridSpec
 from mpl_toolkits.basemap import cm
 
 import pyart
+import pydda
 from pyart.core import HorizontalWindProfile
 # import multidop
 from siphon.simplewebservice.wyoming import WyomingUpperAir
 
-from radar_functions import read_radar, add_field_to_grid_object
+from radar_functions import (read_radar, add_field_to_grid_object,
+                             alias_field, get_aoi_window, crop_grid,
+                             paste_grid_fields)
+from misc_functions import get_sounding_wind_data
+from instrumentation_functions import record_pydda_retrieval
 
 def read_uf(filename):
     """
@@ -47,12 +52,8 @@ def read_uf(filename):
 
     radar = pyart.io.read_uf(filename)
 
-    cp = deepcopy(radar.fields['corrected_reflectivity']['data'])
-    radar.add_field_like('corrected_reflectivity', 'DT', cp,
-                         replace_existing=True)
-    cp = deepcopy(radar.fields['corrected_velocity']['data'])
-    radar.add_field_like('corrected_velocity', 'VT', cp,
-                         replace_existing=True)
+    radar = alias_field(radar, 'corrected_reflectivity', 'DT')
+    radar = alias_field(radar, 'corrected_velocity', 'VT')
 
     # Adding missing_value
     try:
@@ -97,8 +98,7 @@ def read_dealise_region(filename, dbz_field='corrected_reflectivity',
     radar = read_radar(filename)
 
     # Dealising
-    cp = deepcopy(radar.fields[dbz_field]['data'])
-    radar.add_field_like(dbz_field, 'DT', cp, replace_existing=True)
+    radar = alias_field(radar, dbz_field, 'DT')
     gatefilter = pyart.correct.GateFilter(radar)
     gatefilter.exclude_masked(dbz_field)
     corr_vel = pyart.correct.dealias_region_based(radar, vel_field=vel_field,
@@ -125,44 +125,39 @@ def read_dealise_region(filename, dbz_field='corrected_reflectivity',
 
     # Defining original and corrected velocity fieds
     if vel_field == 'corrected_velocity':
-        radar.add_field_like(vel_field, 'velocity',
-                             deepcopy(radar.fields[vel_field]['data']),
-                             replace_existing=True)
-        radar.add_field_like('VT', vel_field,
-                             deepcopy(radar.fields['VT']['data']),
-                             replace_existing=True)
-    else:
-        radar.add_field_like('VT', 'corrected_velocity',
-                             deepcopy(radar.fields['VT']['data']),
-                             replace_existing=True)
+        radar = alias_field(radar, vel_field, 'velocity')
+    radar = alias_field(radar, 'VT', 'corrected_velocity')
 
     return radar
 
 
-def acquire_sounding_wind_data(date, station):
+def acquire_sounding_wind_data(date, station, store_path=None,
+                               fetcher=WyomingUpperAir.request_data):
     """
-    Get sounding data using siphon, extract necessary variables and return a
-    dictionary with heigth and wind data for pyart FourDD algorithm.
+    Get sounding data using siphon (or the local sounding store, see
+    misc_functions.get_sounding_wind_data()), extract necessary variables and
+    return a dictionary with heigth and wind data for pyart FourDD algorithm.
 
     Parameters
     ----------
     date: date of the sounding (datetime.datetime)
     station: name of the METAR sounding station
+    store_path: path of the local sounding store. None always requests data
+        from the Wyoming website
+    fetcher: function used when the sounding is not in the store
 
     Returns
     -------
     d: "dictionary" of sounding wind data
     """
 
-    sounding = WyomingUpperAir.request_data(date, station)
-    sounding = sounding.dropna(subset=('height', 'speed', 'direction',
-                                       'u_wind', 'v_wind'), how='all')
+    sounding = get_sounding_wind_data(date, station, fetcher, store_path)
 
-    height = sounding['height'].values
-    speed = sounding['speed'].values
-    direction = sounding['direction'].values
-    lat = sounding['latitude'].values
-    lon = sounding['longitude'].values
+    height = sounding['height']
+    speed = sounding['speed']
+    direction = sounding['direction']
+    lat = sounding.get('latitude')
+    lon = sounding.get('longitude')
 
     profile = HorizontalWindProfile(
         height, speed, direction, latitude=lat, longitude=lon)
@@ -172,7 +167,7 @@ def acquire_sounding_wind_data(date, station):
 
 def read_dealise_4dd(filename, date, station,
                      dbz_field='corrected_reflectivity',
-                     vel_field='corrected_velocity'):
+                     vel_field='corrected_velocity', store_path=None):
     """
     Reading radar data with radar_funs and:
     - Dealise data with pyart FourDD algorithm
@@ -186,6 +181,7 @@ def read_dealise_4dd(filename, date, station,
     station: name of the METAR sounding station
     dbz_field: name of the reflectivity field to be used
     vel_field: name of the velocity field to be used
+    store_path: path of the local sounding store
 
     Returns
     -------
@@ -196,11 +192,10 @@ def read_dealise_4dd(filename, date, station,
     radar = read_radar(filename)
 
     # Getting sounding data
-    sounding = acquire_sounding_wind_data(date, station)
+    sounding = acquire_sounding_wind_data(date, station, store_path)
 
     # Dealising
-    cp = deepcopy(radar.fields[dbz_field]['data'])
-    radar.add_field_like(dbz_field, 'DT', cp, replace_existing=True)
+    radar = alias_field(radar, dbz_field, 'DT')
     gatefilter = pyart.correct.GateFilter(radar)
     gatefilter.exclude_transition()
     gatefilter.exclude_invalid(vel_field)
@@ -229,15 +224,193 @@ def read_dealise_4dd(filename, date, station,
 
     # Defining original and corrected velocity fieds
     if vel_field == 'corrected_velocity':
-        radar.add_field_like(vel_field, 'velocity',
-                             deepcopy(radar.fields[vel_field]['data']),
-                             replace_existing=True)
-        radar.add_field_like('VT', vel_field,
-                             deepcopy(radar.fields['VT']['data']),
-                             replace_existing=True)
-    else:
-        radar.add_field_like('VT', 'corrected_velocity',
-                             deepcopy(radar.fields['VT']['data']),
-                             replace_existing=True)
+        radar = alias_field(radar, vel_field, 'velocity')
+    radar = alias_field(radar, 'VT', 'corrected_velocity')
 
     return radar
+
+
+def fill_masked(field, fill):
+    """
+    Replace masked or invalid values of a field.
+
+    Parameters
+    ----------
+    field: (masked) array
+    fill: value or array with the same shape as field
+
+    Returns
+    -------
+    array without masked values
+    """
+
+    field = ma.masked_invalid(field)
+    return np.where(ma.getmaskarray(field), fill, ma.getdata(field))
+
+
+def advect_wind_field(u, v, w, grid, storm_motion, seconds):
+    """
+    Move a wind field with the mean storm motion, to be used as first guess of
+    the next time step. Points coming from outside the domain are filled with
+    the nearest values.
+
+    Parameters
+    ----------
+    u, v, w: wind components (z, y, x)
+    grid: Py-ART grid of the wind field
+    storm_motion: (u, v) mean storm motion in m/s
+    seconds: time interval in seconds
+
+    Returns
+    -------
+    u, v, w: advected wind components
+    """
+
+    dx = np.mean(np.diff(grid.x['data']))
+    dy = np.mean(np.diff(grid.y['data']))
+    shift = (0, storm_motion[1] * seconds / dy, storm_motion[0] * seconds / dx)
+    return [ndimage.shift(field, shift, order=1, mode='nearest')
+            for field in (u, v, w)]
+
+
+def retrieve_winds_time_series(grid_sequence, sounding, storm_motion=None,
+                               base_index=1, compare_cold_start=False,
+                               vel_name='VT', refl_field='DT', **kwargs):
+    """
+    Retrieving winds with PyDDA for a sequence of times. The first time starts
+    from the sounding profile, the next ones from the winds of the previous
+    time, advected by the mean storm motion (warm start), which usually needs
+    fewer cost function evaluations to converge.
+
+    Parameters
+    ----------
+    grid_sequence: list of lists of gridded radar data, one list per time
+        (e.g. [[grid_sr, grid_fcth, grid_xpol], ...])
+    sounding: sounding wind data, from acquire_sounding_wind_data()
+    storm_motion: (u, v) mean storm motion in m/s. None uses the mean wind of
+        the previous retrieval
+    base_index: index of the grid used for the initial condition
+        (1, FCTH, in run_pydda.py)
+    compare_cold_start: if True, also retrieve each warm-started time from the
+        sounding profile, to measure the evaluations and time saved
+    vel_name, refl_field: velocity and reflectivity fields
+    **kwargs: other arguments of pydda.retrieval.get_dd_wind_field (Co, Cm,
+        Cz, frz, ...)
+
+    Returns
+    -------
+    retrieved: list of lists of retrieved grids, one list per time
+    log: list of dictionaries with, per time: cost function evaluations,
+        seconds and (if compare_cold_start) the same for the cold start
+    """
+
+    def retrieve(grids, u_init, v_init, w_init):
+        with record_pydda_retrieval() as record:
+            new_grids = pydda.retrieval.get_dd_wind_field(
+                grids, u_init, v_init, w_init, vel_name=vel_name,
+                refl_field=refl_field, **kwargs)
+        # Newer PyDDA versions also return the parameters
+        if isinstance(new_grids, tuple):
+            new_grids = new_grids[0]
+        return new_grids, record['evaluations'], record['seconds']
+
+    retrieved = []
+    log = []
+    previous = None
+    for step, grids in enumerate(grid_sequence):
+        base = grids[base_index]
+        grid_time = pyart.util.datetime_from_grid(base)
+        u_prof, v_prof, w_prof = (
+            pydda.initialization.make_wind_field_from_profile(
+                base, sounding, vel_field=vel_name))
+
+        if previous is None:
+            u_init, v_init, w_init = u_prof, v_prof, w_prof
+        else:
+            prev_grid, prev_time = previous
+            u_prev = prev_grid.fields['u']['data']
+            v_prev = prev_grid.fields['v']['data']
+            w_prev = prev_grid.fields['w']['data']
+            motion = storm_motion
+            if motion is None:
+                motion = (float(np.ma.mean(u_prev)), float(np.ma.mean(v_prev)))
+            # Outside the previous analysis, use the sounding profile
+            u_init, v_init, w_init = advect_wind_field(
+                fill_masked(u_prev, u_prof), fill_masked(v_prev, v_prof),
+                fill_masked(w_prev, 0.0), prev_grid, motion,
+                (grid_time - prev_time).total_seconds())
+
+        new_grids, evaluations, seconds = retrieve(grids, u_init, v_init,
+                                                   w_init)
+        record = {'step': step, 'time': str(grid_time),
+                  'warm_start': previous is not None,
+                  'evaluations': evaluations, 'seconds': seconds}
+        print('Step', step, '(' + str(grid_time) + '):', evaluations,
+              'cost function evaluations,', seconds, ' seconds to retrieve')
+
+        if compare_cold_start and previous is not None:
+            cold_grids, cold_evaluations, cold_seconds = retrieve(
+                grids, u_prof, v_prof, w_prof)
+            del cold_grids
+            record['cold_evaluations'] = cold_evaluations
+            record['cold_seconds'] = cold_seconds
+            record['evaluations_saved'] = cold_evaluations - evaluations
+            record['seconds_saved'] = cold_seconds - seconds
+            print('- cold start:', cold_evaluations,
+                  'cost function evaluations,', cold_seconds, ' seconds')
+
+        retrieved.append(new_grids)
+        log.append(record)
+        previous = (new_grids[base_index], grid_time)
+
+    return retrieved, log
+
+
+def get_dd_wind_field_cropped(grids, sounding, xlim_aoi, ylim_aoi,
+                              halo=10000.0, base_index=1, vel_name='VT',
+                              refl_field='DT', **kwargs):
+    """
+    Retrieving winds with PyDDA only over an area of interest (the storm) plus
+    a halo around it, instead of the whole grid. The cost of each iteration
+    scales with the number of grid points, so a small storm in a big domain
+    converges much faster. Winds are pasted back into the full domain (masked
+    outside the retrieval window).
+
+    Parameters
+    ----------
+    grids: list of gridded radar data (e.g. [grid_sr, grid_fcth, grid_xpol])
+    sounding: sounding wind data, from acquire_sounding_wind_data()
+    xlim_aoi, ylim_aoi: limits of the area of interest in lon, lat
+        (min, max) in degrees
+    halo: distance added around the area of interest, in meters
+    base_index: index of the grid used for the initial condition
+        (1, FCTH, in run_pydda.py)
+    vel_name, refl_field: velocity and reflectivity fields
+    **kwargs: other arguments of pydda.retrieval.get_dd_wind_field (Co, Cm,
+        Cz, frz, ...)
+
+    Returns
+    -------
+    grids: list of gridded radar data with u, v and w fields in the full
+        domain
+    """
+
+    window = get_aoi_window(grids[base_index], xlim_aoi, ylim_aoi, halo=halo)
+    sub_grids = [crop_grid(grid, window) for grid in grids]
+    print('Retrieval window:', sub_grids[base_index].nx, 'x',
+          sub_grids[base_index].ny, 'of', grids[base_index].nx, 'x',
+          grids[base_index].ny, 'grid points')
+
+    u_init, v_init, w_init = pydda.initialization.make_wind_field_from_profile(
+        sub_grids[base_index], sounding, vel_field=vel_name)
+    bt = time.time()
+    new_grids = pydda.retrieval.get_dd_wind_field(
+        sub_grids, u_init, v_init, w_init, vel_name=vel_name,
+        refl_field=refl_field, **kwargs)
+    # Newer PyDDA versions also return the parameters
+    if isinstance(new_grids, tuple):
+        new_grids = new_grids[0]
+    print(time.time() - bt, ' seconds to retrieve')
+
+    return [paste_grid_fields(grid, new_grid, window, fields=['u', 'v', 'w'])
+            for grid, new_grid in zip(grids, new_grids)]
@@ -5,6 +5,8 @@ GENERAL FUNCTIONS TO DEAL WITH RADAR DATA
 @author: Camila Lopes (camila.lopes@iag.usp.br)
 """
 
+import os
+import sys
 import time
 from copy import deepcopy
 
@@ -22,6 +24,7 @@ import pyart
 
 try:
     import multidop
+    from geometry_functions import add_geometry_fields
 except ModuleNotFoundError:
     pass
     # try:
@@ -31,10 +34,16 @@ from csu_radartools import csu_fhc, csu_liquid_ice_mass
 # except ModuleNotFoundError:
 # pass
 
-from cpt_convert import loadCPT
 from read_brazil_radar_py3 import read_rainbow_hdf5
 from misc_functions import check_sounding_for_montonic
 
+# Shared shapefile cache, cross-sections and colortables (General_Processing)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "General_Processing"))
+from shapefile_functions import get_shape_collection
+from cross_section_functions import get_section_sampler_xy, get_cross_section
+from colormap_functions import get_colormap
+
 
 def read_radar(filename):
     """
@@ -325,6 +334,85 @@ def add_field_to_radar_object(
     return radar
 
 
+def read_only_view(data):
+    """
+    Create a read-only view of a (masked) array. Data and mask are shared with
+    the original array, so no memory is allocated for the values.
+
+    Parameters
+    ----------
+    data: array or masked array
+
+    Returns
+    -------
+    view: read-only masked array sharing memory with data
+    """
+
+    data = np.ma.asanyarray(data)
+    values = data.data.view()
+    values.flags.writeable = False
+    mask = data.mask
+    if mask is not np.ma.nomask:
+        mask = mask.view()
+        mask.flags.writeable = False
+    return np.ma.masked_array(
+        values, mask=mask, fill_value=data.fill_value, copy=False
+    )
+
+
+def alias_field(radar, field_name, alias_name):
+    """
+    Add a field to a Py-ART radar (or grid) object sharing the data array of an
+    existing field. Metadata is copied, so each name keeps its own attributes
+    (e.g. missing_value), while the values are stored only once.
+
+    The existing field keeps its (writable) array, and values changed in
+    place there are also seen through the alias. The alias is a read-only
+    view: use get_writable_field_data() before changing its values in place,
+    which copies the data of that name only (copy-on-write).
+
+    Parameters
+    ----------
+    radar: Py-ART radar or grid object
+    field_name: name of the existing field
+    alias_name: name of the new field
+
+    Returns
+    -------
+    radar: Py-ART radar data with aliased field
+    """
+
+    source = radar.fields[field_name]
+    alias = {key: value for key, value in source.items() if key != "data"}
+    alias["data"] = read_only_view(source["data"])
+    radar.add_field(alias_name, alias, replace_existing=True)
+    return radar
+
+
+def get_writable_field_data(radar, field_name):
+    """
+    Get the data of a field ready to be changed in place. If the field is an
+    alias of another field (see alias_field()), the data is copied first and
+    only this field is updated. The data of a field that has
+    aliases is returned as is, so changes are also seen through the aliases.
+
+    Parameters
+    ----------
+    radar: Py-ART radar or grid object
+    field_name: name of the field
+
+    Returns
+    -------
+    data: writable masked array of the field
+    """
+
+    data = radar.fields[field_name]["data"]
+    if not np.ma.getdata(data).flags.writeable:
+        data = data.copy()
+        radar.fields[field_name]["data"] = data
+    return data
+
+
 def add_field_to_grid_object(
     field,
     grid,
@@ -386,6 +474,7 @@ def grid_radar(
     fields=["reflectivity", "velocity"],
     origin=None,
     for_multidop=False,
+    geometry_cache=None,
 ):
 
     """
@@ -404,6 +493,8 @@ def grid_radar(
     fields: name of the reflectivity and velocity fields
     origin: custom grid origin
     for_multidop: True if gridded for multidop
+    geometry_cache: folder where azimuth and elevation are cached (see
+        geometry_functions). None computes them every time
 
     Returns
     -------
@@ -464,7 +555,9 @@ def grid_radar(
     #     radar.fields[fields[0]]['missing_value'] = [
     #         1.0 * radar.fields[fields[0]]['_FillValue']]
 
-    if for_multidop:
+    if for_multidop and geometry_cache is not None:
+        grid = add_geometry_fields(grid, cache_path=geometry_cache)
+    elif for_multidop:
         grid = multidop.angles.add_azimuth_as_field(grid)
         grid = multidop.angles.add_elevation_as_field(grid)
 
@@ -473,6 +566,129 @@ def grid_radar(
     return grid
 
 
+def get_aoi_window(grid, xlim_aoi, ylim_aoi, halo=0.0):
+    """
+    Get the smallest window of grid points covering an area of interest plus
+    a halo around it.
+
+    Parameters
+    ----------
+    grid: gridded radar data
+    xlim_aoi, ylim_aoi: limits of the area of interest in lon, lat
+        (min, max) in degrees
+    halo: distance added around the area of interest, in meters
+
+    Returns
+    -------
+    window: tuple of (y slice, x slice) of grid points
+    """
+
+    lons, lats = grid.get_point_longitude_latitude(0)
+    iy, ix = np.where(
+        (lons >= xlim_aoi[0])
+        & (lons <= xlim_aoi[1])
+        & (lats >= ylim_aoi[0])
+        & (lats <= ylim_aoi[1])
+    )
+    if iy.size == 0:
+        raise ValueError("Area of interest is outside the grid")
+
+    halo_x = int(np.ceil(halo / np.mean(np.diff(grid.x["data"]))))
+    halo_y = int(np.ceil(halo / np.mean(np.diff(grid.y["data"]))))
+    return (
+        slice(max(iy.min() - halo_y, 0), min(iy.max() + halo_y + 1, grid.ny)),
+        slice(max(ix.min() - halo_x, 0), min(ix.max() + halo_x + 1, grid.nx)),
+    )
+
+
+def crop_grid(grid, window, fields=None):
+    """
+    Crop a grid to a window of grid points (see get_aoi_window()). Fields are
+    views of the original data, so nothing is copied.
+
+    Parameters
+    ----------
+    grid: gridded radar data
+    window: tuple of (y slice, x slice) of grid points
+    fields: list of fields to be kept. None keeps all fields
+
+    Returns
+    -------
+    grid: cropped gridded radar data
+    """
+
+    y_slice, x_slice = window
+    if fields is None:
+        fields = list(grid.fields.keys())
+
+    x = dict(grid.x)
+    x["data"] = grid.x["data"][x_slice]
+    y = dict(grid.y)
+    y["data"] = grid.y["data"][y_slice]
+    cropped_fields = {}
+    for field in fields:
+        cropped_fields[field] = dict(grid.fields[field])
+        cropped_fields[field]["data"] = grid.fields[field]["data"][
+            :, y_slice, x_slice
+        ]
+
+    return pyart.core.Grid(
+        grid.time,
+        cropped_fields,
+        grid.metadata,
+        grid.origin_latitude,
+        grid.origin_longitude,
+        grid.origin_altitude,
+        x,
+        y,
+        grid.z,
+        projection=grid.projection,
+        radar_latitude=grid.radar_latitude,
+        radar_longitude=grid.radar_longitude,
+        radar_altitude=grid.radar_altitude,
+        radar_time=grid.radar_time,
+        radar_name=grid.radar_name,
+    )
+
+
+def paste_grid_fields(full_grid, sub_grid, window, fields=None):
+    """
+    Paste fields of a cropped grid (see crop_grid()) back into the full
+    domain grid. Points outside the window are masked.
+
+    Parameters
+    ----------
+    full_grid: gridded radar data of the full domain
+    sub_grid: cropped gridded radar data
+    window: tuple of (y slice, x slice) used to crop sub_grid
+    fields: list of fields to be pasted. None pastes all fields of sub_grid
+
+    Returns
+    -------
+    full_grid: gridded radar data of the full domain with pasted fields
+    """
+
+    y_slice, x_slice = window
+    if fields is None:
+        fields = list(sub_grid.fields.keys())
+
+    for field in fields:
+        sub_data = sub_grid.fields[field]["data"]
+        data = np.ma.masked_all(
+            (full_grid.nz, full_grid.ny, full_grid.nx), dtype=sub_data.dtype
+        )
+        data[:, y_slice, x_slice] = sub_data
+        field_dict = {
+            key: value
+            for key, value in sub_grid.fields[field].items()
+            if key != "data"
+        }
+        field_dict["data"] = data
+        full_grid.add_field(field, field_dict, replace_existing=True)
+
+    return full_grid
+
+
 def plot_dbz_vel_grid(
     radar,
     xlim,
@@ -663,6 +879,18 @@ def calc_plot_gridded_wind_dbz(
     x, y = np.meshgrid(0.001 * grid.x["data"], 0.001 * grid.y["data"])
     y_cs, z_cs = np.meshgrid(0.001 * grid.y["data"], 0.001 * grid.z["data"])
 
+    # Cross-section (S-N along lon_index) of all fields at once
+    sampler = get_section_sampler_xy(
+        grid,
+        (grid.x["data"][lon_index], grid.y["data"][0]),
+        (grid.x["data"][lon_index], grid.y["data"][-1]),
+        n_points=grid.ny,
+    )
+    section = get_cross_section(
+        grid, ["reflectivity", "upward_air_velocity", "northward_wind"], sampler
+    )
+    Z_cs, W_cs, V_cs = [ma.masked_invalid(data) for data in section.values]
+
     # Wind medians - necessary?
     # Um = np.ma.median(U[index])
     # Vm = np.ma.median(V[index])
@@ -728,7 +956,7 @@ def calc_plot_gridded_wind_dbz(
     cs = ax.pcolormesh(
         0.001 * grid.y["data"],
         0.001 * grid.z["data"],
-        [Z[i][:, lon_index] for i in range(0, 20)],
+        Z_cs,
         vmin=0,
         vmax=70,
         cmap=cm.GMT_wysiwyg,
@@ -739,7 +967,7 @@ def calc_plot_gridded_wind_dbz(
     cl = plt.contour(
         y_cs,
         z_cs,
-        [W[i][:, lon_index] for i in range(0, 20)],
+        W_cs,
         levels=range(-20, 20),
         colors=["k"],
         linewidths=1,
@@ -750,8 +978,8 @@ def calc_plot_gridded_wind_dbz(
     wind = ax.quiver(
         y_cs,
         z_cs,
-        [V[i][:, lon_index] for i in range(0, 20)],
-        [W[i][:, lon_index] for i in range(0, 20)],
+        V_cs,
+        W_cs,
         scale=5,
         units="xy",
         color="brown",
@@ -862,7 +1090,16 @@ def plot_gridded_wind_dbz_panel(
         lat_lines=np.arange(ylim[0], ylim[1], grid_spc),
         auto_range=False,
     )
-    display.basemap.readshapefile(shp_name, "sao_paulo", color="gray")
+    ax1.add_collection(
+        get_shape_collection(
+            shp_name,
+            extent=[xlim[0], xlim[1], ylim[0], ylim[1]],
+            projection=display.basemap,
+            edgecolor="gray",
+            linewidth=0.5,
+        ),
+        autolim=False,
+    )
     # -- Reflectivity (shaded)
     display.plot_grid(
         "reflectivity", level, vmin=0, vmax=70, colorbar_flag=False, cmap=cmap
@@ -1142,11 +1379,7 @@ def plot_field_panel(
     # Opening colortables
     if field != "FH":
         if cmap:
-            cpt = loadCPT(cmap)
-            if reverse_cmap:
-                cmap = LinearSegmentedColormap("cpt_r", revcmap(cpt))
-            else:
-                cmap = LinearSegmentedColormap("cpt", cpt)
+            cmap = get_colormap(cmap, reverse=reverse_cmap)
 
     # Main figure
     display = pyart.graph.GridMapDisplay(grid)
@@ -1168,7 +1401,16 @@ def plot_field_panel(
         lat_lines=np.arange(ylim[0], ylim[1], grid_spc),
         auto_range=False,
     )
-    display.basemap.readshapefile(shp_name, "sao_paulo", color="gray")
+    ax1.add_collection(
+        get_shape_collection(
+            shp_name,
+            extent=[xlim[0], xlim[1], ylim[0], ylim[1]],
+            projection=display.basemap,
+            edgecolor="gray",
+            linewidth=0.5,
+        ),
+        autolim=False,
+    )
     # -- Reflectivity (shaded)
     display.plot_grid(
         field,
@@ -8,183 +8,135 @@ MULTIDOPPLER RETRIEVAL FROM 2/3 RADARS
                  21h50 (FCTH/XPOL and SR/FCTH/XPOL)
     - 2017-03-14 18h30 (SR/FCTH)
                  20h (SR/FCTH)
-- Executing MultiDop workflow
+- Executing MultiDop workflow for all radar combinations (SR/FCTH, SR/XPOL,
+  FCTH/XPOL and SR/FCTH/XPOL) and cases at the same time
+- Optionally, only over the storm (cv.retrieval_aoi), pasting the results
+  back into the full grid
+- Skipping points outside the dual/triple-Doppler lobes of each combination
+  (azimuth, elevation and lobes cached in cv.geometry_cache)
+- Optionally, calculating HID and water masses on the grid of the radars in
+  cv.microphysics_radars (radar_<name>_hid.nc, used by get_upvol_im.py)
 
 Based on MultiDop Sample Workflow Notebook by Timothy Lang.
 
 @author: Camila Lopes (camila.lopes@iag.usp.br)
 """
 
-import time
-import tempfile
+import os
 
 import pyart
-import multidop
 
 import misc_functions as misc
 import radar_functions as rf
 import multidop_functions as mf
-from multidop_parameters import params
+import geometry_functions as geo
+from multidop_parameters import params, combinations
 import custom_vars as cv
 
-# - Reading data
-radar_1 = mf.read_uf(cv.filenames_uf[0])  # SR
-radar_2 = mf.read_uf(cv.filenames_uf[1])  # FCTH
-# radar_3 = mf.read_uf(cv.filenames_uf[2])  # XPOL
-
-# - Gridding based on radar_2 (FCTH)
-print('-- Gridding radars --')
-grid_1 = rf.grid_radar(radar_1, fields=['DT', 'VT'], for_multidop=True,
-                       origin=(radar_2.latitude['data'][0],
-                               radar_2.longitude['data'][0]),
-                       xlim=cv.grid_xlim, ylim=cv.grid_ylim,
-                       grid_shape=cv.grid_shape)
-grid_2 = rf.grid_radar(radar_2, fields=['DT', 'VT'], for_multidop=True,
-                       origin=(radar_2.latitude['data'][0],
-                               radar_2.longitude['data'][0]),
-                       xlim=cv.grid_xlim, ylim=cv.grid_ylim,
-                       grid_shape=cv.grid_shape)
-# grid_3 = rf.grid_radar(radar_3, fields=['DT', 'VT'], for_multidop=True,
-#                        origin=(radar_2.latitude['data'][0],
-#                                radar_2.longitude['data'][0]),
-#                        xlim=cv.grid_xlim, ylim=cv.grid_ylim,
-#                        grid_shape=cv.grid_shape)
-
-# -- Plotting gridded data
-# rf.plot_gridded_maxdbz(grid_1, name_radar='SR', name_base='FCTH',
-#                        xlim=cv.grid_xlim, ylim=cv.grid_ylim)
-# rf.plot_gridded_maxdbz(grid_2, name_radar='FCTH', name_base='FCTH',
-#                        xlim=cv.grid_xlim, ylim=cv.grid_ylim)
-# rf.plot_gridded_maxdbz(grid_3, name_radar='XPOL', name_base='FCTH',
-#                        xlim=grid_xlim, ylim=grid_ylim)
-# rf.plot_gridded_velocity(grid_1, name_radar='SR', name_base='FCTH', height=0,
-#                          xlim=cv.grid_xlim, ylim=cv.grid_ylim)
-# rf.plot_gridded_velocity(grid_2, name_radar='FCTH', name_base='FCTH', height=0,
-#                          xlim=cv.grid_xlim, ylim=cv.grid_ylim)
-# rf.plot_gridded_velocity(grid_3, name_radar='XPOL', name_base='FCTH', height=0,
-#                          xlim=grid_xlim, ylim=grid_ylim)
-
-# - Writing data to file
-print('-- Writing grids to NetCDF files --')
-pyart.io.write_grid('radar_1.nc', grid_1)
-pyart.io.write_grid('radar_2.nc', grid_2)
-# pyart.io.write_grid('radar_3.nc', grid_3)
-
-# - 2 RADARS (SR, FCTH)
-# -- Loading parameters and updating
-localfile = tempfile.NamedTemporaryFile()
-params['writeout'] = localfile.name
-
-params['x'] = [cv.grid_xlim[0], cv.grid_spacing, cv.grid_shape[1]]
-params['y'] = [cv.grid_ylim[0], cv.grid_spacing, cv.grid_shape[1]]
-params['z'][1] = cv.grid_spacing
-params['grid'] = [grid_1.origin_longitude['data'][0],
-                  grid_1.origin_latitude['data'][0], 0.0]
-params['radar_names'] = ['SR', 'FCTH']
-params['sseq_trip'] = [0.001, 1.0]
-
-pf = multidop.parameters.ParamFile(params, 'sr-fcth.dda')
-pf = multidop.parameters.CalcParamFile(params, 'calculations.dda')
-
-# -- Executing DDA engine
-print('-- Starting DDA engine --')
-bt = time.time()
-multidop.execute.do_analysis('sr-fcth.dda', cmd_path=cv.dda_path)
-print((time.time() - bt)/60.0, ' minutes to process')
-
-# -- Writing final grid to a file
-# -- Baseline output is not CF or Py-ART compliant. This function fixes that.
-final_grid = multidop.grid_io.make_new_grid([grid_1, grid_2],
-                                            localfile.name)
-misc.save_object(final_grid, cv.path + 'sr-fcth_cf.pkl')
-localfile.close()
-
-# # - 2 RADARS (SR, XPOL)
-# # -- Loading parameters and updating
-# localfile = tempfile.NamedTemporaryFile()
-# params['writeout'] = localfile.name
-#
-# params['x'] = [cv.grid_xlim[0], cv.grid_spacing, cv.grid_shape[1]]
-# params['y'] = [cv.grid_ylim[0], cv.grid_spacing, cv.grid_shape[1]]
-# params['z'][1] = cv.grid_spacing
-# params['grid'] = [grid_1.origin_longitude['data'][0],
-#                   grid_1.origin_latitude['data'][0], 0.0]
-# params['files'] = ['radar_1.nc', 'radar_3.nc']
-# params['radar_names'] = ['SR', 'XPOL']
-# params['sseq_trip'] = [0.001, 1.0]
-#
-# pf = multidop.parameters.ParamFile(params, 'sr-xpol.dda')
-# pf = multidop.parameters.CalcParamFile(params, 'calculations.dda')
-#
-# # -- Executing DDA engine
-# print('-- Starting DDA engine --')
-# bt = time.time()
-# multidop.execute.do_analysis('sr-xpol.dda', cmd_path=cv.dda_path)
-# print((time.time() - bt)/60.0, ' minutes to process')
-#
-# # -- Writing final grid to a file
-# # -- Baseline output is not CF or Py-ART compliant. This function fixes that.
-# final_grid = multidop.grid_io.make_new_grid([grid_1, grid_3], localfile.name)
-# misc.save_object(final_grid, cv.path + 'sr-xpol_cf.pkl')
-# localfile.close()
-#
-# # - 2 RADARS (FCTH, XPOL)
-# # -- Loading parameters and updating
-# localfile = tempfile.NamedTemporaryFile()
-# params['writeout'] = localfile.name
-#
-# params['x'] = [cv.grid_xlim[0], cv.grid_spacing, cv.grid_shape[1]]
-# params['y'] = [cv.grid_ylim[0], cv.grid_spacing, cv.grid_shape[1]]
-# params['z'][1] = cv.grid_spacing
-# params['grid'] = [grid_1.origin_longitude['data'][0],
-#                   grid_1.origin_latitude['data'][0], 0.0]
-# params['files'] = ['radar_2.nc', 'radar_3.nc']
-# params['radar_names'] = ['FCTH', 'XPOL']
-# params['sseq_trip'] = [1.0, 1.0]
-#
-# pf = multidop.parameters.ParamFile(params, 'fcth-xpol.dda')
-# pf = multidop.parameters.CalcParamFile(params, 'calculations.dda')
-#
-# # -- Executing DDA engine
-# print('-- Starting DDA engine --')
-# bt = time.time()
-# multidop.execute.do_analysis('fcth-xpol.dda', cmd_path=cv.dda_path)
-# print((time.time() - bt)/60.0, ' minutes to process')
-#
-# # -- Writing final grid to a file
-# # -- Baseline output is not CF or Py-ART compliant. This function fixes that.
-# final_grid = multidop.grid_io.make_new_grid([grid_2, grid_3], localfile.name)
-# misc.save_object(final_grid, cv.path + 'fcth-xpol_cf.pkl')
-# localfile.close()
-#
-# # - 3 RADARS (SR, FCTH, XPOL)
-# # --- Loading parameters and updating
-# localfile = tempfile.NamedTemporaryFile()
-# params['writeout'] = localfile.name
-#
-# params['x'] = [cv.grid_xlim[0], cv.grid_spacing, cv.grid_shape[1]]
-# params['y'] = [cv.grid_ylim[0], cv.grid_spacing, cv.grid_shape[1]]
-# params['z'][1] = cv.grid_spacing
-# params['grid'] = [grid_1.origin_longitude['data'][0],
-#                   grid_1.origin_latitude['data'][0], 0.0]
-# params['files'] = ['radar_1.nc', 'radar_2.nc', 'radar_3.nc']
-# params['radar_names'] = ['SR', 'FCTH', 'XPOL']
-# params['sseq_trip'] = [0.001, 1.0, 1.0]
-#
-# pf = multidop.parameters.ParamFile(params, 'sr-fcth-xpol.dda')
-# pf = multidop.parameters.CalcParamFile(params, 'calculations.dda')
-#
-# # -- Executing DDA engine
-# print('-- Starting DDA engine --')
-# bt = time.time()
-# multidop.execute.do_analysis('sr-fcth-xpol.dda',
-#                              cmd_path=cv.dda_path)
-# print((time.time() - bt)/60.0, ' minutes to process')
-#
-# # -- Writing final grid to a file
-# # -- Baseline output is not CF or Py-ART compliant. This function fixes that.
-# final_grid = multidop.grid_io.make_new_grid([grid_1, grid_2, grid_3],
-#                                             localfile.name)
-# # final_grid.write('20171115_sr-fcth-xpol_cf.nc')
-# misc.save_object(final_grid, cv.path + 'sr-fcth-xpol_cf.pkl')
-# localfile.close()
+# - Reading and gridding data of each case
+cases = {}
+lobe_masks = {}
+window = None
+base_grid = None
+for case in cv.multidop_cases:
+    filenames_uf = [f for f in open(case + "filenames_uf.txt").read().split("\n")
+                    if f]
+    radars = [mf.read_uf(f) for f in filenames_uf]  # SR, FCTH (, XPOL)
+
+    # -- Gridding based on radar_2 (FCTH)
+    print('-- Gridding radars --')
+    origin = (radars[1].latitude['data'][0], radars[1].longitude['data'][0])
+    cases[case] = {}
+    case_grids = {}
+    for name, radar in zip(cv.radar_names, radars):
+        grid = rf.grid_radar(radar, fields=['DT', 'VT'], for_multidop=True,
+                             origin=origin, xlim=cv.grid_xlim,
+                             ylim=cv.grid_ylim, grid_shape=cv.grid_shape,
+                             geometry_cache=cv.geometry_cache)
+
+        # -- Microphysics (FH, MW, MI) on the same grid, for get_upvol_im.py
+        if (name in cv.microphysics_radars
+                and case in cv.microphysics_soundings):
+            radar = rf.calculate_radar_hid(radar,
+                                           cv.microphysics_soundings[case])
+            hid_grid = rf.grid_radar(radar, fields=['FH', 'MW', 'MI'],
+                                     origin=origin, xlim=cv.grid_xlim,
+                                     ylim=cv.grid_ylim,
+                                     grid_shape=cv.grid_shape)
+            misc.save_grid_store(hid_grid, os.path.join(
+                case, 'radar_' + name.lower() + '_hid.nc'))
+            del hid_grid
+
+        # -- Keeping only the storm (plus a halo) for the DDA engine
+        if cv.retrieval_aoi is not None:
+            if window is None:
+                window = rf.get_aoi_window(grid, cv.retrieval_aoi[0],
+                                           cv.retrieval_aoi[1],
+                                           halo=cv.retrieval_halo)
+                full_grid = rf.crop_grid(grid, (slice(None), slice(None)),
+                                         fields=[])
+            grid = rf.crop_grid(grid, window)
+
+        # -- All grids share the same geometry: the first one defines the
+        # DDA grid parameters
+        if base_grid is None:
+            base_grid = grid
+
+        # -- Plotting gridded data
+        # rf.plot_gridded_maxdbz(grid, name_radar=name, name_base='FCTH',
+        #                        xlim=cv.grid_xlim, ylim=cv.grid_ylim)
+        # rf.plot_gridded_velocity(grid, name_radar=name, name_base='FCTH',
+        #                          height=0, xlim=cv.grid_xlim,
+        #                          ylim=cv.grid_ylim)
+
+        # -- Writing data to file
+        print('-- Writing grids to NetCDF files --')
+        filename = os.path.join(case, 'radar_' + name.lower() + '.nc')
+        pyart.io.write_grid(filename, grid)
+        cases[case][name] = filename
+        case_grids[name] = grid
+    del radars
+
+    # -- Dual/triple-Doppler lobes of each combination (cached, same grid)
+    lobe_masks[case] = {}
+    for name in combinations:
+        radar_names = name.upper().split('-')
+        if all(radar in case_grids for radar in radar_names):
+            lobe_masks[case][name] = geo.get_lobe_mask(
+                [case_grids[radar] for radar in radar_names],
+                min_cba=params['min_cba'], cache_path=cv.geometry_cache)
+
+    # -- Lobes of 30 and 45 degrees for plot_dual-doppler_lobes.R
+    if (not os.path.isfile(cv.lobes_file)
+            and all(radar in case_grids for radar in cv.radar_names)):
+        lobes = {}
+        for angle in [30, 45]:
+            lobes[('SR/FCTH', angle)] = geo.get_lobe_mask(
+                [case_grids['SR'], case_grids['FCTH']], min_cba=angle,
+                cache_path=cv.geometry_cache)
+            lobes[('SR/FCTH/XPOL', angle)] = geo.get_lobe_mask(
+                [case_grids[radar] for radar in cv.radar_names],
+                min_cba=angle, cache_path=cv.geometry_cache)
+        geo.export_lobes(lobes, case_grids['FCTH'], cv.lobes_file)
+    del case_grids
+
+# - Loading parameters and updating (same grid, based on FCTH, for all cases)
+case_params = mf.set_grid_params(
+    params, base_grid,
+    (base_grid.x['data'][0], base_grid.x['data'][-1]),
+    (base_grid.y['data'][0], base_grid.y['data'][-1]), cv.grid_spacing,
+    (base_grid.nz, base_grid.ny, base_grid.nx))
+
+# - Executing DDA engine for all combinations and cases
+final_grids = mf.run_multidop_combinations(cases, case_params, combinations,
+                                           dda_path=cv.dda_path,
+                                           log_file=cv.retrieval_log,
+                                           lobe_masks=lobe_masks)
+
+# - Writing final grids to files
+for (case, name), final_grid in final_grids.items():
+    if window is not None:
+        final_grid = rf.paste_grid_fields(
+            rf.crop_grid(full_grid, (slice(None), slice(None)), fields=[]),
+            final_grid, window)
+    misc.save_grid_store(final_grid, case + name + '_cf.nc')
@@ -23,6 +23,7 @@ import misc_functions as misc
 import radar_functions as rf
 import custom_vars as cv
 import pydda_functions as pdf
+import instrumentation_functions as inst
 
 # - Reading data
 radar_1 = pdf.read_uf(cv.filenames_uf[0])  # SR
@@ -68,7 +69,8 @@ grid_3 = rf.grid_radar(radar_3, fields=['DT', 'VT'], for_multidop=False,
 # pyart.io.write_grid('radar_3.nc', grid_3)
 
 # - Using sounding as initial condition
-sounding = pdf.acquire_sounding_wind_data(cv.date, cv.station)
+sounding = pdf.acquire_sounding_wind_data(cv.date, cv.station,
+                                          store_path=cv.sounding_store)
 u_init, v_init, w_init = pydda.initialization.make_wind_field_from_profile(
     grid_2, sounding, vel_field='VT'
 )
@@ -81,9 +83,23 @@ u_init, v_init, w_init = pydda.initialization.make_wind_field_from_profile(
 # u_init, v_init, w_init = pydda.initialization.make_initialization_from_era_interim(
 #     grid_2, file_name=cv.era5_file, vel_field='VT')
 
+# - Time series using each retrieval as initial condition of the next one
+# grid_sequence = [[grid_1, grid_2, grid_3], ...]  # one list per time
+# retrieved, log = pdf.retrieve_winds_time_series(
+#     grid_sequence, sounding, compare_cold_start=True, Co=1, Cm=10.,
+#     Cz=1e-4, frz=cv.zero_height, filt_iterations=0, mask_outside_opt=True)
+
+# - Retrieving only over the storm (see cv.retrieval_aoi)
+# Grids = pdf.get_dd_wind_field_cropped(
+#     [grid_1, grid_2, grid_3], sounding, cv.retrieval_aoi[0],
+#     cv.retrieval_aoi[1], halo=cv.retrieval_halo, Co=1, Cm=10., Cz=1e-4,
+#     frz=cv.zero_height, filt_iterations=0, mask_outside_opt=True)
+
 # - Retrieving!
-Grids = pydda.retrieval.get_dd_wind_field(
-    [grid_1, grid_2, grid_3], u_init, v_init, w_init, Co=1, Cm=10., Cz=1e-4,
+# (each run goes to cv.retrieval_log, see inst.compare_runs)
+Grids = inst.get_dd_wind_field_logged(
+    [grid_1, grid_2, grid_3], u_init, v_init, w_init,
+    log_file=cv.retrieval_log, run_name='SR-FCTH-XPOL', Co=1, Cm=10., Cz=1e-4,
     # Cv=1e-4, Ut=-10., Vt=-10.,
     vel_name='VT', refl_field='DT', frz=cv.zero_height, filt_iterations=0,
     mask_outside_opt=True
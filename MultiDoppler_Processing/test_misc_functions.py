@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+TESTS OF THE SOUNDING STORE OF misc_functions.py
+
+Soundings are requested from a fake fetcher (instead of
+WyomingUpperAir.request_data) that counts its calls, or read from a
+Wyoming text sounding written by the test. Run with:
+
+    python -m pytest MultiDoppler_Processing/test_misc_functions.py
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+pytest.importorskip('xarray')
+pytest.importorskip('pyart')
+
+from misc_functions import (get_sounding_store_filename,
+                            get_sounding_wind_data, populate_sounding_store,
+                            read_wyoming_text_sounding)
+
+DATE = datetime(2017, 11, 15, 12)
+
+# Wyoming TEXT:LIST sounding, in fixed-width columns of 7 characters
+COLUMNS = ['PRES', 'HGHT', 'TEMP', 'DWPT', 'RELH', 'MIXR', 'DRCT', 'SKNT',
+           'THTA', 'THTE', 'THTV']
+UNITS = ['hPa', 'm', 'C', 'C', '%', 'g/kg', 'deg', 'knot', 'K', 'K', 'K']
+ROWS = [
+    ['1000.0', '128', '', '', '', '', '', '', '', '', ''],
+    ['937.0', '722', '21.6', '17.4', '77', '13.43', '0', '10', '300.3',
+     '340.1', '302.7'],
+    ['925.0', '834', '20.8', '16.8', '78', '13.10', '90', '20', '300.6',
+     '339.5', '303.0'],
+    ['850.0', '1557', '16.2', '11.2', '72', '10.00', '270', '30', '303.2',
+     '333.5', '305.0'],
+]
+
+
+def _text_line(values):
+    return ''.join('{:>7}'.format(value) for value in values)
+
+
+WYOMING_TEXT = '\n'.join(
+    ['83779 SBMT Marte Civ Observations at 12Z 15 Nov 2017', '',
+     '-' * 77, _text_line(COLUMNS), _text_line(UNITS), '-' * 77] +
+    [_text_line(row) for row in ROWS] +
+    ['', 'Station information and sounding indices',
+     '                         Station identifier: SBMT',
+     '                           Station latitude: -23.51',
+     '                          Station longitude: -46.63', ''])
+
+
+class FakeFetcher(object):
+    """
+    Stand-in of WyomingUpperAir.request_data, counting its calls.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, date, station):
+        self.calls.append((date, station))
+        return pd.DataFrame({
+            'pressure': [1000.0, 925.0, 850.0, 700.0],
+            'height': [128.0, 834.0, 1557.0, np.nan],
+            'speed': [5.0, 10.0, 15.0, np.nan],
+            'direction': [180.0, 225.0, 270.0, np.nan],
+            'u_wind': [0.0, 7.07, 15.0, np.nan],
+            'v_wind': [5.0, 7.07, 0.0, np.nan],
+        })
+
+
+class SoundingStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.store_path)
+
+    def test_fetch_then_store(self):
+        fetcher = FakeFetcher()
+        filename = get_sounding_store_filename(self.store_path, 'SBMT', DATE)
+
+        data = get_sounding_wind_data(DATE, 'SBMT', fetcher, self.store_path)
+        self.assertEqual(fetcher.calls, [(DATE, 'SBMT')])
+        self.assertTrue(os.path.isfile(filename))
+        # Only the sounding file, no temporary file left
+        self.assertEqual(os.listdir(self.store_path),
+                         [os.path.basename(filename)])
+        # The level without wind data is dropped
+        np.testing.assert_allclose(data['height'], [128.0, 834.0, 1557.0])
+
+        # Second time: from the store, without calling the fetcher
+        stored = get_sounding_wind_data(DATE, 'SBMT', fetcher,
+                                        self.store_path)
+        self.assertEqual(len(fetcher.calls), 1)
+        self.assertEqual(sorted(stored), sorted(data))
+        for var in data:
+            np.testing.assert_allclose(stored[var], data[var], rtol=1e-6)
+
+        # Other soundings are still fetched
+        get_sounding_wind_data(datetime(2017, 11, 16, 0), 'SBMT', fetcher,
+                               self.store_path)
+        self.assertEqual(len(fetcher.calls), 2)
+
+    def test_no_store(self):
+        fetcher = FakeFetcher()
+        get_sounding_wind_data(DATE, 'SBMT', fetcher)
+        get_sounding_wind_data(DATE, 'SBMT', fetcher)
+
+        self.assertEqual(len(fetcher.calls), 2)
+        self.assertEqual(os.listdir(self.store_path), [])
+
+    def test_populate_from_text(self):
+        text_file = os.path.join(self.store_path, '83779_2017111512Z.txt')
+        with open(text_file, 'w') as f:
+            f.write(WYOMING_TEXT)
+
+        station, date, data = read_wyoming_text_sounding(text_file)
+        self.assertEqual(station, 'SBMT')
+        self.assertEqual(date, DATE)
+        np.testing.assert_allclose(data['height'], [128, 722, 834, 1557])
+        np.testing.assert_allclose(data['speed'][1:], [10, 20, 30])
+        # Winds from north, east and west
+        np.testing.assert_allclose(data['u_wind'][1:], [0, -20, 30],
+                                   atol=1e-9)
+        np.testing.assert_allclose(data['v_wind'][1:], [-10, 0, 0],
+                                   atol=1e-9)
+        np.testing.assert_allclose(data['latitude'], -23.51)
+        np.testing.assert_allclose(data['longitude'], -46.63)
+
+        saved = populate_sounding_store(self.store_path, [text_file])
+        self.assertEqual(
+            saved, [get_sounding_store_filename(self.store_path, 'SBMT',
+                                                DATE)])
+
+        # Offline: served from the store, the fetcher is never called
+        fetcher = FakeFetcher()
+        stored = get_sounding_wind_data(DATE, 'SBMT', fetcher,
+                                        self.store_path)
+        self.assertEqual(fetcher.calls, [])
+        np.testing.assert_allclose(stored['height'], data['height'])
+        np.testing.assert_allclose(stored['u_wind'], data['u_wind'],
+                                   atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -61,66 +61,29 @@ if cv.pt_br:
 name = 'FCTH'
 level = 2
 
-rf.plot_field_panel(
-    grid, 'FH', level=level, fmin=0, fmax=10, cmap=cv.cmaphid,
-    lat_index=cv.cs_lat, lon_index=cv.cs_lon,
-    date=cv.date_name, name_multi=name,
-    shp_name=cv.shp_path, hailpad_pos=cv.hailpad,
-    zero_height=cv.zerodeg_height, minusforty_height=cv.fortydeg_height,
-    grid_spc=cv.plotgrid_spc, xlim=cv.xlim, ylim=cv.ylim,
-    save_path=cv.save_path, index="a", hailpad_cs_flag=cv.hail_flag,
-    pt_br=cv.pt_br)
-
-rf.plot_field_panel(
-    grid, 'MW', level=level, fmin=0, fmax=10, cmap='mass',
-    lat_index=cv.cs_lat, lon_index=cv.cs_lon,
-    date=cv.date_name, name_multi=name,
-    shp_name=cv.shp_path, hailpad_pos=cv.hailpad,
-    zero_height=cv.zerodeg_height, grid_spc=cv.plotgrid_spc,
-    xlim=cv.xlim, ylim=cv.ylim, save_path=cv.save_path, index="b",
-    hailpad_cs_flag=cv.hail_flag, pt_br=cv.pt_br)
-
-rf.plot_field_panel(
-    grid, 'MI', level=level, fmin=0, fmax=30, cmap='mass',
-    lat_index=cv.cs_lat, lon_index=cv.cs_lon,
-    date=cv.date_name, name_multi=name,
-    shp_name=cv.shp_path, hailpad_pos=cv.hailpad,
-    zero_height=cv.zerodeg_height, grid_spc=cv.plotgrid_spc,
-    xlim=cv.xlim, ylim=cv.ylim, save_path=cv.save_path, index="c",
-    hailpad_cs_flag=cv.hail_flag, pt_br=cv.pt_br)
-
-rf.plot_field_panel(
-    grid, 'corrected_reflectivity', level=level, fmin=0, fmax=70, cmap='dbz',
-    lat_index=cv.cs_lat, lon_index=cv.cs_lon,
+# - Map, shapefiles and cross section are drawn once for all fields, and the
+# cross sections of all fields are extracted together
+renderer = rf.FieldPanelRenderer(
+    grid, level, lat_index=cv.cs_lat, lon_index=cv.cs_lon,
     date=cv.date_name, name_multi=name,
     shp_name=cv.shp_path, hailpad_pos=cv.hailpad,
     zero_height=cv.zerodeg_height, grid_spc=cv.plotgrid_spc,
-    xlim=cv.xlim, ylim=cv.ylim, save_path=cv.save_path, index="a",
-    hailpad_cs_flag=cv.hail_flag, pt_br=cv.pt_br)
+    xlim=cv.xlim, ylim=cv.ylim, save_path=cv.save_path,
+    hailpad_cs_flag=cv.hail_flag, pt_br=cv.pt_br,
+    fields=['FH', 'MW', 'MI', 'corrected_reflectivity',
+            'differential_reflectivity', 'specific_differential_phase',
+            'cross_correlation_ratio'])
 
-rf.plot_field_panel(
-    grid, 'differential_reflectivity', level=level, fmin=-2, fmax=4,
-    cmap='zdr', lat_index=cv.cs_lat, lon_index=cv.cs_lon,
-    date=cv.date_name, name_multi=name,
-    shp_name=cv.shp_path, hailpad_pos=cv.hailpad,
-    zero_height=cv.zerodeg_height, grid_spc=cv.plotgrid_spc,
-    xlim=cv.xlim, ylim=cv.ylim, save_path=cv.save_path, index="b",
-    hailpad_cs_flag=cv.hail_flag, pt_br=cv.pt_br)
-
-rf.plot_field_panel(
-    grid, 'specific_differential_phase', level=level, fmin=-2, fmax=3.2,
-    cmap='kdp', lat_index=cv.cs_lat, lon_index=cv.cs_lon,
-    date=cv.date_name, name_multi=name,
-    shp_name=cv.shp_path, hailpad_pos=cv.hailpad,
-    zero_height=cv.zerodeg_height, grid_spc=cv.plotgrid_spc,
-    xlim=cv.xlim, ylim=cv.ylim, save_path=cv.save_path, index="c",
-    hailpad_cs_flag=cv.hail_flag, pt_br=cv.pt_br)
-
-rf.plot_field_panel(
-    grid, 'cross_correlation_ratio', level=level, fmin=0.8, fmax=1.013,
-    cmap='rho', lat_index=cv.cs_lat, lon_index=cv.cs_lon,
-    date=cv.date_name, name_multi=name,
-    shp_name=cv.shp_path, hailpad_pos=cv.hailpad,
-    zero_height=cv.zerodeg_height, grid_spc=cv.plotgrid_spc,
-    xlim=cv.xlim, ylim=cv.ylim, save_path=cv.save_path, index="d",
-    hailpad_cs_flag=cv.hail_flag, pt_br=cv.pt_br)
+renderer.plot('FH', fmin=0, fmax=10, cmap=cv.cmaphid, index="a",
+              minusforty_height=cv.fortydeg_height)
+renderer.plot('MW', fmin=0, fmax=10, cmap='mass', index="b")
+renderer.plot('MI', fmin=0, fmax=30, cmap='mass', index="c")
+renderer.plot('corrected_reflectivity', fmin=0, fmax=70, cmap='dbz',
+              index="a")
+renderer.plot('differential_reflectivity', fmin=-2, fmax=4, cmap='zdr',
+              index="b")
+renderer.plot('specific_differential_phase', fmin=-2, fmax=3.2, cmap='kdp',
+              index="c")
+renderer.plot('cross_correlation_ratio', fmin=0.8, fmax=1.013, cmap='rho',
+              index="d")
+renderer.close()
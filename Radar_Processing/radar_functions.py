@@ -5,6 +5,8 @@ GENERAL FUNCTIONS TO DEAL WITH RADAR DATA
 @author: Camila Lopes (camila.lopes@iag.usp.br)
 """
 
+import os
+import sys
 import time
 from copy import deepcopy
 
@@ -12,7 +14,7 @@ import numpy as np
 import numpy.ma as ma
 import matplotlib.pyplot as plt
 from matplotlib.gridspec import GridSpec
-from matplotlib.colors import LinearSegmentedColormap, BoundaryNorm
+from matplotlib.colors import LinearSegmentedColormap, BoundaryNorm, Normalize
 from matplotlib.cm import revcmap
 from mpl_toolkits.basemap import cm
 import cartopy.crs as ccrs
@@ -35,6 +37,12 @@ from cpt_convert import loadCPT
 from read_brazil_radar_py3 import read_rainbow_hdf5
 from misc_functions import check_sounding_for_montonic
 
+# Shared shapefile geometry cache and cross-sections (General_Processing)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "General_Processing"))
+from shapefile_functions import get_shape_collection
+from cross_section_functions import get_section_sampler, get_cross_section
+
 
 def read_radar(filename):
     """
@@ -801,7 +809,16 @@ def plot_field_panel(
         auto_range=False,
         ax=ax1,
     )
-    display.basemap.readshapefile(shp_name, "sao_paulo", color="gray")
+    ax1.add_collection(
+        get_shape_collection(
+            shp_name,
+            extent=[xlim[0], xlim[1], ylim[0], ylim[1]],
+            projection=display.basemap,
+            edgecolor="gray",
+            linewidth=0.5,
+        ),
+        autolim=False,
+    )
     # -- Reflectivity (shaded)
     display.plot_grid(
         field,
@@ -919,6 +936,357 @@ def plot_field_panel(
     )
 
 
+class FieldPanelRenderer(object):
+    """
+    Plot several fields of the same grid with the plot_field_panel() layout,
+    building the figure, basemap, shapefiles, hailpad and cross-section
+    position only once. The cross section sampling (A -> B) is also computed
+    once, and the sections of all fields are extracted together. Each field
+    only swaps the data, colormap and colorbar of both views before saving,
+    e.g.:
+
+        renderer = FieldPanelRenderer(grid, level, lat_index=cv.cs_lat,
+                                      fields=['FH', 'MI'], ...)
+        renderer.plot('FH', fmin=0, fmax=10, cmap=cv.cmaphid, index='a')
+        renderer.plot('MI', fmin=0, fmax=30, cmap='mass', index='c')
+        renderer.close()
+
+    Parameters
+    ----------
+    grid: gridded radar data
+    level: level of horizontal plot
+    lat_index, lon_index, date, name_multi, shp_name, hailpad_pos,
+    zero_height, minusforty_height, grid_spc, xlim, ylim, save_path,
+    hailpad_cs_flag, pt_br: same as plot_field_panel()
+    fields: fields to be plotted, so their cross sections are extracted at
+        once. None extracts each one when plotted
+    """
+
+    def __init__(
+        self,
+        grid,
+        level,
+        lat_index=None,
+        lon_index=None,
+        date="",
+        name_multi="",
+        shp_name="",
+        hailpad_pos=None,
+        zero_height=3.0,
+        minusforty_height=10.0,
+        grid_spc=0.25,
+        xlim=(-48, -46),
+        ylim=(-24, -22),
+        save_path="./",
+        hailpad_cs_flag=True,
+        pt_br=False,
+        fields=None,
+    ):
+        self.grid = grid
+        self.level = level
+        self.lat_index = lat_index
+        self.lon_index = lon_index
+        self.date = date
+        self.name_multi = name_multi
+        self.hailpad_pos = hailpad_pos
+        self.zero_height = zero_height
+        self.minusforty_height = minusforty_height
+        self.save_path = save_path
+        self.hailpad_cs_flag = hailpad_cs_flag
+        self.pt_br = pt_br
+        self.mesh = None
+        self.cs_mesh = None
+        self.cb = None
+
+        # Cross section sampling and sections of all fields
+        self.sampler = get_section_sampler(
+            grid, (lon_index[0], lat_index[0]), (lon_index[1], lat_index[1])
+        )
+        self.sections = {}
+        if fields is not None:
+            section = get_cross_section(grid, fields, self.sampler)
+            for field in fields:
+                self.sections[field] = section.sel(field=field)
+
+        # Main figure
+        self.display = pyart.graph.GridMapDisplayBasemap(grid)
+        self.fig = plt.figure(figsize=(10, 3.25), constrained_layout=True)
+        self.ncols = 7
+        gs = GridSpec(nrows=1, ncols=self.ncols, figure=self.fig)
+        self.ax1 = self.fig.add_subplot(gs[0, :3], facecolor="w")
+        self.ax2 = self.fig.add_subplot(gs[0, 3:])
+
+        # - Horizontal view (map)
+        self.display.plot_basemap(
+            min_lon=xlim[0],
+            max_lon=xlim[1],
+            min_lat=ylim[0],
+            max_lat=ylim[1],
+            lon_lines=np.arange(xlim[0], xlim[1], grid_spc),
+            lat_lines=np.arange(ylim[0], ylim[1], grid_spc),
+            auto_range=False,
+            ax=self.ax1,
+        )
+        self.ax1.add_collection(
+            get_shape_collection(
+                shp_name,
+                extent=[xlim[0], xlim[1], ylim[0], ylim[1]],
+                projection=self.display.basemap,
+                edgecolor="gray",
+                linewidth=0.5,
+            ),
+            autolim=False,
+        )
+        # -- Hailpad position
+        self.display.basemap.plot(
+            hailpad_pos[0],
+            hailpad_pos[1],
+            "kX",
+            markersize=15,
+            markerfacecolor="w",
+            alpha=0.75,
+            latlon=True,
+        )
+        # -- Cross section position
+        self.display.basemap.plot(lon_index, lat_index, "k--", latlon=True)
+        bmap = self.display.get_basemap()
+        for label, lon, lat in [
+            ("A", lon_index[0], lat_index[0]),
+            ("B", lon_index[1], lat_index[1]),
+        ]:
+            x, y = bmap(lon, lat)
+            self.ax1.annotate(
+                label,
+                (x, y),
+                fontsize=11,
+                fontweight="bold",
+                fontstretch="condensed",
+                ha="center",
+                bbox=dict(boxstyle="round,pad=0.2", facecolor="w", alpha=0.75),
+            )
+
+        # -- Plot index (changed for each field)
+        self.index_text = self.fig.text(
+            0.025,
+            0.9,
+            "",
+            fontsize=20,
+            fontweight="bold",
+            fontstretch="condensed",
+            ha="center",
+        )
+
+        # - General aspects
+        self.fig.suptitle(
+            name_multi + " " + date,
+            weight="bold",
+            stretch="condensed",
+            size="x-large",
+        )
+
+    def _set_layout(self, field):
+        """
+        Use the GridSpec of plot_field_panel() for the field (FH has one more
+        column, so its cross section is wider).
+        """
+
+        ncols = 8 if field == "FH" else 7
+        if ncols != self.ncols:
+            gs = GridSpec(nrows=1, ncols=ncols, figure=self.fig)
+            self.ax1.set_subplotspec(gs[0, :3])
+            self.ax2.set_subplotspec(gs[0, 3:])
+            self.ncols = ncols
+
+    def _swap_horizontal_view(self, field, fmin, fmax, cmap, norm):
+        """
+        Replace data, colormap and normalization of the horizontal view.
+        """
+
+        data = self.grid.fields[field]["data"][self.level]
+        old = self.mesh.get_array()
+        if old.ndim == 2:
+            data = data[: old.shape[0], : old.shape[1]]
+        elif data.size != old.size:
+            # Flat shading drops the last row and column
+            data = data[:-1, :-1].ravel()
+        else:
+            data = data.ravel()
+        self.mesh.set_array(data)
+
+        if cmap is None:
+            cmap = pyart.config.get_field_colormap(field)
+        self.mesh.set_cmap(cmap)
+        if norm is None:
+            norm = Normalize(vmin=fmin, vmax=fmax)
+        self.mesh.set_norm(norm)
+
+    def _get_section(self, field):
+        """
+        Cross section of a field (masked array (z, distance)).
+        """
+
+        if field not in self.sections:
+            self.sections[field] = get_cross_section(
+                self.grid, [field], self.sampler
+            ).sel(field=field)
+        return ma.masked_invalid(self.sections[field].values)
+
+    def _plot_vertical_view(self, field, fmin, fmax, cmap, norm,
+                            minusforty_height):
+        """
+        Plot the cross section (first field) or replace its data, colormap
+        and normalization (next fields).
+        """
+
+        data = self._get_section(field)
+        if cmap is None:
+            cmap = pyart.config.get_field_colormap(field)
+        if norm is None:
+            norm = Normalize(vmin=fmin, vmax=fmax)
+
+        if self.cs_mesh is None:
+            distance = self.sampler["distance"]
+            self.cs_mesh = self.ax2.pcolormesh(
+                distance,
+                0.001 * self.grid.z["data"],
+                data,
+                cmap=cmap,
+                norm=norm,
+                shading="nearest",
+            )
+            # -- 0 and -40 degrees heights
+            self.ax2.axhline(self.zero_height, color="k", linestyle="--")
+            self.minusforty_line = self.ax2.axhline(
+                minusforty_height, color="k", linestyle="--"
+            )
+            # -- Hailpad position (closest point of the section)
+            if self.hailpad_cs_flag:
+                closest = np.argmin(
+                    np.hypot(
+                        self.sampler["lon"] - self.hailpad_pos[0],
+                        self.sampler["lat"] - self.hailpad_pos[1],
+                    )
+                )
+                self.ax2.plot(
+                    distance[closest],
+                    1,
+                    "kX",
+                    markersize=15,
+                    markerfacecolor="w",
+                    alpha=0.75,
+                    clip_on=False,
+                )
+            self.ax2.set_xlim(distance[0], distance[-1])
+        else:
+            self.cs_mesh.set_array(
+                data if self.cs_mesh.get_array().ndim == 2 else data.ravel()
+            )
+            self.cs_mesh.set_cmap(cmap)
+            self.cs_mesh.set_norm(norm)
+            self.minusforty_line.set_ydata([minusforty_height] * 2)
+
+    def plot(
+        self,
+        field,
+        fmin,
+        fmax,
+        cmap=None,
+        norm=None,
+        index="",
+        minusforty_height=None,
+    ):
+        """
+        Plot and save the panel of a field.
+
+        Parameters
+        ----------
+        field: field to be plotted
+        fmin, fmax: field min and max values
+        cmap: define colorbar. None will use Py-ART defauts
+        norm: normalization of the colormap
+        index: plot index (positioned in top-left, publication purposes)
+        minusforty_height: -40 degrees height. None uses the renderer one
+        """
+
+        if minusforty_height is None:
+            minusforty_height = self.minusforty_height
+        self._set_layout(field)
+
+        # - Horizontal view
+        print("-- Plotting horizontal view --")
+        if self.mesh is None:
+            self.display.plot_grid(
+                field,
+                self.level,
+                vmin=fmin,
+                vmax=fmax,
+                cmap=cmap,
+                colorbar_flag=False,
+                norm=norm,
+                ax=self.ax1,
+            )
+            self.mesh = self.display.plots[-1]
+        else:
+            self._swap_horizontal_view(field, fmin, fmax, cmap, norm)
+        self.index_text.set_text(index)
+
+        # - Vertical view
+        print("-- Plotting vertical view --")
+        self._plot_vertical_view(
+            field, fmin, fmax, cmap, norm, minusforty_height
+        )
+        if self.cb is not None:
+            self.cb.remove()
+        self.cb = self.fig.colorbar(
+            self.cs_mesh,
+            orientation="vertical",
+            ax=self.ax2,
+            label=self.grid.fields[field]["units"],
+        )
+        if field == "FH":
+            self.cb = adjust_fhc_colorbar_for_pyart(self.cb)
+
+        # - Titles
+        if field == "FH" or self.pt_br:
+            field_name = self.grid.fields[field]["standard_name"]
+        else:
+            field_name = self.grid.fields[field]["standard_name"].title()
+        if self.pt_br:
+            self.ax1.set_title(
+                field_name + " em " + str(self.level + 1) + " km"
+            )
+            self.ax2.set_title("Corte Vertical de " + field_name)
+            self.ax2.set_ylabel("Distância acima da Superfície (km)")
+        else:
+            self.ax1.set_title(str(self.level + 1) + " km " + field_name)
+            self.ax2.set_title("Cross Section " + field_name)
+            self.ax2.set_ylabel("Distance above Ground (km)")
+        self.ax2.set_xlabel("")
+        self.ax2.grid(linestyle="-", linewidth=0.25)
+        self.ax2.set_ylim(1, 20)
+
+        self.fig.savefig(
+            self.save_path
+            + self.name_multi
+            + " "
+            + field_name
+            + " "
+            + self.date
+            + ".png",
+            dpi=300,
+            bbox_inches="tight",
+            facecolor="none",
+            edgecolor="w",
+        )
+
+    def close(self):
+        """
+        Close the figure.
+        """
+
+        plt.close(self.fig)
+
+
 def plot_ppi_panel(
     ppi,
     field,
@@ -1025,16 +1393,19 @@ def plot_ppi_panel(
         cmap=cmap,
         colorbar_flag=False,
         norm=norm,
-        shapefile=shp_name,
-        shapefile_kwargs={
-            "crs": projection,
-            "edgecolor": "gray",
-            "color": "",
-            "linewidth": 0.75,
-        },
         projection=projection,
         ax=ax1,
     )
+    ax1.add_collection(
+        get_shape_collection(
+            shp_name,
+            extent=[xlim[0], xlim[1], ylim[0], ylim[1]],
+            projection=projection,
+            edgecolor="gray",
+            linewidth=0.75,
+        ),
+        autolim=False,
+    )
     # -- Hailpad position
     display.plot_point(
         hailpad_pos[0],
@@ -4,8 +4,16 @@
 
 from glob import glob
 
-filenames_plevs = sorted(glob('../Data/REANALYSIS/ERA5/era5_plevs_*'))
-filenames_sfc = sorted(glob('../Data/REANALYSIS/ERA5/era5_sfc_*'))
+# Only the daily .nc files (not their .json sidecars, see
+# era5_request_functions.py)
+filenames_plevs = sorted(glob('../Data/REANALYSIS/ERA5/era5_plevs_*.nc'))
+filenames_sfc = sorted(glob('../Data/REANALYSIS/ERA5/era5_sfc_*.nc'))
+
+# Days of the cases (see grab_cases_plevs.py and grab_cases_sfc.py)
+cases = ['2016-12-23', '2016-12-24', '2016-12-25',
+         '2017-01-29', '2017-01-30', '2017-01-31',
+         '2017-03-12', '2017-03-13', '2017-03-14',
+         '2017-11-13', '2017-11-14', '2017-11-15', '2017-11-16']
 
 # South America maps
 params_sa = {
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+ERA5 REQUEST PLANNER
+
+- get_day_request()
+- is_done()
+- adopt_file()
+- plan_requests()
+- retrieve_batch()
+- retrieve_requests()
+- grab_cases()
+
+The days of the cases are merged into as few CDS requests as the size limit
+allows (variables x levels x times x days fields per request). Days of the
+same month go in the same request, since the CDS requests every combination
+of year, month and day. Each request is saved in a temporary file and split
+into one file per day, the same files the scripts read. Each file gets a
+JSON sidecar with its request, so days that are already on disk with the
+same request (or a larger one) are skipped. Daily files without a sidecar
+(e.g. from the previous grab_cases_*.py scripts) get one if their times,
+levels, number of variables and area match the request (see adopt_file()),
+and are otherwise downloaded again. Requests are submitted by a pool
+of threads, e.g.:
+
+    product = {'dataset': 'reanalysis-era5-single-levels',
+               'variable': ['mean_sea_level_pressure'],
+               'area': [30, -100, -70, 0], 'grid': [0.25, 0.25],
+               'target': '../Data/REANALYSIS/ERA5/era5_sfc_{:%Y%m%d}.nc'}
+    grab_cases(['2017-03-14', '2017-03-15'], [product], nworkers=2)
+
+The client (cdsapi.Client() by default) only needs a
+retrieve(dataset, request, target) method, so a local fake can be used.
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import os
+import json
+import time
+import hashlib
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import xarray as xr
+
+ERA5_TIMES = ['{:02d}:00'.format(hour) for hour in range(24)]
+# Fields (variables x levels x times x days) per request
+MAX_FIELDS = 120000
+# Request keys that must be equal for a file to be reused (the others, i.e.
+# variable, pressure_level and time, only need to be contained in the file)
+EXACT_KEYS = ['product_type', 'format', 'area', 'grid']
+
+
+def get_day_request(product, day):
+    """
+    CDS request of a product for one day.
+
+    Parameters
+    ----------
+    product: dictionary with dataset, variable, target (file name format of
+        each day, e.g. 'era5_sfc_{:%Y%m%d}.nc'), and optionally
+        pressure_level, time, area, grid and product_type
+    day: pandas Timestamp
+
+    Returns
+    -------
+    request: dictionary of the request
+    """
+
+    request = {
+        'product_type': product.get('product_type', 'reanalysis'),
+        'format': 'netcdf',
+        'variable': sorted(product['variable']),
+        'year': ['{:%Y}'.format(day)],
+        'month': ['{:%m}'.format(day)],
+        'day': ['{:%d}'.format(day)],
+        'time': list(product.get('time', ERA5_TIMES)),
+    }
+    if product.get('pressure_level'):
+        request['pressure_level'] = sorted(
+            [str(level) for level in product['pressure_level']], key=int)
+    for key in ['area', 'grid']:
+        if product.get(key) is not None:
+            request[key] = list(product[key])
+    return request
+
+
+def is_done(target, dataset, request):
+    """
+    Check if a file exists with a sidecar (target + '.json') of the same
+    dataset and a request containing this one.
+
+    Parameters
+    ----------
+    target: file name
+    dataset: CDS dataset
+    request: request of the file (see get_day_request())
+
+    Returns
+    -------
+    done: True if the file doesn't need to be requested
+    """
+
+    if not (os.path.isfile(target) and os.path.isfile(target + '.json')):
+        return False
+    with open(target + '.json') as f:
+        saved = json.load(f)
+    if saved.get('dataset') != dataset:
+        return False
+    saved = saved.get('request', {})
+    for key, value in request.items():
+        if key in EXACT_KEYS or not isinstance(value, list):
+            if saved.get(key) != value:
+                return False
+        elif not set(value) <= set(saved.get(key, [])):
+            return False
+    return True
+
+
+def _close(a, b):
+    return abs(float(a) - float(b)) < 1e-6
+
+
+def adopt_file(target, dataset, request):
+    """
+    Write the sidecar of a daily file without one (e.g. downloaded by the
+    previous grab_cases_*.py scripts), if its contents match the request:
+    times of the day, pressure levels, number of variables and area.
+
+    Parameters
+    ----------
+    target: file name
+    dataset: CDS dataset
+    request: request of the file (see get_day_request())
+
+    Returns
+    -------
+    adopted: True if the sidecar was written
+    """
+
+    if not os.path.isfile(target) or os.path.isfile(target + '.json'):
+        return False
+    day = pd.Timestamp(request['year'][0] + '-' + request['month'][0] + '-' +
+                       request['day'][0])
+    try:
+        with xr.open_dataset(target) as ds:
+            time_name = 'time' if 'time' in ds.dims else 'valid_time'
+            times = pd.to_datetime(ds[time_name].values)
+            matches = ((times.normalize() == day).all() and
+                       sorted(times.strftime('%H:%M')) ==
+                       sorted(request['time']) and
+                       len(ds.data_vars) == len(request['variable']))
+            if 'pressure_level' in request:
+                level_name = ('level' if 'level' in ds.dims
+                              else 'pressure_level')
+                matches = matches and (
+                    sorted(int(level) for level in ds[level_name].values) ==
+                    sorted(int(level) for level in request['pressure_level']))
+            if 'area' in request:
+                north, west, south, east = request['area']
+                lat, lon = ds['latitude'].values, ds['longitude'].values
+                matches = matches and (
+                    _close(lat.max(), north) and _close(lat.min(), south) and
+                    _close(lon.min(), west) and _close(lon.max(), east))
+    except (OSError, ValueError, KeyError):
+        return False
+
+    if matches:
+        _write_sidecar(target, dataset, request)
+    return bool(matches)
+
+
+def plan_requests(cases, product, max_fields=MAX_FIELDS,
+                  adopt_existing=True):
+    """
+    Merge the days of the cases that aren't on disk into requests.
+
+    Parameters
+    ----------
+    cases: list of days (dates or strings). Repeated days are requested once
+    product: see get_day_request()
+    max_fields: maximum number of fields per request
+    adopt_existing: True to keep daily files without sidecar that match
+        the request (see adopt_file()). False downloads them again
+
+    Returns
+    -------
+    batches: list of dictionaries with dataset, request, days and targets
+        (one per day)
+    """
+
+    days = sorted(set(pd.to_datetime(list(cases)).normalize()))
+    pending = []
+    for day in days:
+        target = product['target'].format(day)
+        request = get_day_request(product, day)
+        if adopt_existing and adopt_file(target, product['dataset'],
+                                         request):
+            print(target, 'kept (downloaded before, without sidecar)')
+        if not is_done(target, product['dataset'], request):
+            pending.append(day)
+    print(len(days) - len(pending), 'days already downloaded,',
+          len(pending), 'to request')
+
+    request = get_day_request(product, pd.Timestamp('2000-01-01'))
+    day_fields = (len(request['variable']) * len(request['time']) *
+                  len(request.get('pressure_level', [None])))
+    max_days = max(max_fields // day_fields, 1)
+
+    batches = []
+    for _, month_days in groupby(pending, key=lambda day: (day.year,
+                                                           day.month)):
+        month_days = list(month_days)
+        for i in range(0, len(month_days), max_days):
+            batch_days = month_days[i:i + max_days]
+            request = get_day_request(product, batch_days[0])
+            request['day'] = ['{:%d}'.format(day) for day in batch_days]
+            batches.append({
+                'dataset': product['dataset'], 'request': request,
+                'days': batch_days,
+                'targets': [product['target'].format(day)
+                            for day in batch_days]})
+    return batches
+
+
+def _write_sidecar(target, dataset, request):
+    with open(target + '.json', 'w') as f:
+        json.dump({'dataset': dataset, 'request': request,
+                   'completed': time.strftime('%Y-%m-%dT%H:%M:%S')},
+                  f, indent=1, sort_keys=True)
+
+
+def retrieve_batch(client, batch):
+    """
+    Retrieve a request and split it into the file of each day, with
+    sidecars.
+
+    Parameters
+    ----------
+    client: object with a retrieve(dataset, request, target) method
+    batch: one of the batches of plan_requests()
+    """
+
+    dataset, request = batch['dataset'], batch['request']
+    folder = os.path.dirname(batch['targets'][0]) or '.'
+    os.makedirs(folder, exist_ok=True)
+    key = hashlib.sha1(json.dumps([dataset, request], sort_keys=True)
+                       .encode()).hexdigest()[:16]
+    temporary = os.path.join(folder, '.era5_' + key + '.nc')
+    try:
+        client.retrieve(dataset, request, temporary)
+
+        if len(batch['days']) == 1:
+            os.replace(temporary, batch['targets'][0])
+        else:
+            with xr.open_dataset(temporary) as ds:
+                time_name = 'time' if 'time' in ds.dims else 'valid_time'
+                for day, target in zip(batch['days'], batch['targets']):
+                    day_ds = ds.sel({time_name: '{:%Y-%m-%d}'.format(day)})
+                    day_ds.to_netcdf(target + '.part')
+                    os.replace(target + '.part', target)
+    finally:
+        # Nothing half-written is left (also when the request fails)
+        for path in [temporary] + [target + '.part'
+                                   for target in batch['targets']]:
+            if os.path.isfile(path):
+                os.remove(path)
+
+    for day, target in zip(batch['days'], batch['targets']):
+        day_request = dict(request, day=['{:%d}'.format(day)])
+        _write_sidecar(target, dataset, day_request)
+
+
+def retrieve_requests(batches, client=None, nworkers=2):
+    """
+    Retrieve requests with a pool of threads (see retrieve_batch()).
+
+    Parameters
+    ----------
+    batches: from plan_requests()
+    client: object with a retrieve(dataset, request, target) method. None
+        uses cdsapi.Client()
+    nworkers: number of simultaneous requests
+
+    Returns
+    -------
+    failed: list of (batch, error) of the requests not retrieved
+    """
+
+    if client is None:
+        import cdsapi
+        client = cdsapi.Client()
+
+    bt = time.time()
+    failed = []
+    with ThreadPoolExecutor(max_workers=nworkers) as executor:
+        futures = {executor.submit(retrieve_batch, client, batch): batch
+                   for batch in batches}
+        for future in as_completed(futures):
+            batch = futures[future]
+            try:
+                future.result()
+                print('Retrieved', ', '.join(batch['targets']))
+            except Exception as error:
+                failed.append((batch, error))
+                print('Failed', batch['dataset'], batch['request']['year'],
+                      batch['request']['month'], batch['request']['day'],
+                      ':', error)
+    print(time.time() - bt, ' seconds to retrieve', len(batches) -
+          len(failed), 'requests')
+    return failed
+
+
+def grab_cases(cases, products, client=None, nworkers=2,
+               max_fields=MAX_FIELDS, adopt_existing=True):
+    """
+    Plan and retrieve the requests of several products for the cases (see
+    plan_requests() and retrieve_requests()).
+
+    Returns
+    -------
+    failed: list of (batch, error) of the requests not retrieved
+    """
+
+    batches = [batch for product in products
+               for batch in plan_requests(cases, product, max_fields,
+                                          adopt_existing)]
+    return retrieve_requests(batches, client, nworkers)
@@ -2,34 +2,47 @@
 """
 """
 
-import xarray as xr
+import os
+import sys
 
-from read_process_functions import get_sfc_jets_data, get_cape_shear_data
-from plot_functions import plot_sfc_jets, plot_cape_shear
+from read_process_functions import (get_sfc_jets_data_all,
+                                    get_cape_shear_data_all, load_era5_days)
+from plot_functions import plot_sfc_jets, plot_cape_shear, init_render_worker
 import custom_vars as cv
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'General_Processing'))
+from render_functions import RenderQueue
 
-for filename_plevs, filename_sfc in zip(cv.filenames_plevs, cv.filenames_sfc):
+# Figures are rendered in parallel (nprocs=0 plots one after the other)
+queue = RenderQueue(nprocs=None, setup=init_render_worker,
+                    setup_args=([cv.params_sa, cv.params_sp],))
+
+# Only the variables, levels and area of the maps are read, two days at a
+# time
+days = load_era5_days(cv.filenames_plevs, cv.filenames_sfc,
+                      ['sfc_jets', 'cape_shear'],
+                      [cv.params_sa['extent'], cv.params_sp['extent']],
+                      nworkers=2)
+
+for filename_plevs, filename_sfc, ds_plevs, ds_sfc in days:
     print('--- Processing files ' + filename_sfc + ' ---')
     print('--- and ' + filename_plevs + ' ---')
-    # Open files
-    ds_plevs = xr.open_dataset(filename_plevs)
-    ds_sfc = xr.open_dataset(filename_sfc)
 
-    for t in range(0, 24):
-        subds_plevs = ds_plevs.isel(time=t)
-        subds_sfc = ds_sfc.isel(time=t)
+    # Fields of all times computed and filtered at once
+    sfc_jets = get_sfc_jets_data_all(ds_plevs, ds_sfc)
+    cape_shear = get_cape_shear_data_all(ds_plevs, ds_sfc)
 
+    for t in range(len(sfc_jets)):
         print('--- Plotting Surface and Jets, t = ' + str(t) + ' ---')
-        plot_data = get_sfc_jets_data(subds_plevs, subds_sfc)
-        plot_sfc_jets(plot_data, cv.params_sa)
-        plot_sfc_jets(plot_data, cv.params_sp)
+        queue.submit(plot_sfc_jets, sfc_jets[t], cv.params_sa)
+        queue.submit(plot_sfc_jets, sfc_jets[t], cv.params_sp)
 
         print('--- Plotting CAPE and Shear, t = ' + str(t) + ' ---')
-        plot_data = get_cape_shear_data(subds_plevs, subds_sfc)
-        plot_cape_shear(plot_data, cv.params_sa)
-        plot_cape_shear(plot_data, cv.params_sp)
+        queue.submit(plot_cape_shear, cape_shear[t], cv.params_sa)
+        queue.submit(plot_cape_shear, cape_shear[t], cv.params_sp)
 
+queue.close()
 
 # for filename_plevs, filename_sfc in zip(cv.filenames_plevs, cv.filenames_sfc):
 #     print('--- Processing files ' + filename_sfc + ' ---')
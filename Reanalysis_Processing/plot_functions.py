@@ -2,14 +2,21 @@
 """
 """
 
+import os
+import sys
+
 import cartopy.crs as ccrs
-import cartopy.io.shapereader as shpreader
 from cartopy.mpl.gridliner import LONGITUDE_FORMATTER, LATITUDE_FORMATTER
 import matplotlib.pyplot as plt
 import numpy as np
 
 import custom_cbars
 
+# Shared shapefile geometry cache (General_Processing/shapefile_functions.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'General_Processing'))
+from shapefile_functions import get_shape_collection, get_shape_segments
+
 
 def plot_main_map(shapefolder, grid_spc=20, extent=[-180, 180, -90, 90]):
     """
@@ -22,16 +29,15 @@ def plot_main_map(shapefolder, grid_spc=20, extent=[-180, 180, -90, 90]):
 
     ax.set_extent(extent, crs=trans)
 
-    ax.add_geometries(
-        shpreader.Reader(shapefolder + 'estadosl_2007').geometries(), trans,
-        linewidth=0.3, facecolor='none', edgecolor='darkslategray'
-    )
-    ax.add_geometries(
-        shpreader.Reader(
-            shapefolder + 'ne_10m_admin_0_countries'
-        ).geometries(),
-        trans, linewidth=0.5, facecolor='none', edgecolor='darkslategray'
-    )
+    # Clipped, projected and cached once per extent
+    ax.add_collection(get_shape_collection(
+        shapefolder + 'estadosl_2007', extent=extent, projection=proj,
+        linewidth=0.3, edgecolor='darkslategray'
+    ), autolim=False)
+    ax.add_collection(get_shape_collection(
+        shapefolder + 'ne_10m_admin_0_countries', extent=extent,
+        projection=proj, linewidth=0.5, edgecolor='darkslategray'
+    ), autolim=False)
 
     gl = ax.gridlines(crs=trans, xlocs=np.arange(-180, 181, grid_spc),
                       ylocs=np.arange(-80, 90, grid_spc), draw_labels=True)
@@ -42,6 +48,20 @@ def plot_main_map(shapefolder, grid_spc=20, extent=[-180, 180, -90, 90]):
     return fig, ax, trans
 
 
+def init_render_worker(fig_asps):
+    """
+    Prepare a render process (see General_Processing/render_functions.py):
+    colormaps are registered when this module is imported, and shapefile
+    lines of each map are loaded once
+    """
+
+    proj = ccrs.PlateCarree(central_longitude=-57.5)
+    for fig_asp in fig_asps:
+        for name in ['estadosl_2007', 'ne_10m_admin_0_countries']:
+            get_shape_segments(fig_asp['shapefiles_path'] + name,
+                               extent=fig_asp['extent'], projection=proj)
+
+
 def plot_sfc_jets(data, fig_asp, **kwargs):
     """
     """
@@ -2,11 +2,31 @@
 """
 """
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import scipy.ndimage as ndimage
+import xarray as xr
 
 import metpy.calc as mpcalc
 
+# Gaussian filter sigma of the maps (lat, lon), and of the time series of
+# maps (time, lat, lon), where each time is filtered separately
+SIGMA = 3
+SIGMA_TIME = (0, 3, 3)
+
+# Variables (and pressure levels) read by each product
+PRODUCT_FIELDS = {
+    'sfc_jets': {'plevs': {'z': [500, 1000], 'u': [250], 'v': [250]},
+                 'sfc': ['msl']},
+    'cape_shear': {'plevs': {'z': [850], 'u': [500, 1000], 'v': [500, 1000]},
+                   'sfc': ['cape', 'cin']},
+}
+# Degrees around the plot extents, so the filters (truncated at 4 sigma, in
+# 0.25 degree pixels) give the same values inside the extents
+MARGIN = 4 * SIGMA * 0.25
+
 
 class ReturnList(object):
     def __init__(self, lat, lon, title_plot, title_figure, mslp,
@@ -39,33 +59,33 @@ def get_main_data(data):
     return lat, lon, date, time
 
 
-def calc_filter_geo_height(geopotential, filter=True):
+def calc_filter_geo_height(geopotential, filter=True, sigma=SIGMA):
     """
     """
 
     z = geopotential/9.81/10
     if filter:
-        z = ndimage.gaussian_filter(z, sigma=3, order=0)
+        z = ndimage.gaussian_filter(z, sigma=sigma, order=0)
     return z
 
 
-def calc_filter_wind_speed(u, v, filter=True):
+def calc_filter_wind_speed(u, v, filter=True, sigma=SIGMA):
     """
     """
 
     wind = mpcalc.wind_speed(u, v)
     if filter:
-        wind = ndimage.gaussian_filter(wind, sigma=3, order=0)
+        wind = ndimage.gaussian_filter(wind, sigma=sigma, order=0)
     return wind
 
 
-def calc_filter_thickness(z_up, z_down, filter=True):
+def calc_filter_thickness(z_up, z_down, filter=True, sigma=SIGMA):
     """
     """
 
     thick = (z_up - z_down)
     if filter:
-        thick = ndimage.gaussian_filter(thick, sigma=3, order=0)
+        thick = ndimage.gaussian_filter(thick, sigma=sigma, order=0)
     return thick
 
 
@@ -129,3 +149,191 @@ def get_cape_shear_data(data_plevs, data_sfc, **kwargs):
         mslp=None, z=z, thick=None, cape=cape, cin=cin, wind=None,
         u=u.data, v=v.data
         )
+
+
+def get_titles(data_plevs, t, title, name):
+    """
+    Plot and figure titles of time t (as in get_sfc_jets_data()).
+    """
+
+    lat, lon, date, time = get_main_data(data_plevs.isel(time=t))
+    title_plot = title + '\n' + date + ' ' + time + ' UTC'
+    title_figure = '_' + name + '_' + date.replace('-', '') + time
+    return lat, lon, title_plot, title_figure
+
+
+def get_sfc_jets_data_all(data_plevs, data_sfc, **kwargs):
+    """
+    As get_sfc_jets_data(), for all times at once: fields are computed and
+    filtered over the (time, lat, lon) arrays (SIGMA_TIME).
+
+    Returns
+    -------
+    data: list of ReturnList, one per time
+    """
+
+    # title = 'MSLP (hPa), 1000-500hPa Thickness (dam)'
+    title = 'PNMM (hPa), Espessura 1000-500hPa (dam)'  # pt-br
+
+    wind = calc_filter_wind_speed(data_plevs['u'].sel(level=250),
+                                  data_plevs['v'].sel(level=250),
+                                  sigma=SIGMA_TIME)
+    mslp = ndimage.gaussian_filter(data_sfc['msl'], sigma=SIGMA_TIME,
+                                   order=0)/100
+    thick = calc_filter_thickness(
+        calc_filter_geo_height(data_plevs['z'].sel(level=500), filter=False),
+        calc_filter_geo_height(data_plevs['z'].sel(level=1000), filter=False),
+        sigma=SIGMA_TIME
+    )
+
+    data = []
+    for t in range(data_plevs['time'].size):
+        lat, lon, title_plot, title_figure = get_titles(
+            data_plevs, t, title, 'sfc-jets')
+        data.append(ReturnList(
+            lat=lat, lon=lon, title_plot=title_plot,
+            title_figure=title_figure, mslp=mslp[t], z=None, thick=thick[t],
+            cape=None, cin=None, wind=wind[t], u=None, v=None
+            ))
+    return data
+
+
+def get_cape_shear_data_all(data_plevs, data_sfc, **kwargs):
+    """
+    As get_cape_shear_data(), for all times at once: fields are computed
+    and filtered over the (time, lat, lon) arrays (SIGMA_TIME).
+
+    Returns
+    -------
+    data: list of ReturnList, one per time
+    """
+
+    # title = '850hPa Geo. Height (dam), 1000-500hPa Shear (kt)'
+    title = 'Alt. Geo. 850hPa (dam), Cisalhamento 1000-500hPa (kt)'  # pt-br
+
+    z = calc_filter_geo_height(data_plevs['z'].sel(level=850),
+                               sigma=SIGMA_TIME)
+    cape = ndimage.gaussian_filter(data_sfc['cape'], sigma=SIGMA_TIME,
+                                   order=0)
+    cin = ndimage.gaussian_filter(data_sfc['cin'], sigma=SIGMA_TIME, order=0)
+    u, v = calc_wind_shear(
+        data_plevs['u'].sel(level=500), data_plevs['v'].sel(level=500),
+        data_plevs['u'].sel(level=1000), data_plevs['v'].sel(level=1000))
+    u, v = u.data, v.data
+
+    data = []
+    for t in range(data_plevs['time'].size):
+        lat, lon, title_plot, title_figure = get_titles(
+            data_plevs, t, title, 'cape-shear')
+        data.append(ReturnList(
+            lat=lat, lon=lon, title_plot=title_plot,
+            title_figure=title_figure, mslp=None, z=z[t], thick=None,
+            cape=cape[t], cin=cin[t], wind=None, u=u[t], v=v[t]
+            ))
+    return data
+
+
+def get_product_fields(products):
+    """
+    Variables and pressure levels needed by a list of products (see
+    PRODUCT_FIELDS).
+
+    Returns
+    -------
+    plevs_vars: list of pressure level variables
+    levels: sorted list of pressure levels
+    sfc_vars: list of surface variables
+    """
+
+    plevs_vars, levels, sfc_vars = set(), set(), set()
+    for product in products:
+        fields = PRODUCT_FIELDS[product]
+        for var, var_levels in fields['plevs'].items():
+            plevs_vars.add(var)
+            levels.update(var_levels)
+        sfc_vars.update(fields['sfc'])
+    return sorted(plevs_vars), sorted(levels), sorted(sfc_vars)
+
+
+def _subset_extent(ds, extents, margin):
+    """
+    Select the area of all extents ([min lon, max lon, min lat, max lat])
+    plus a margin in degrees.
+    """
+
+    extents = np.array(extents, dtype=float)
+    lon_min, lat_min = extents[:, [0, 2]].min(axis=0) - margin
+    lon_max, lat_max = extents[:, [1, 3]].max(axis=0) + margin
+    lat = ds['latitude'].values
+    if lat[0] > lat[-1]:
+        lat_slice = slice(lat_max, lat_min)
+    else:
+        lat_slice = slice(lat_min, lat_max)
+    return ds.sel(latitude=lat_slice, longitude=slice(lon_min, lon_max))
+
+
+def open_era5(filename_plevs, filename_sfc, products, extents,
+              margin=MARGIN, time_chunk=1):
+    """
+    Open ERA5 files lazily (dask chunks of time_chunk times), with only the
+    variables and levels of the products, in the area of the extents.
+
+    Parameters
+    ----------
+    filename_plevs, filename_sfc: pressure level and surface files
+    products: list of products (see PRODUCT_FIELDS)
+    extents: list of plot extents ([min lon, max lon, min lat, max lat])
+    margin: degrees around the extents
+    time_chunk: number of times of each chunk
+
+    Returns
+    -------
+    ds_plevs, ds_sfc: xarray Datasets (not loaded)
+    """
+
+    plevs_vars, levels, sfc_vars = get_product_fields(products)
+    ds_plevs = xr.open_dataset(filename_plevs, chunks={'time': time_chunk})
+    ds_plevs = ds_plevs[plevs_vars].sel(level=levels)
+    ds_sfc = xr.open_dataset(filename_sfc, chunks={'time': time_chunk})
+    ds_sfc = ds_sfc[sfc_vars]
+    return (_subset_extent(ds_plevs, extents, margin),
+            _subset_extent(ds_sfc, extents, margin))
+
+
+def _load_era5(filename_plevs, filename_sfc, products, extents, margin):
+    ds_plevs, ds_sfc = open_era5(filename_plevs, filename_sfc, products,
+                                 extents, margin)
+    return (filename_plevs, filename_sfc, ds_plevs.load(), ds_sfc.load())
+
+
+def load_era5_days(filenames_plevs, filenames_sfc, products, extents,
+                   nworkers=2, margin=MARGIN):
+    """
+    Load pairs of ERA5 files (see open_era5()) with a pool of threads,
+    yielding them in order. At most nworkers days are loaded ahead of the
+    one being used.
+
+    Parameters
+    ----------
+    filenames_plevs, filenames_sfc: lists of pressure level and surface
+        files (one pair per day)
+    products, extents, margin: see open_era5()
+    nworkers: number of days loaded at the same time
+
+    Returns
+    -------
+    Generator of (filename_plevs, filename_sfc, ds_plevs, ds_sfc), with the
+        Datasets loaded in memory
+    """
+
+    with ThreadPoolExecutor(max_workers=nworkers) as executor:
+        futures = deque()
+        for filename_plevs, filename_sfc in zip(filenames_plevs,
+                                                filenames_sfc):
+            futures.append(executor.submit(
+                _load_era5, filename_plevs, filename_sfc, products, extents,
+                margin))
+            if len(futures) > nworkers:
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+TESTS OF era5_request_functions.py
+
+Requests are sent to a local fake of cdsapi.Client, which writes a small
+NetCDF file with the requested variables, levels, days and times. Run with:
+
+    python -m pytest Reanalysis_Processing/test_era5_request_functions.py
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+xr = pytest.importorskip('xarray')
+
+from era5_request_functions import (plan_requests, retrieve_requests,
+                                    grab_cases)
+from custom_vars import cases
+
+
+class FakeClient(object):
+    """
+    Stand-in of cdsapi.Client: writes the requested fields (zeros) on a
+    small grid of the requested area.
+    """
+
+    def __init__(self, fail=False):
+        self.requests = []
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def retrieve(self, dataset, request, target):
+        with self.lock:
+            self.requests.append((dataset, request))
+        # Something on disk before failing, as an interrupted download
+        with open(target, 'w') as f:
+            f.write('partial')
+        if self.fail:
+            raise RuntimeError('request failed')
+
+        times = pd.to_datetime([
+            request['year'][0] + '-' + month + '-' + day + ' ' + hour
+            for month in request['month'] for day in request['day']
+            for hour in request['time']])
+        north, west, south, east = request['area']
+        coords = {'time': times,
+                  'latitude': np.linspace(north, south, 3),
+                  'longitude': np.linspace(west, east, 4)}
+        dims = ['time']
+        if 'pressure_level' in request:
+            coords['level'] = [int(level)
+                               for level in request['pressure_level']]
+            dims.append('level')
+        dims += ['latitude', 'longitude']
+        shape = [len(coords[dim]) for dim in dims]
+        ds = xr.Dataset({variable: (dims, np.zeros(shape, dtype='f4'))
+                         for variable in request['variable']}, coords=coords)
+        ds.to_netcdf(target)
+
+
+class RequestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.product = {
+            'dataset': 'reanalysis-era5-pressure-levels',
+            'variable': ['geopotential', 'u_component_of_wind',
+                         'v_component_of_wind'],
+            'pressure_level': ['250', '500', '850', '1000'],
+            'area': [30, -100, -70, 0],
+            'grid': [0.25, 0.25],
+            'target': os.path.join(self.folder, 'era5_plevs_{:%Y%m%d}.nc'),
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def daily_files(self):
+        return sorted(f for f in os.listdir(self.folder)
+                      if f.endswith('.nc'))
+
+    def test_batching(self):
+        batches = plan_requests(cases, self.product)
+
+        # 13 days of 4 months
+        self.assertEqual(len(batches), 4)
+        self.assertEqual(
+            [(b['request']['year'], b['request']['month'],
+              b['request']['day']) for b in batches],
+            [(['2016'], ['12'], ['23', '24', '25']),
+             (['2017'], ['01'], ['29', '30', '31']),
+             (['2017'], ['03'], ['12', '13', '14']),
+             (['2017'], ['11'], ['13', '14', '15', '16'])])
+        # Repeated days are requested once
+        self.assertEqual(len(plan_requests(cases + cases[:3],
+                                           self.product)), 4)
+
+    def test_size_limit(self):
+        # 3 variables x 4 levels x 24 times = 288 fields per day
+        batches = plan_requests(cases, self.product, max_fields=2 * 288)
+
+        self.assertEqual([len(b['days']) for b in batches],
+                         [2, 1, 2, 1, 2, 1, 2, 2])
+
+    def test_split_and_skip(self):
+        client = FakeClient()
+        self.assertEqual(grab_cases(cases, [self.product], client=client),
+                         [])
+
+        self.assertEqual(len(client.requests), 4)
+        self.assertEqual(self.daily_files(), sorted(
+            '{:era5_plevs_%Y%m%d.nc}'.format(pd.Timestamp(day))
+            for day in cases))
+        # No temporary files left, one sidecar per day
+        self.assertEqual(len(os.listdir(self.folder)), 2 * len(cases))
+        for day in cases:
+            target = self.product['target'].format(pd.Timestamp(day))
+            self.assertTrue(os.path.isfile(target + '.json'))
+            with xr.open_dataset(target) as ds:
+                self.assertEqual(ds['time'].size, 24)
+                self.assertTrue(
+                    (ds['time'].dt.strftime('%Y-%m-%d') == day).all())
+                self.assertEqual(sorted(ds.data_vars),
+                                 sorted(self.product['variable']))
+
+        # Second run: nothing to request
+        self.assertEqual(plan_requests(cases, self.product), [])
+        grab_cases(cases, [self.product], client=client)
+        self.assertEqual(len(client.requests), 4)
+
+        # A larger request (one more level) is requested again
+        product = dict(self.product,
+                       pressure_level=self.product['pressure_level'] +
+                       ['700'])
+        self.assertEqual(len(plan_requests(cases, product)), 4)
+
+    def test_adopt_existing(self):
+        grab_cases(cases[:3], [self.product], client=FakeClient())
+        # As downloaded by the previous scripts, without sidecars
+        for day in cases[:3]:
+            os.remove(self.product['target'].format(pd.Timestamp(day)) +
+                      '.json')
+
+        self.assertEqual(
+            len(plan_requests(cases[:3], self.product,
+                              adopt_existing=False)), 1)
+        self.assertEqual(plan_requests(cases[:3], self.product), [])
+        for day in cases[:3]:
+            self.assertTrue(os.path.isfile(
+                self.product['target'].format(pd.Timestamp(day)) + '.json'))
+
+        # Files of another area are requested again
+        for day in cases[:3]:
+            os.remove(self.product['target'].format(pd.Timestamp(day)) +
+                      '.json')
+        product = dict(self.product, area=[10, -80, -40, -30])
+        self.assertEqual(len(plan_requests(cases[:3], product)), 1)
+
+    def test_failed_request(self):
+        batches = plan_requests(cases[:3], self.product)
+        failed = retrieve_requests(batches, client=FakeClient(fail=True))
+
+        self.assertEqual(len(failed), 1)
+        self.assertIsInstance(failed[0][1], RuntimeError)
+        # The temporary file is removed
+        self.assertEqual(os.listdir(self.folder), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
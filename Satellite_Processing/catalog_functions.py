@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+GOES-16 SCENE CATALOG
+
+- parse_goes_filename()
+- update_catalog()
+- read_catalog()
+- find_scenes()
+
+Band, scan mode, sector, platform, start/end times and size of each GOES-16
+file are taken from its name (no file is opened) and saved in a CSV
+catalog. Refreshing the catalog only parses files that are new or changed,
+e.g.:
+
+    catalog = update_catalog('../Data/SATELLITE/GOES16/level_2/2017/*',
+                             'goes16_catalog.csv')
+    scenes = find_scenes(catalog, radar_times, band=13, tolerance='5min')
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import os
+import re
+from glob import glob
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# e.g. OR_ABI-L2-CMIPF-M3C13_G16_s20170710000027_e20170710010394_c2017...nc
+GOES_FILENAME = re.compile(
+    r'OR_ABI-(?P<level>L\d\w?)-(?P<product>[A-Za-z]+?)(?P<sector>F|C|M1|M2)'
+    r'-M(?P<mode>\d)C(?P<band>\d{2})_(?P<platform>G\d{2})'
+    r'_s(?P<start>\d{14})_e(?P<end>\d{14})_c(?P<created>\d{14})')
+
+CATALOG_COLUMNS = ['path', 'filename', 'level', 'product', 'sector', 'mode',
+                   'band', 'platform', 'start', 'end', 'created', 'size',
+                   'mtime']
+# Types of the non-text columns (so new and read catalogs can be joined and
+# searched by time)
+CATALOG_DTYPES = {'mode': 'int64', 'band': 'int64', 'start': 'datetime64[ns]',
+                  'end': 'datetime64[ns]', 'created': 'datetime64[ns]',
+                  'size': 'int64', 'mtime': 'float64'}
+
+
+def _parse_time(timestamp):
+    # YYYYJJJHHMMSSs (day of year, tenths of second)
+    return (datetime.strptime(timestamp[:13], '%Y%j%H%M%S') +
+            pd.Timedelta(int(timestamp[13]) * 100, 'ms'))
+
+
+def parse_goes_filename(filename):
+    """
+    Get scene information from the name of a GOES-16 ABI file.
+
+    Parameters
+    ----------
+    filename: file name or path
+
+    Returns
+    -------
+    info: dictionary with level, product, sector, mode, band (int),
+        platform, start, end and created (datetimes). None if the name
+        doesn't match
+    """
+
+    match = GOES_FILENAME.search(os.path.basename(filename))
+    if match is None:
+        return None
+    info = match.groupdict()
+    info['mode'] = int(info['mode'])
+    info['band'] = int(info['band'])
+    for key in ['start', 'end', 'created']:
+        info[key] = _parse_time(info[key])
+    return info
+
+
+def read_catalog(catalog_file):
+    """
+    Read a scene catalog (see update_catalog()).
+
+    Parameters
+    ----------
+    catalog_file: CSV file
+
+    Returns
+    -------
+    catalog: pandas DataFrame, sorted by start time
+    """
+
+    return pd.read_csv(catalog_file, parse_dates=['start', 'end', 'created']
+                       ).astype(CATALOG_DTYPES)
+
+
+def _new_catalog(rows):
+    # Catalog of parsed scenes (see parse_goes_filename()), typed even if
+    # empty
+    return pd.DataFrame(rows, columns=CATALOG_COLUMNS).astype(CATALOG_DTYPES)
+
+
+def update_catalog(pattern, catalog_file=None):
+    """
+    Create or refresh a scene catalog: only new or changed files (by size
+    and modification time) are parsed, and missing files are removed.
+
+    Parameters
+    ----------
+    pattern: glob pattern of the GOES-16 files (or list of patterns)
+    catalog_file: CSV file where the catalog is kept. None only returns it
+
+    Returns
+    -------
+    catalog: pandas DataFrame (one row per scene), sorted by start time
+    """
+
+    if isinstance(pattern, str):
+        pattern = [pattern]
+    paths = sorted(set(path for p in pattern for path in glob(p)))
+
+    if catalog_file is not None and os.path.isfile(catalog_file):
+        catalog = read_catalog(catalog_file)
+    else:
+        catalog = _new_catalog([])
+    known = dict(zip(catalog['path'], zip(catalog['size'],
+                                          catalog['mtime'])))
+
+    rows = []
+    keep = []
+    for path in paths:
+        stat = os.stat(path)
+        if known.get(path) == (stat.st_size, stat.st_mtime):
+            keep.append(path)
+            continue
+        info = parse_goes_filename(path)
+        if info is None:
+            continue
+        info.update(path=path, filename=os.path.basename(path),
+                    size=stat.st_size, mtime=stat.st_mtime)
+        rows.append(info)
+    print(len(rows), 'new or changed scenes,', len(keep), 'unchanged')
+
+    # Empty parts are left out, so they don't change the column types
+    parts = [part for part in [catalog[catalog['path'].isin(keep)],
+                               _new_catalog(rows)] if len(part)]
+    if parts:
+        catalog = pd.concat(parts, ignore_index=True)
+    else:
+        catalog = _new_catalog([])
+    catalog = catalog.sort_values(['start', 'band']).reset_index(drop=True)
+    if catalog_file is not None:
+        catalog.to_csv(catalog_file, index=False)
+    return catalog
+
+
+def find_scenes(catalog, times, band=None, tolerance='5min', platform=None,
+                sector=None):
+    """
+    Find the scenes starting within +-tolerance of each time (e.g. radar
+    times).
+
+    Parameters
+    ----------
+    catalog: scene catalog (see update_catalog())
+    times: list of times (datetimes or strings)
+    band: band number, list of bands or None (all)
+    tolerance: time tolerance (pandas Timedelta or string)
+    platform, sector: e.g. 'G16', 'F'. None uses all
+
+    Returns
+    -------
+    scenes: pandas DataFrame with the catalog rows of the matching scenes,
+        the time they match ('time'), its position in times ('query') and
+        the time difference ('dt')
+    """
+
+    selected = catalog
+    if band is not None:
+        selected = selected[selected['band'].isin(np.atleast_1d(band))]
+    if platform is not None:
+        selected = selected[selected['platform'] == platform]
+    if sector is not None:
+        selected = selected[selected['sector'] == sector]
+    selected = selected.sort_values('start').reset_index(drop=True)
+
+    times = pd.to_datetime(pd.Series(times)).values
+    tolerance = pd.Timedelta(tolerance).to_timedelta64()
+    start = selected['start'].values
+    # Scenes of each time: start[first:last] (sorted starts)
+    first = np.searchsorted(start, times - tolerance, side='left')
+    last = np.searchsorted(start, times + tolerance, side='right')
+    counts = last - first
+    rows = np.concatenate(
+        [np.arange(f, l) for f, l in zip(first, last)] or [np.array([])]
+    ).astype(int)
+
+    scenes = selected.iloc[rows].reset_index(drop=True)
+    scenes['time'] = np.repeat(times, counts)
+    scenes['query'] = np.repeat(np.arange(times.size), counts)
+    scenes['dt'] = scenes['start'] - scenes['time']
+    return scenes
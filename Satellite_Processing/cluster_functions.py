@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+BRIGHTNESS TEMPERATURE OF CLUSTER BOXES
+
+- get_cluster_pixels()
+- get_cluster_stats()
+- get_cluster_time_series()
+
+The pixels of the GOES-16 fixed grid (native projection, no remapping)
+inside each cluster box (ForTraCC clusters_*.csv: date, min/max lat/lon)
+are found once and saved as flat pixel indexes. Each scene then only reads
+the window containing all boxes and gathers those pixels, and statistics of
+all clusters are computed at once, e.g.:
+
+    clusters_box = pd.read_csv('clusters_20170314.csv', parse_dates=['date'])
+    catalog = update_catalog('../Data/SATELLITE/GOES16/level_2/2017/*')
+    series = get_cluster_time_series(clusters_box, catalog, band=13)
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import os
+import zipfile
+import hashlib
+
+import numpy as np
+import pandas as pd
+from netCDF4 import Dataset
+
+from remap import geos_forward, geos_inverse, getGeoT
+from catalog_functions import find_scenes
+
+
+def _get_image_geometry(nc):
+    """
+    Image bounds (x1, y1, x2, y2 in meters) and size of an open file.
+    """
+
+    H = nc.variables['goes_imager_projection'].perspective_point_height
+    x1 = float(nc.variables['x_image_bounds'][0] * H)
+    x2 = float(nc.variables['x_image_bounds'][1] * H)
+    y1 = float(nc.variables['y_image_bounds'][1] * H)
+    y2 = float(nc.variables['y_image_bounds'][0] * H)
+    nlines, ncols = nc.variables['CMI'].shape
+    return x1, y1, x2, y2, nlines, ncols
+
+
+def get_cluster_pixels(clusters, x1, y1, x2, y2, nlines, ncols,
+                       cache_path=None):
+    """
+    Flat indexes of the fixed grid pixels inside each cluster box.
+
+    Parameters
+    ----------
+    clusters: pandas DataFrame with min_lon, max_lon, min_lat and max_lat
+        of each cluster
+    x1, y1, x2, y2: image bounds in meters
+    nlines, ncols: image size
+    cache_path: folder of the cache files. None computes without caching
+
+    Returns
+    -------
+    pixels: flat indexes of the image, sorted by cluster
+    offsets: start of the pixels of each cluster in pixels (plus the end),
+        i.e. pixels[offsets[i]:offsets[i + 1]] are the pixels of cluster i
+    """
+
+    boxes = clusters[['min_lon', 'max_lon', 'min_lat', 'max_lat']].values
+    filename = None
+    if cache_path is not None:
+        key = hashlib.sha1(str((
+            np.round(boxes, 4).tolist(),
+            [round(v, 3) for v in (x1, y1, x2, y2)], nlines, ncols
+        )).encode()).hexdigest()[:16]
+        filename = os.path.join(cache_path, 'clusters_' + key + '.npz')
+        if os.path.isfile(filename):
+            try:
+                with np.load(filename) as cached:
+                    return cached['pixels'], cached['offsets']
+            except (OSError, ValueError, KeyError, EOFError,
+                    zipfile.BadZipFile):
+                # Unreadable cache file: computed (and written) again
+                pass
+
+    # Window of the image containing all boxes (corners and middle of the
+    # north and south edges, plus a margin)
+    geot = getGeoT([x1, y1, x2, y2], nlines, ncols)
+    middle = boxes[:, :2].mean(axis=1)
+    lons = np.concatenate([boxes[:, 0], boxes[:, 1], boxes[:, 0], boxes[:, 1],
+                           middle, middle])
+    lats = np.concatenate([boxes[:, 2], boxes[:, 2], boxes[:, 3], boxes[:, 3],
+                           boxes[:, 2], boxes[:, 3]])
+    x, y, _ = geos_forward(lons, lats)
+    cols = np.floor((x - geot[0]) / geot[1])
+    rows = np.floor((y - geot[3]) / geot[5])
+    row0 = int(np.clip(np.nanmin(rows) - 2, 0, nlines))
+    row1 = int(np.clip(np.nanmax(rows) + 3, 0, nlines))
+    col0 = int(np.clip(np.nanmin(cols) - 2, 0, ncols))
+    col1 = int(np.clip(np.nanmax(cols) + 3, 0, ncols))
+
+    # Lat, lon of the window pixel centers
+    col, row = np.meshgrid(np.arange(col0, col1), np.arange(row0, row1))
+    lon, lat = geos_inverse(geot[0] + (col + 0.5) * geot[1],
+                            geot[3] + (row + 0.5) * geot[5])
+    flat = (row * ncols + col).ravel()
+    lon, lat = lon.ravel(), lat.ravel()
+
+    pixels = []
+    for min_lon, max_lon, min_lat, max_lat in boxes:
+        inside = ((lon >= min_lon) & (lon <= max_lon) &
+                  (lat >= min_lat) & (lat <= max_lat))
+        pixels.append(flat[inside])
+    offsets = np.cumsum([0] + [p.size for p in pixels])
+    pixels = np.concatenate(pixels).astype(np.int64)
+
+    if filename is not None:
+        # Written under another name first, since parallel processes may
+        # compute the same pixels
+        os.makedirs(cache_path, exist_ok=True)
+        temporary = filename[:-4] + '_' + str(os.getpid()) + '.npz'
+        np.savez(temporary, pixels=pixels, offsets=offsets)
+        os.replace(temporary, filename)
+    return pixels, offsets
+
+
+def _group_stats(values, groups, n_groups, percentiles):
+    """
+    Count, min, mean, max and percentiles (linear interpolation) of values
+    of each group, at once (NaN for empty groups).
+    """
+
+    valid = np.isfinite(values)
+    values, groups = values[valid], groups[valid]
+    order = np.lexsort((values, groups))
+    values, groups = values[order], groups[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    filled = counts > 0
+
+    stats = {'n_pixels': counts}
+    for name, position in [('min_tb', 0.0), ('max_tb', 1.0)] + [
+            ('p' + str(q) + '_tb', q / 100.0) for q in percentiles]:
+        # Position of the percentile in the sorted values of each group
+        rank = starts + position * np.maximum(counts - 1, 0)
+        low = np.floor(rank).astype(int)
+        high = np.minimum(low + 1, starts + np.maximum(counts - 1, 0))
+        weight = rank - low
+        low = np.minimum(low, values.size - 1)
+        high = np.minimum(high, values.size - 1)
+        result = np.full(n_groups, np.nan)
+        if values.size:
+            result[filled] = (values[low] * (1 - weight) +
+                              values[high] * weight)[filled]
+        stats[name] = result
+    sums = np.bincount(groups, weights=values, minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stats['mean_tb'] = np.where(filled, sums / counts, np.nan)
+    return stats
+
+
+def get_cluster_stats(nc, pixels, offsets, percentiles=(5, 50)):
+    """
+    Brightness temperature statistics of the pixels of each cluster in a
+    scene, reading only the window containing them.
+
+    Parameters
+    ----------
+    nc: open GOES-16 file (netCDF4 Dataset)
+    pixels, offsets: from get_cluster_pixels()
+    percentiles: percentiles to be computed
+
+    Returns
+    -------
+    stats: dictionary of arrays (one value per cluster): n_pixels, min_tb,
+        max_tb, mean_tb and p<percentile>_tb
+    """
+
+    n_clusters = len(offsets) - 1
+    ncols = nc.variables['CMI'].shape[1]
+    rows, cols = np.divmod(pixels, ncols)
+    if pixels.size:
+        window = (slice(rows.min(), rows.max() + 1),
+                  slice(cols.min(), cols.max() + 1))
+    else:
+        window = (slice(0, 1), slice(0, 1))
+
+    cmi = nc.variables['CMI']
+    cmi.set_auto_maskandscale(False)
+    raw = np.asarray(cmi[window])
+    fill = getattr(cmi, '_FillValue', -1)
+    values = raw[rows - window[0].start, cols - window[1].start]
+    values = np.where(values == fill, np.nan,
+                      values * cmi.scale_factor + cmi.add_offset)
+
+    groups = np.repeat(np.arange(n_clusters), np.diff(offsets))
+    return _group_stats(values, groups, n_clusters, percentiles)
+
+
+def get_cluster_time_series(clusters, catalog, band=13, tolerance='5min',
+                            percentiles=(5, 50), cache_path=None):
+    """
+    Brightness temperature statistics of each cluster box, in the scenes
+    within +-tolerance of the cluster time.
+
+    Parameters
+    ----------
+    clusters: pandas DataFrame with date, min_lon, max_lon, min_lat and
+        max_lat of each cluster
+    catalog: scene catalog (see catalog_functions.py)
+    band: band of the scenes
+    tolerance: maximum time between cluster and scene
+    percentiles: percentiles to be computed
+    cache_path: folder of the pixel index cache files
+
+    Returns
+    -------
+    series: pandas DataFrame with one row per cluster and matching scene:
+        cluster columns, scene time ('start'), file and statistics
+    """
+
+    clusters = clusters.reset_index(drop=True)
+    dates = pd.to_datetime(clusters['date'])
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_convert(None)
+    scenes = find_scenes(catalog, dates, band=band, tolerance=tolerance)
+
+    # Pixels of all clusters, found once per image geometry
+    cluster_pixels = {}
+    rows = []
+    for path, scene in scenes.groupby('path'):
+        nc = Dataset(path)
+        geometry = _get_image_geometry(nc)
+        if geometry not in cluster_pixels:
+            cluster_pixels[geometry] = get_cluster_pixels(
+                clusters, *geometry, cache_path=cache_path)
+        all_pixels, all_offsets = cluster_pixels[geometry]
+
+        # Pixels of the clusters of this scene
+        selected = scene['query'].values
+        scene_pixels = np.concatenate(
+            [all_pixels[all_offsets[i]:all_offsets[i + 1]]
+             for i in selected])
+        offsets = np.cumsum(
+            [0] + [all_offsets[i + 1] - all_offsets[i] for i in selected])
+        stats = get_cluster_stats(nc, scene_pixels, offsets, percentiles)
+        nc.close()
+
+        result = clusters.loc[selected].reset_index()
+        result = result.rename(columns={'index': 'cluster'})
+        result['start'] = scene['start'].values
+        result['path'] = path
+        for name, value in stats.items():
+            result[name] = value
+        rows.append(result)
+
+    if not rows:
+        return pd.DataFrame()
+    return (pd.concat(rows, ignore_index=True)
+            .sort_values(['cluster', 'start']).reset_index(drop=True))
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+TIME-STACKED SATELLITE CUBE AND CLOUD-TOP PRODUCTS
+
+- create_cube()
+- append_scene()
+- build_cube()
+- open_cube()
+- get_cooling_rate()
+- get_cluster_min_tb()
+- get_overshooting_mask()
+
+Remapped scenes (e.g. band 13 brightness temperature) are written one at a
+time into a NetCDF cube (time, lat, lon), chunked by time, so new scenes are
+appended without reading the ones already there. Products are computed over
+the whole cube at once, e.g.:
+
+    catalog = update_catalog('../Data/SATELLITE/GOES16/level_2/2017/*')
+    scenes = find_scenes(catalog, pd.date_range('2017-03-14 12:00',
+                                                '2017-03-14 23:45',
+                                                freq='15min'), band=13)
+    build_cube('tb13_20170314.nc', scenes['path'].unique(), extent_spbr)
+    cube = open_cube('tb13_20170314.nc')
+    rate = get_cooling_rate(cube)
+    min_tb = get_cluster_min_tb(cube, clusters_box)
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+import scipy.ndimage as ndimage
+from netCDF4 import Dataset, date2num
+
+from remap import get_remap_coordinates
+from catalog_functions import parse_goes_filename
+from sat_functions import read_define_bounds_netcdf
+
+TIME_UNITS = 'seconds since 1970-01-01 00:00:00'
+
+
+def create_cube(cube_file, extent, resolution=2, band=13,
+                chunk_size=512):
+    """
+    Create an empty cube, with the regular grid of the remapped scenes.
+
+    Parameters
+    ----------
+    cube_file: NetCDF file
+    extent: [min lon, min lat, max lon, max lat]
+    resolution: grid resolution in km (as in read_define_bounds_netcdf())
+    band: band of the scenes
+    chunk_size: chunk size in lat and lon (chunks have one time)
+    """
+
+    lon, lat = get_remap_coordinates(extent, resolution)
+
+    nc = Dataset(cube_file, 'w')
+    nc.createDimension('time', None)
+    nc.createDimension('lat', lat.size)
+    nc.createDimension('lon', lon.size)
+    nc.createVariable('time', 'f8', ('time',))
+    nc.variables['time'].units = TIME_UNITS
+    nc.createVariable('lat', 'f4', ('lat',))[:] = lat
+    nc.variables['lat'].units = 'degrees_north'
+    nc.createVariable('lon', 'f4', ('lon',))[:] = lon
+    nc.variables['lon'].units = 'degrees_east'
+    tb = nc.createVariable(
+        'tb', 'f4', ('time', 'lat', 'lon'), zlib=True, fill_value=np.nan,
+        chunksizes=(1, min(lat.size, chunk_size), min(lon.size, chunk_size)))
+    tb.units = 'K'
+    tb.long_name = 'Brightness Temperature'
+    nc.band = band
+    nc.extent = list(extent)
+    nc.resolution = resolution
+    nc.close()
+
+
+def append_scene(cube_file, filename, cache_path=None):
+    """
+    Remap a scene and append it to the cube (scenes already in the cube or
+    of other bands are skipped).
+
+    Parameters
+    ----------
+    cube_file: NetCDF file (see create_cube())
+    filename: GOES-16 file
+    cache_path: folder of the remap lookup tables (see remap.py)
+
+    Returns
+    -------
+    appended: True if the scene was appended
+    """
+
+    info = parse_goes_filename(filename)
+    nc = Dataset(cube_file, 'a')
+    try:
+        if info['band'] != nc.band:
+            print(filename, 'skipped (band', info['band'], ')')
+            return False
+        time = date2num(info['start'], TIME_UNITS)
+        times = nc.variables['time'][:]
+        # Same scene within 1 s (scans are minutes apart)
+        if np.any(np.isclose(times, time, rtol=0, atol=1)):
+            print(filename, 'skipped (already in the cube)')
+            return False
+
+        data, _ = read_define_bounds_netcdf(
+            filename, 0.0, list(nc.extent), cache_path=cache_path,
+            resolution=float(nc.resolution))
+        n = times.size
+        nc.variables['tb'][n] = np.ma.filled(data.astype('f4'), np.nan)
+        nc.variables['time'][n] = time
+    finally:
+        nc.close()
+    return True
+
+
+def build_cube(cube_file, filenames, extent, resolution=2, band=13,
+               cache_path=None):
+    """
+    Create (if needed) a cube and append scenes to it, one at a time.
+
+    Parameters
+    ----------
+    cube_file: NetCDF file
+    filenames: GOES-16 files, e.g. from find_scenes() (catalog_functions.py)
+    extent, resolution, band: see create_cube()
+    cache_path: folder of the remap lookup tables (see remap.py)
+
+    Returns
+    -------
+    n: number of appended scenes
+    """
+
+    if not os.path.isfile(cube_file):
+        create_cube(cube_file, extent, resolution, band)
+    # In time order, so the cube time axis is sorted
+    filenames = sorted(filenames,
+                       key=lambda f: parse_goes_filename(f)['start'])
+    return sum(append_scene(cube_file, filename, cache_path)
+               for filename in filenames)
+
+
+def open_cube(cube_file):
+    """
+    Open a cube as an xarray Dataset, sorted by time.
+    """
+
+    return xr.open_dataset(cube_file).sortby('time')
+
+
+def get_cooling_rate(cube, interval='15min', max_gap='20min'):
+    """
+    Cloud-top cooling rate: brightness temperature change between
+    consecutive scenes, per interval (negative values are cooling).
+
+    Parameters
+    ----------
+    cube: cube (see open_cube())
+    interval: time interval of the rate (e.g. K per 15 min)
+    max_gap: maximum time between scenes. Longer gaps are NaN
+
+    Returns
+    -------
+    rate: xarray DataArray (time, lat, lon), at the time of the later scene
+    """
+
+    dt = cube['time'].diff('time') / pd.Timedelta(interval).to_timedelta64()
+    rate = cube['tb'].diff('time') / dt
+    gap = cube['time'].diff('time') > pd.Timedelta(max_gap).to_timedelta64()
+    rate = rate.where(~gap)
+    rate.name = 'cooling_rate'
+    rate.attrs['units'] = 'K / ' + interval
+    return rate
+
+
+def get_cluster_min_tb(cube, clusters, tolerance='10min'):
+    """
+    Minimum brightness temperature inside the box of each cluster, in the
+    scene closest to the cluster time.
+
+    Parameters
+    ----------
+    cube: cube (see open_cube())
+    clusters: pandas DataFrame with date, min_lon, max_lon, min_lat and
+        max_lat of each cluster (as the clusters_*.csv ForTraCC boxes)
+    tolerance: maximum time between cluster and scene
+
+    Returns
+    -------
+    clusters: copy of clusters with the scene time ('scene_time') and the
+        minimum brightness temperature ('min_tb', NaN without scene)
+    """
+
+    clusters = clusters.copy()
+    dates = pd.to_datetime(clusters['date'])
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_convert(None)
+    scenes = cube['time'].to_index()
+    itime = scenes.get_indexer(dates, method='nearest',
+                               tolerance=pd.Timedelta(tolerance))
+
+    # Grid indexes of the boxes (latitudes from north to south)
+    lon = cube['lon'].values
+    lat = cube['lat'].values
+    x0 = np.searchsorted(lon, clusters['min_lon'].values, side='left')
+    x1 = np.searchsorted(lon, clusters['max_lon'].values, side='right')
+    y0 = lat.size - np.searchsorted(lat[::-1], clusters['max_lat'].values,
+                                    side='right')
+    y1 = lat.size - np.searchsorted(lat[::-1], clusters['min_lat'].values,
+                                    side='left')
+
+    tb = cube['tb']
+    min_tb = np.full(len(clusters), np.nan)
+    for i, (t, ya, yb, xa, xb) in enumerate(zip(itime, y0, y1, x0, x1)):
+        if t >= 0 and yb > ya and xb > xa:
+            min_tb[i] = np.nanmin(tb[t, ya:yb, xa:xb].values)
+    clusters['scene_time'] = pd.Series(
+        scenes[np.maximum(itime, 0)], index=clusters.index).where(itime >= 0)
+    clusters['min_tb'] = min_tb
+    return clusters
+
+
+def get_overshooting_mask(cube, max_tb=215.0, min_difference=6.5,
+                          anvil_size=7, window=3):
+    """
+    Overshooting top candidates: pixels that are local minima of brightness
+    temperature, colder than max_tb and at least min_difference colder than
+    the mean of the surrounding anvil (adapted from Bedka et al. 2010).
+
+    Parameters
+    ----------
+    cube: cube (see open_cube())
+    max_tb: maximum brightness temperature of the candidates in K
+    min_difference: minimum difference to the anvil mean in K
+    anvil_size: size (in pixels) of the box of the anvil mean
+    window: size (in pixels) of the box of the local minimum
+
+    Returns
+    -------
+    mask: boolean xarray DataArray (time, lat, lon)
+    """
+
+    tb = cube['tb'].values
+    valid = np.isfinite(tb)
+    filled = np.where(valid, tb, np.nanmax(tb))
+    # Filters applied to each scene (size 1 in time)
+    local_min = ndimage.minimum_filter(filled, size=(1, window, window))
+    anvil = (ndimage.uniform_filter(np.where(valid, tb, 0.0),
+                                    size=(1, anvil_size, anvil_size)) /
+             np.maximum(ndimage.uniform_filter(
+                 valid.astype('f4'), size=(1, anvil_size, anvil_size)),
+                 1e-6))
+    mask = (valid & (tb <= max_tb) & (tb == local_min) &
+            (anvil - tb >= min_difference))
+    return xr.DataArray(mask, coords=cube['tb'].coords, dims=cube['tb'].dims,
+                        name='overshooting_top')
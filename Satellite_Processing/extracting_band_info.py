@@ -4,7 +4,13 @@
 """
 """
 
-from cpt_convert import loadCPT
+import os
+import sys
+
+# Shared colortable registry (General_Processing/colormap_functions.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'General_Processing'))
+from colormap_functions import get_colormap
 
 
 def extract_band_info(Band):
@@ -13,7 +19,7 @@ def extract_band_info(Band):
     - Central wavelength (Center_WL)
     - Variable units (Unit)
     - Conversion (K to Celsius) (Conversion)
-    - Colortable (CPT)
+    - Colormap (CPT), read once per process
     - Min and max values in imshow (Min, Max)
     according to the selected band.
     '''
@@ -61,16 +67,16 @@ def extract_band_info(Band):
         Conversion = -273.15
 
     if int(Band) <= 6:
-        CPT = loadCPT('../Data/GENERAL/colortables/Square Root Visible Enhancement.cpt')
+        CPT = get_colormap('Square Root Visible Enhancement')
         Min, Max = 0, 1
     elif int(Band) == 7:
-        CPT = loadCPT('../Data/GENERAL/colortables/SVGAIR2_TEMP.cpt')
+        CPT = get_colormap('SVGAIR2_TEMP')
         Min, Max = -112.15, 56.85
     elif int(Band) > 7 and int(Band) < 11:
-        CPT = loadCPT('../Data/GENERAL/colortables/SVGAWVX_TEMP.cpt')
+        CPT = get_colormap('SVGAWVX_TEMP')
         Min, Max = -112.15, 56.85
     elif int(Band) > 10:
-        CPT = loadCPT('../Data/GENERAL/colortables/IR4AVHRR6.cpt')
+        CPT = get_colormap('IR4AVHRR6')
         Min, Max = -103, 84
 
     return Center_WL, Unit, Conversion, CPT, Min, Max
@@ -1,5 +1,11 @@
 #!/usr/bin/env python
-from urllib import request
+import os
+import sys
+
+# Shared download manager (General_Processing/download_functions.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'General_Processing'))
+from download_functions import download_files
 
 ################################################################################
 #
@@ -96,5 +102,10 @@ FILENAMES=[
 "GOES13_d20161225_t234518_b04"
 ]
 
-for i, command in enumerate(COMMANDS):
-    request.urlretrieve("{0}&{1}".format(HTTP, command), FILENAMES[i])
+# Parallel downloads (resumed, retried and skipped if already in the
+# manifest)
+JOBS = [("{0}&{1}".format(HTTP, command), FILENAMES[i])
+        for i, command in enumerate(COMMANDS)]
+failed = download_files(JOBS, nworkers=4, manifest="GOES13_manifest.json")
+if failed:
+    sys.exit(1)
@@ -5,14 +5,25 @@
 https://geonetcast.wordpress.com/2017/04/27/geonetclass-manipulating-goes-16-data-with-python-part-i/
 """
 
-from glob import glob
+import os
+import sys
 
 import sat_functions as sf
+from catalog_functions import update_catalog
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'General_Processing'))
+from render_functions import RenderQueue
 
 # Filepaths and custom variables
 shapefile_path = "../Data/GENERAL/shapefiles/"
-filenames = glob("../Data/SATELLITE/GOES16/level_2/2017/*")
+# - Only new files are added to the catalog (see catalog_functions.py)
+catalog = update_catalog("../Data/SATELLITE/GOES16/level_2/2017/*",
+                         "../Data/SATELLITE/GOES16/catalog_2017.csv")
+filenames = catalog['path'].tolist()
 save_path = "figures/"
+remap_cache_path = "../Data/SATELLITE/GOES16/remap_cache/"  # lookup tables
+nprocs = None  # None uses all CPUs, 0 plots one figure after the other
 
 # Custom visualization extent and grid spacing
 # - South America
@@ -23,20 +34,15 @@ gridspc_sa = 10.0
 extent_spbr = [-54., -27., -43., -18.]  # [min lon, min lat, max lon, max lat]
 gridspc_spbr = 2.0
 
-for filename in filenames:
-    # South America
-    (unit, conversion, cpt, minvalue, maxvalue, fig_title,
-        fig_name) = sf.get_info_file(filename, fig_type='SA')
-    sat_data, extent = sf.read_define_bounds_netcdf(filename, conversion,
-                                                    extent_sa)
-    sf.plot_save_figure(sat_data, extent, shapefile_path, gridspc_sa, cpt,
-                        minvalue, maxvalue, fig_title, unit,
-                        save_path + fig_name)
-    # SP - Brazil
-    (unit, conversion, cpt, minvalue, maxvalue, fig_title,
-        fig_name) = sf.get_info_file(filename, fig_type='SP-BR')
-    sat_data, extent = sf.read_define_bounds_netcdf(filename, conversion,
-                                                    extent_spbr)
-    sf.plot_save_figure(sat_data, extent, shapefile_path, gridspc_spbr, cpt,
-                        minvalue, maxvalue, fig_title, unit,
-                        save_path + fig_name)
+# Figures of all files are rendered in parallel
+extents = [extent_sa, extent_spbr]
+with RenderQueue(nprocs=nprocs, setup=sf.init_render_worker,
+                 setup_args=(shapefile_path, extents)) as queue:
+    for filename in filenames:
+        # South America
+        queue.submit(sf.process_save_figure, filename, 'SA', extent_sa,
+                     shapefile_path, gridspc_sa, save_path, remap_cache_path)
+        # SP - Brazil
+        queue.submit(sf.process_save_figure, filename, 'SP-BR', extent_spbr,
+                     shapefile_path, gridspc_spbr, save_path,
+                     remap_cache_path)
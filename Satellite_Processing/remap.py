@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import os
+import zipfile
+import hashlib
 from netCDF4 import Dataset
 import numpy as np
 from osgeo import osr
@@ -11,11 +14,16 @@ import time as t
 KM_PER_DEGREE = 111.32
 
 # GOES-16 Spatial Reference System
-sourcePrj = osr.SpatialReference()
 # Non-Operational
-sourcePrj.ImportFromProj4('+proj=geos +h=35786023.0 +a=6378137.0 +b=6356752.31414 +f=0.00335281068119356027489803406172 +lat_0=0.0 +lon_0=-89.5 +sweep=x +no_defs')
+SOURCE_PROJ4 = '+proj=geos +h=35786023.0 +a=6378137.0 +b=6356752.31414 +f=0.00335281068119356027489803406172 +lat_0=0.0 +lon_0=-89.5 +sweep=x +no_defs'
 # Operational
-# sourcePrj.ImportFromProj4('+proj=geos +h=35786000 +a=6378140 +b=6356750 +lon_0=-75 +sweep=x')
+# SOURCE_PROJ4 = '+proj=geos +h=35786000 +a=6378140 +b=6356750 +lon_0=-75 +sweep=x'
+sourcePrj = osr.SpatialReference()
+sourcePrj.ImportFromProj4(SOURCE_PROJ4)
+
+# Lookup tables (target -> source pixel) and their windows, kept in memory
+_REMAP_INDEXES = {}
+_WINDOW_INDEXES = {}
 
 # Lat/lon WSG84 Spatial Reference System
 targetPrj = osr.SpatialReference()
@@ -105,3 +113,252 @@ def remap(path, extent, resolution, x1, y1, x2, y2):
     grid.GetRasterBand(1).WriteArray(array)
 
     return grid
+
+
+def geos_forward(lon, lat, proj4=SOURCE_PROJ4):
+    """
+    Geostationary projection (sweep x) of lon, lat points, as in the GOES-R
+    Product User Guide (section 4.2.8)
+
+    Parameters
+    ----------
+    lon, lat: arrays of longitudes and latitudes in degrees
+    proj4: geostationary projection (h, a, b and lon_0 are used)
+
+    Returns
+    -------
+    x, y: projection coordinates in meters (scan angles * h)
+    visible: False where points are not seen by the satellite
+    """
+
+    params = dict(p.lstrip('+').split('=') for p in proj4.split() if '=' in p)
+    h, a, b = float(params['h']), float(params['a']), float(params['b'])
+    lon_0 = np.radians(float(params['lon_0']))
+    H = h + a
+
+    lam = np.radians(lon)
+    phi_c = np.arctan((b ** 2 / a ** 2) * np.tan(np.radians(lat)))
+    r_c = b / np.sqrt(1 - (1 - b ** 2 / a ** 2) * np.cos(phi_c) ** 2)
+    s_x = H - r_c * np.cos(phi_c) * np.cos(lam - lon_0)
+    s_y = -r_c * np.cos(phi_c) * np.sin(lam - lon_0)
+    s_z = r_c * np.sin(phi_c)
+
+    visible = H * (H - s_x) >= s_y ** 2 + (a ** 2 / b ** 2) * s_z ** 2
+    x = np.arcsin(-s_y / np.sqrt(s_x ** 2 + s_y ** 2 + s_z ** 2))
+    y = np.arctan(s_z / s_x)
+    return x * h, y * h, visible
+
+def geos_inverse(x, y, proj4=SOURCE_PROJ4):
+    """
+    Longitudes and latitudes of geostationary projection coordinates (sweep
+    x), as in the GOES-R Product User Guide (section 4.2.8)
+
+    Parameters
+    ----------
+    x, y: arrays of projection coordinates in meters (scan angles * h)
+    proj4: geostationary projection (h, a, b and lon_0 are used)
+
+    Returns
+    -------
+    lon, lat: arrays in degrees, NaN off the Earth disk
+    """
+
+    params = dict(p.lstrip('+').split('=') for p in proj4.split() if '=' in p)
+    h, a, b = float(params['h']), float(params['a']), float(params['b'])
+    lon_0 = np.radians(float(params['lon_0']))
+    H = h + a
+    x = np.asarray(x, dtype='f8') / h
+    y = np.asarray(y, dtype='f8') / h
+
+    qa = (np.sin(x) ** 2 + np.cos(x) ** 2 *
+          (np.cos(y) ** 2 + (a ** 2 / b ** 2) * np.sin(y) ** 2))
+    qb = -2 * H * np.cos(x) * np.cos(y)
+    qc = H ** 2 - a ** 2
+    discriminant = qb ** 2 - 4 * qa * qc
+    with np.errstate(invalid='ignore'):
+        r_s = (-qb - np.sqrt(discriminant)) / (2 * qa)
+    s_x = r_s * np.cos(x) * np.cos(y)
+    s_y = -r_s * np.sin(x)
+    s_z = r_s * np.cos(x) * np.sin(y)
+
+    lat = np.degrees(np.arctan((a ** 2 / b ** 2) *
+                               (s_z / np.sqrt((H - s_x) ** 2 + s_y ** 2))))
+    lon = np.degrees(lon_0 - np.arctan(s_y / (H - s_x)))
+    off_disk = discriminant < 0
+    return np.where(off_disk, np.nan, lon), np.where(off_disk, np.nan, lat)
+
+def get_remap_coordinates(extent, resolution):
+    """
+    Longitudes and latitudes of the pixel centers of the regular grid of
+    remap() (latitudes from north to south, as the image rows)
+
+    Returns
+    -------
+    lon, lat: 1D arrays in degrees
+    """
+
+    sizex = int(((extent[2] - extent[0]) * KM_PER_DEGREE) / resolution)
+    sizey = int(((extent[3] - extent[1]) * KM_PER_DEGREE) / resolution)
+    geot = getGeoT(extent, sizey, sizex)
+    lon = geot[0] + (np.arange(sizex) + 0.5) * geot[1]
+    lat = geot[3] + (np.arange(sizey) + 0.5) * geot[5]
+    return lon, lat
+
+def get_remap_index(extent, resolution, x1, y1, x2, y2, nlines, ncols,
+                    cache_path=None):
+    """
+    Lookup table of the regular lat/lon grid of remap(): index of the
+    source (GOES-16 fixed grid) pixel nearest to each target pixel. It only
+    depends on projection, image bounds, image size, extent and resolution,
+    so it is computed once and saved as a .npz file in cache_path
+
+    Parameters
+    ----------
+    extent: [min lon, min lat, max lon, max lat]
+    resolution: target resolution in km
+    x1, y1, x2, y2: image bounds in meters
+    nlines, ncols: image size
+    cache_path: folder of the cache files. None keeps them only in memory
+
+    Returns
+    -------
+    index: 2D array (target grid) of flat indexes of the source image,
+        -1 outside the image or the Earth disk
+    """
+
+    key = hashlib.sha1(str((
+        SOURCE_PROJ4, [round(float(v), 3) for v in (x1, y1, x2, y2)],
+        int(nlines), int(ncols), [float(e) for e in extent],
+        float(resolution))).encode()).hexdigest()[:16]
+    if key in _REMAP_INDEXES:
+        return _REMAP_INDEXES[key]
+
+    filename = None
+    if cache_path is not None:
+        filename = os.path.join(cache_path, 'remap_' + key + '.npz')
+        if os.path.isfile(filename):
+            try:
+                with np.load(filename) as cached:
+                    _REMAP_INDEXES[key] = cached['index']
+                return _REMAP_INDEXES[key]
+            except (OSError, ValueError, KeyError, EOFError,
+                    zipfile.BadZipFile):
+                # Unreadable cache file: computed (and written) again
+                pass
+
+    start = t.time()
+
+    # Target pixel centers (same grid as remap())
+    lon, lat = np.meshgrid(*get_remap_coordinates(extent, resolution))
+
+    # Source pixels containing them
+    x, y, visible = geos_forward(lon, lat)
+    source_geot = getGeoT([x1, y1, x2, y2], nlines, ncols)
+    col = np.floor((x - source_geot[0]) / source_geot[1]).astype(np.int64)
+    row = np.floor((y - source_geot[3]) / source_geot[5]).astype(np.int64)
+    inside = (visible & (col >= 0) & (col < ncols) & (row >= 0) &
+              (row < nlines))
+    index = np.where(inside, row * ncols + col, -1).astype(np.int32)
+
+    print('- remap lookup table: ' + str(t.time() - start) + ' seconds')
+
+    if filename is not None:
+        # Written under another name first, since parallel processes may
+        # compute the same table
+        os.makedirs(cache_path, exist_ok=True)
+        temporary = filename[:-4] + '_' + str(os.getpid()) + '.npz'
+        np.savez(temporary, index=index)
+        os.replace(temporary, filename)
+    _REMAP_INDEXES[key] = index
+    return index
+
+def get_window_index(extent, resolution, x1, y1, x2, y2, nlines, ncols,
+                     cache_path=None):
+    """
+    Smallest window (rows, columns) of the source image covering the target
+    grid, and the lookup table of get_remap_index() with indexes of the
+    window instead of the whole image
+
+    Returns
+    -------
+    window: (row slice, column slice) of the source image
+    index: 2D array (target grid) of flat indexes of the window, -1 outside
+        the image or the Earth disk
+    """
+
+    index = get_remap_index(extent, resolution, x1, y1, x2, y2, nlines,
+                            ncols, cache_path)
+    key = id(index)
+    if key not in _WINDOW_INDEXES:
+        valid = index >= 0
+        if not valid.any():
+            window = (slice(0, 1), slice(0, 1))
+            window_index = index
+        else:
+            row, col = np.divmod(index[valid].astype(np.int64), ncols)
+            window = (slice(row.min(), row.max() + 1),
+                      slice(col.min(), col.max() + 1))
+            width = window[1].stop - window[1].start
+            window_index = np.full(index.shape, -1, dtype=np.int32)
+            window_index[valid] = ((row - window[0].start) * width +
+                                   col - window[1].start)
+        _WINDOW_INDEXES[key] = (index, window, window_index)
+    return _WINDOW_INDEXES[key][1:]
+
+def remap_window(cmi, extent, resolution, x1, y1, x2, y2, cache_path=None):
+    """
+    Same regridding as remap() (nearest neighbour), but reading only the
+    window of the image covering the extent and gathering its pixels with
+    the lookup table (see get_remap_index() and get_window_index()), instead
+    of reading the whole image and reprojecting it with GDAL
+
+    Parameters
+    ----------
+    cmi: CMI variable of an open NetCDF file (netCDF4)
+    extent, resolution, x1, y1, x2, y2, cache_path: see get_remap_index()
+
+    Returns
+    -------
+    array: masked array (float32) of the regridded data with scale and
+        offset applied, masked outside the Earth disk and at fill values
+    """
+
+    window, index = get_window_index(extent, resolution, x1, y1, x2, y2,
+                                     cmi.shape[0], cmi.shape[1], cache_path)
+
+    start = t.time()
+
+    # Raw values of the window only (scale and offset applied after the
+    # gather, to the target pixels)
+    cmi.set_auto_maskandscale(False)
+    raw = np.asarray(cmi[window])
+    scale, offset = cmi.scale_factor, cmi.add_offset
+    fill = getattr(cmi, '_FillValue', -1)
+
+    data = raw.ravel()[np.maximum(index, 0)]
+    array = np.ma.masked_where((index < 0) | (data == fill),
+                               data.astype(np.float32) * scale + offset)
+
+    print('- finished! Time: ' + str(t.time() - start) + ' seconds (' +
+          str(raw.shape[0]) + ' x ' + str(raw.shape[1]) + ' window)')
+
+    return array
+
+def remap_lut(path, extent, resolution, x1, y1, x2, y2, cache_path=None):
+    """
+    remap_window() of a NetCDF file
+
+    Returns
+    -------
+    array: masked array (float32) of the regridded data with scale and
+        offset applied, masked outside the Earth disk and at fill values
+    """
+
+    print('Remapping ' + path)
+
+    nc = Dataset(path, mode='r')
+    array = remap_window(nc.variables['CMI'], extent, resolution, x1, y1, x2,
+                         y2, cache_path)
+    nc.close()
+
+    return array
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+GOES-16 RGB COMPOSITES
+
+- get_composite_bands()
+- find_band_files()
+- read_bands()
+- make_composite()
+- make_sandwich()
+- plot_save_rgb()
+- process_composites()
+
+RGB composites (Airmass, Day Convection, Sandwich) are built from the band
+files of a time (found in the scene catalog, see catalog_functions.py).
+Each band is read and remapped once with the cached lookup tables (see
+remap.py), even when used by several composites, and the composites are
+computed in float32 with vectorized clip/gamma operations, e.g.:
+
+    composites = process_composites(catalog, '2017-03-14 18:00',
+                                    ['Airmass', 'Day Convection'],
+                                    extent_spbr, 'figures/', shapefile_path,
+                                    gridspc_spbr)
+
+Recipes from the CIRA/RAMMB RGB Quick Guides.
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from mpl_toolkits.basemap import Basemap
+
+from catalog_functions import find_scenes
+from sat_functions import read_define_bounds_netcdf
+# General_Processing is added to the path by sat_functions
+from shapefile_functions import get_shape_collection
+
+# Components (red, green, blue) of each composite: bands and weights (sum of
+# weights * band), range (values mapped to 0 and 1) and gamma
+RGB_RECIPES = {
+    'Airmass': [
+        {'bands': [8, 10], 'weights': [1, -1], 'range': (-26.2, 0.6),
+         'gamma': 1.0},
+        {'bands': [12, 13], 'weights': [1, -1], 'range': (-43.2, 6.7),
+         'gamma': 1.0},
+        {'bands': [8], 'weights': [1], 'range': (243.9, 208.5),
+         'gamma': 1.0},
+    ],
+    'Day Convection': [
+        {'bands': [8, 10], 'weights': [1, -1], 'range': (-35.0, 5.0),
+         'gamma': 1.0},
+        {'bands': [7, 13], 'weights': [1, -1], 'range': (-5.0, 60.0),
+         'gamma': 0.5},
+        {'bands': [5, 2], 'weights': [1, -1], 'range': (-0.75, 0.25),
+         'gamma': 1.0},
+    ],
+}
+# Sandwich: visible (band 3) times colored infrared (band 13)
+SANDWICH_BANDS = [3, 13]
+
+
+def get_composite_bands(names):
+    """
+    Bands needed by a list of composites.
+    """
+
+    bands = set()
+    for name in names:
+        if name == 'Sandwich':
+            bands.update(SANDWICH_BANDS)
+        else:
+            for component in RGB_RECIPES[name]:
+                bands.update(component['bands'])
+    return sorted(bands)
+
+
+def find_band_files(catalog, time, bands, tolerance='5min'):
+    """
+    Find the file of each band closest to a time.
+
+    Parameters
+    ----------
+    catalog: scene catalog (see catalog_functions.py)
+    time: time of the composite
+    bands: list of bands
+    tolerance: maximum time between scene and time
+
+    Returns
+    -------
+    files: dictionary of {band: file}. Bands without files are missing
+    """
+
+    scenes = find_scenes(catalog, [time], band=bands, tolerance=tolerance)
+    scenes = scenes.loc[scenes['dt'].abs().sort_values().index]
+    scenes = scenes.drop_duplicates('band')
+    return dict(zip(scenes['band'], scenes['path']))
+
+
+def read_bands(files, extent, cache_path=None):
+    """
+    Read and remap each band once (see read_define_bounds_netcdf()).
+
+    Parameters
+    ----------
+    files: dictionary of {band: file}
+    extent: [min lon, min lat, max lon, max lat]
+    cache_path: folder of the remap lookup tables (see remap.py)
+
+    Returns
+    -------
+    data: dictionary of {band: float32 array}, NaN where missing
+        (reflectance for bands 1-6, brightness temperature in K for the
+        others)
+    """
+
+    data = {}
+    for band, filename in files.items():
+        array, _ = read_define_bounds_netcdf(filename, 0.0, extent,
+                                             cache_path=cache_path)
+        data[band] = np.ma.filled(array.astype(np.float32), np.nan)
+    return data
+
+
+def _scale(values, value_range, gamma):
+    """
+    Map values from value_range to 0-1 (clipped) and apply gamma.
+    """
+
+    low, high = value_range
+    scaled = np.clip((values - np.float32(low)) / np.float32(high - low),
+                     0, 1)
+    if gamma != 1.0:
+        scaled = scaled ** np.float32(1.0 / gamma)
+    return scaled
+
+
+def make_composite(name, data):
+    """
+    Build an RGB composite.
+
+    Parameters
+    ----------
+    name: composite name (see RGB_RECIPES)
+    data: dictionary of {band: array} (see read_bands())
+
+    Returns
+    -------
+    rgb: float32 array (lines, columns, 3), from 0 to 1, NaN where any band
+        is missing
+    """
+
+    components = []
+    for component in RGB_RECIPES[name]:
+        values = np.zeros_like(data[component['bands'][0]])
+        for band, weight in zip(component['bands'], component['weights']):
+            values += np.float32(weight) * data[band]
+        components.append(_scale(values, component['range'],
+                                 component['gamma']))
+    return np.dstack(components)
+
+
+def make_sandwich(data, ir_range=(200.0, 240.0), cmap='jet_r',
+                  vis_gamma=1.0):
+    """
+    Build a Sandwich composite: visible reflectance (band 3) times the
+    infrared (band 13) colored in ir_range. Warmer pixels are only the
+    visible (gray).
+
+    Parameters
+    ----------
+    data: dictionary of {band: array} (see read_bands())
+    ir_range: brightness temperatures (K) colored from cold to warm
+    cmap: colormap of the infrared
+    vis_gamma: gamma of the visible
+
+    Returns
+    -------
+    rgb: float32 array (lines, columns, 3), from 0 to 1
+    """
+
+    vis = _scale(data[3], (0.0, 1.0), vis_gamma)
+    ir = data[13]
+    colors = plt.get_cmap(cmap)(
+        np.nan_to_num(_scale(ir, (ir_range[1], ir_range[0]), 1.0))
+    )[..., :3].astype(np.float32)
+    warm = ~(ir <= ir_range[1])
+    colors[warm] = 1.0
+    return colors * vis[..., np.newaxis]
+
+
+def plot_save_rgb(rgb, extent, shapefile, grid_spacing, title, name):
+    """
+    Plot and save an RGB composite, as plot_save_figure() (missing pixels
+    are transparent).
+    """
+
+    fig = plt.figure(figsize=(5, 6))
+    fig.set_facecolor('w')
+    ax = fig.add_subplot(111)
+
+    bmap = Basemap(llcrnrlon=extent[0], llcrnrlat=extent[1],
+                   urcrnrlon=extent[2], urcrnrlat=extent[3], epsg=4326)
+
+    shape_extent = [extent[0], extent[2], extent[1], extent[3]]
+    ax.add_collection(get_shape_collection(
+        shapefile + 'ne_10m_admin_0_countries', extent=shape_extent,
+        projection=bmap, linewidth=0.5, edgecolor='darkslategray'
+    ), autolim=False)
+    ax.add_collection(get_shape_collection(
+        shapefile + 'estadosl_2007', extent=shape_extent, projection=bmap,
+        linewidth=0.3, edgecolor='darkslategray'
+    ), autolim=False)
+    bmap.drawparallels(np.arange(-90.0, 90.0, grid_spacing), linewidth=0.25,
+                       color='white', labels=[True, False, False, True])
+    bmap.drawmeridians(np.arange(0.0, 360.0, grid_spacing), linewidth=0.25,
+                       color='white', labels=[True, False, False, True])
+
+    alpha = np.all(np.isfinite(rgb), axis=-1).astype(np.float32)
+    bmap.imshow(np.dstack([np.nan_to_num(rgb), alpha]), origin='upper')
+
+    plt.title(title, weight='bold', stretch='condensed', size='large')
+
+    print('Saving figure in ' + name)
+    plt.savefig(name, dpi=300, transparent=True, bbox_inches='tight')
+    plt.close()
+
+
+def process_composites(catalog, time, names, extent, save_path=None,
+                       shapefile=None, grid_spacing=None, fig_type='',
+                       tolerance='5min', cache_path=None):
+    """
+    Build (and save as PNG) several composites of a time, reading each band
+    only once.
+
+    Parameters
+    ----------
+    catalog: scene catalog (see catalog_functions.py)
+    time: time of the composites
+    names: composite names (see RGB_RECIPES, and 'Sandwich')
+    extent: [min lon, min lat, max lon, max lat]
+    save_path: path to save the figures. None only returns the composites
+    shapefile, grid_spacing, fig_type: see process_save_figure()
+    tolerance: maximum time between scenes and time
+    cache_path: folder of the remap lookup tables (see remap.py)
+
+    Returns
+    -------
+    composites: dictionary of {name: rgb array}. Composites with missing
+        bands are skipped
+    """
+
+    bands = get_composite_bands(names)
+    files = find_band_files(catalog, time, bands, tolerance)
+    data = read_bands(files, extent, cache_path)
+
+    composites = {}
+    for name in names:
+        needed = (SANDWICH_BANDS if name == 'Sandwich'
+                  else get_composite_bands([name]))
+        missing = [band for band in needed if band not in data]
+        if missing:
+            print(name, 'skipped, missing bands', missing)
+            continue
+        if name == 'Sandwich':
+            composites[name] = make_sandwich(data)
+        else:
+            composites[name] = make_composite(name, data)
+
+        if save_path is not None:
+            timestamp = pd.to_datetime(time)
+            title = ('GOES-16 RGB ' + name + '\n' +
+                     datetime.strftime(timestamp, '%Y-%m-%d %H%M') + ' UTC')
+            filename = (save_path + 'GOES16_RGB_' + name.replace(' ', '') +
+                        '_' + fig_type + '_' +
+                        datetime.strftime(timestamp, '%Y%m%d%H%M') + '.png')
+            plot_save_rgb(composites[name], extent, shapefile, grid_spacing,
+                          title, filename)
+    return composites
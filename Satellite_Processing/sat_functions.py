@@ -5,15 +5,23 @@
 https://geonetcast.wordpress.com/2017/04/27/geonetclass-manipulating-goes-16-data-with-python-part-i/
 """
 
+import os
+import sys
 import numpy as np
 from datetime import datetime
 import matplotlib.pyplot as plt
-from matplotlib.colors import LinearSegmentedColormap
 from mpl_toolkits.basemap import Basemap
 from netCDF4 import Dataset
 
-from remap import remap
+from remap import remap_window
 from extracting_band_info import extract_band_info
+from catalog_functions import parse_goes_filename
+
+# Shared shapefile geometry cache and colortables (General_Processing)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'General_Processing'))
+from shapefile_functions import get_shape_collection, get_shape_segments
+from colormap_functions import COLORTABLES, get_colormap
 
 
 def get_info_file(filename, fig_type):
@@ -24,7 +32,7 @@ def get_info_file(filename, fig_type):
     band_unit, unit of the variable to be shown on the plot
     band_conversion, value to be added to convert from Kelvin to Celsius, if
         necessary
-    band_cpt, color palette of the variable for the plot
+    band_cpt, colormap of the variable for the plot
     band_minvalue, minimum value of the variable for the plot
     band_maxvalue, maximum value of the variable for the plot
     title, string to be used on the plot title
@@ -33,14 +41,13 @@ def get_info_file(filename, fig_type):
 
     print('Getting info from ' + filename)
 
-    band = (filename[filename.find('M3C') + 3:filename.find('_G16')])
+    info = parse_goes_filename(filename)
+    band = '%02d' % info['band']
     (band_cw, band_unit, band_conversion, band_cpt, band_minvalue,
         band_maxvalue) = extract_band_info(band)
 
-    start_timestamp = (filename[filename.find('_s') + 2:filename.find('_e')])
-    start_timestamp = datetime.strptime(start_timestamp[:13], '%Y%j%H%M%S')
-    end_timestamp = (filename[filename.find('_e') + 2:filename.find('_c')])
-    end_timestamp = datetime.strptime(end_timestamp[:13], '%Y%j%H%M%S')
+    start_timestamp = info['start']
+    end_timestamp = info['end']
     # title = ('GOES-16 ABI Band ' + band + ' ' + band_cw +
     #          '\n Scan from ' +
     #          datetime.strftime(start_timestamp, '%Y-%m-%d %H%M%S') + ' to ' +
@@ -59,14 +66,18 @@ def get_info_file(filename, fig_type):
             band_maxvalue, title, name)
 
 
-def read_define_bounds_netcdf(file, band_conversion, extent):
+def read_define_bounds_netcdf(file, band_conversion, extent,
+                              cache_path=None, resolution=2):
     """
     Using the NetCDF file:
 
     Read with ncdf4 to extract information about the data extent
-    Regrid to rectangular projection using remap
+    Regrid to rectangular projection using the remap lookup tables (computed
+        once per image size and extent, and saved in cache_path), reading
+        only the window of the image covering the extent
     ATTENTION: If the files are from the Operational Mode (starting December
-        2017), remap.py should be altered! (line 15)
+        2017), remap.py should be altered! (SOURCE_PROJ4)
+    resolution: resolution of the rectangular grid in km
     """
 
     print('Reading NetCDF file ' + file)
@@ -81,17 +92,17 @@ def read_define_bounds_netcdf(file, band_conversion, extent):
     # max_lat = float(geo_extent.geospatial_northbound_latitude)
     # extent = [min_lon, min_lat, max_lon, max_lat]
 
-    resolution = 2
-
     # Image extent required for the reprojection
     H = nc.variables['goes_imager_projection'].perspective_point_height
     x1 = nc.variables['x_image_bounds'][0] * H  # x1 = -5434894.885056
     x2 = nc.variables['x_image_bounds'][1] * H  # x2 = 5434894.885056
     y1 = nc.variables['y_image_bounds'][1] * H  # y1 = -5434894.885056
     y2 = nc.variables['y_image_bounds'][0] * H  # y2 = 5434894.885056
-    grid = remap(file, extent, resolution, x1, y1, x2, y2)
+    data = remap_window(nc.variables['CMI'], extent, resolution, x1, y1, x2,
+                        y2, cache_path=cache_path)
+    nc.close()
 
-    data = grid.ReadAsArray() + band_conversion
+    data = data + band_conversion
 
     return data, extent
 
@@ -114,22 +125,22 @@ def plot_save_figure(data, extent, shapefile, grid_spacing, cpt, min_value,
     bmap = Basemap(llcrnrlon=extent[0], llcrnrlat=extent[1],
                    urcrnrlon=extent[2], urcrnrlat=extent[3], epsg=4326)
 
-    bmap.readshapefile(
-        shapefile + 'ne_10m_admin_0_countries', 'ne_10m_admin_0_countries',
-        linewidth=0.5, color='darkslategray'
-    )
-    bmap.readshapefile(
-        shapefile + 'estadosl_2007', 'estadosl_2007', linewidth=0.3,
-        color='darkslategray'
-    )
+    # Clipped, projected and cached once per extent
+    shape_extent = [extent[0], extent[2], extent[1], extent[3]]
+    ax.add_collection(get_shape_collection(
+        shapefile + 'ne_10m_admin_0_countries', extent=shape_extent,
+        projection=bmap, linewidth=0.5, edgecolor='darkslategray'
+    ), autolim=False)
+    ax.add_collection(get_shape_collection(
+        shapefile + 'estadosl_2007', extent=shape_extent, projection=bmap,
+        linewidth=0.3, edgecolor='darkslategray'
+    ), autolim=False)
     bmap.drawparallels(np.arange(-90.0, 90.0, grid_spacing), linewidth=0.25,
                        color='white', labels=[True, False, False, True])
     bmap.drawmeridians(np.arange(0.0, 360.0, grid_spacing), linewidth=0.25,
                        color='white', labels=[True, False, False, True])
 
-    cpt_convert = LinearSegmentedColormap('cpt', cpt)
-
-    bmap.imshow(data, origin='upper', cmap=cpt_convert,
+    bmap.imshow(data, origin='upper', cmap=cpt,
                 vmin=min_value, vmax=max_value)
 
     plt.title(title, weight='bold', stretch='condensed', size='large')
@@ -140,3 +151,39 @@ def plot_save_figure(data, extent, shapefile, grid_spacing, cpt, min_value,
     plt.close()
 
     return '-----------------------------------------------------------------'
+
+
+def process_save_figure(filename, fig_type, extent, shapefile, grid_spacing,
+                        save_path, remap_cache_path=None):
+    """
+    Read, regrid, plot and save one GOES-16 file in one extent (one figure
+    job, see General_Processing/render_functions.py)
+    """
+
+    (unit, conversion, cpt, minvalue, maxvalue, fig_title,
+        fig_name) = get_info_file(filename, fig_type=fig_type)
+    data, extent = read_define_bounds_netcdf(filename, conversion, extent,
+                                             cache_path=remap_cache_path)
+    return plot_save_figure(data, extent, shapefile, grid_spacing, cpt,
+                            minvalue, maxvalue, fig_title, unit,
+                            save_path + fig_name)
+
+
+def init_render_worker(shapefile, extents):
+    """
+    Prepare a render process: shapefile lines of each extent and band
+    colormaps are loaded once (see General_Processing/shapefile_functions.py
+    and colormap_functions.py)
+    """
+
+    for name in COLORTABLES:
+        get_colormap(name)
+
+    for extent in extents:
+        bmap = Basemap(llcrnrlon=extent[0], llcrnrlat=extent[1],
+                       urcrnrlon=extent[2], urcrnrlat=extent[3], epsg=4326)
+        for name in ['ne_10m_admin_0_countries', 'estadosl_2007']:
+            get_shape_segments(
+                shapefile + name,
+                extent=[extent[0], extent[2], extent[1], extent[3]],
+                projection=bmap)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+TESTS OF catalog_functions.py
+
+The catalog is built from empty files with GOES-16 names, in a temporary
+folder. Run with:
+
+    python -m pytest Satellite_Processing/test_catalog_functions.py
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+
+from catalog_functions import update_catalog, read_catalog, find_scenes
+
+# Day 73 of 2017 = 2017-03-14
+NAME = ('OR_ABI-L2-CMIPF-M3C{band:02d}_G16_s2017073{start}_e2017073{end}'
+        '_c2017073{end}.nc')
+
+
+def _goes_name(band, hhmm):
+    start = hhmm + '027'
+    end = hhmm[:2] + '{:02d}'.format(int(hhmm[2:]) + 10) + '394'
+    return NAME.format(band=band, start=start, end=end)
+
+
+class CatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.catalog_file = os.path.join(self.folder, 'catalog.csv')
+        self.pattern = os.path.join(self.folder, '*.nc')
+        for band in [2, 13]:
+            for hhmm in ['1200', '1215', '1230']:
+                self.touch(_goes_name(band, hhmm))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def touch(self, name):
+        with open(os.path.join(self.folder, name), 'w') as f:
+            f.write(name)
+
+    def check_types(self, catalog):
+        for column in ['start', 'end', 'created']:
+            self.assertTrue(
+                pd.api.types.is_datetime64_any_dtype(catalog[column]))
+        for column in ['band', 'mode', 'size']:
+            self.assertTrue(pd.api.types.is_integer_dtype(catalog[column]))
+
+    def test_new_catalog(self):
+        catalog = update_catalog(self.pattern, self.catalog_file)
+
+        self.assertEqual(len(catalog), 6)
+        self.check_types(catalog)
+        self.assertEqual(catalog['start'].iloc[0],
+                         pd.Timestamp('2017-03-14 12:00:02.700'))
+
+        scenes = find_scenes(catalog, ['2017-03-14 12:14', '2017-03-14 13:00'],
+                             band=13)
+        self.assertEqual(len(scenes), 1)
+        self.assertEqual(scenes['filename'][0], _goes_name(13, '1215'))
+        self.assertEqual(scenes['query'][0], 0)
+        self.assertEqual(scenes['dt'][0], pd.Timedelta('62.7s'))
+
+    def test_refreshed_catalog(self):
+        update_catalog(self.pattern, self.catalog_file)
+        # One new scene, one removed
+        self.touch(_goes_name(13, '1245'))
+        os.remove(os.path.join(self.folder, _goes_name(2, '1200')))
+
+        catalog = update_catalog(self.pattern, self.catalog_file)
+        self.assertEqual(len(catalog), 6)
+        self.check_types(catalog)
+        self.assertTrue(catalog['start'].is_monotonic_increasing)
+
+        scenes = find_scenes(catalog, ['2017-03-14 12:45'], band=13,
+                             tolerance='20min')
+        self.assertEqual(list(scenes['filename']),
+                         [_goes_name(13, hhmm) for hhmm in ['1230', '1245']])
+
+        # The same scenes after reading the CSV
+        saved = read_catalog(self.catalog_file)
+        self.check_types(saved)
+        columns = ['filename', 'start', 'time', 'query', 'dt']
+        pd.testing.assert_frame_equal(
+            find_scenes(saved, ['2017-03-14 12:45'], band=13,
+                        tolerance='20min')[columns], scenes[columns],
+            check_dtype=False)
+
+    def test_unchanged_and_empty(self):
+        update_catalog(self.pattern, self.catalog_file)
+        catalog = update_catalog(self.pattern, self.catalog_file)
+        self.assertEqual(len(catalog), 6)
+        self.check_types(catalog)
+
+        empty = update_catalog(os.path.join(self.folder, '*.missing'))
+        self.assertEqual(len(empty), 0)
+        self.check_types(empty)
+        self.assertEqual(len(find_scenes(empty, ['2017-03-14 12:00'])), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+TESTS OF cube_functions.py
+
+Cubes are built from GOES-16 file names only: the remapping reader
+(read_define_bounds_netcdf()) is replaced by a stub returning a field with
+the minute of the scene. Run with:
+
+    python -m pytest Satellite_Processing/test_cube_functions.py
+
+@author: Camila Lopes (camila.lopes@iag.usp.br)
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pd = pytest.importorskip('pandas')
+pytest.importorskip('xarray')
+pytest.importorskip('scipy')
+pytest.importorskip('netCDF4')
+pytest.importorskip('osgeo')
+pytest.importorskip('mpl_toolkits.basemap')
+
+import cube_functions
+from cube_functions import build_cube, open_cube
+from remap import get_remap_coordinates
+from catalog_functions import parse_goes_filename
+
+EXTENT = [-48.0, -24.0, -46.0, -22.0]
+RESOLUTION = 20
+# Day 73 of 2017 = 2017-03-14
+NAME = ('OR_ABI-L2-CMIPF-M3C{band:02d}_G16_s2017073{hhmm}027'
+        '_e2017073{hhmm}394_c2017073{hhmm}394.nc')
+
+
+class StubReader(object):
+    """
+    Stand-in of read_define_bounds_netcdf(): field of the cube grid with
+    200 + minutes since 00:00 of the scene.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, filename, parameter, extent, cache_path=None,
+                 resolution=2):
+        self.calls.append((os.path.basename(filename), resolution))
+        lon, lat = get_remap_coordinates(extent, resolution)
+        start = parse_goes_filename(filename)['start']
+        value = 200.0 + start.hour * 60 + start.minute
+        data = np.ma.masked_array(np.full((lat.size, lon.size), value))
+        data[0, 0] = np.ma.masked
+        return data, None
+
+
+class CubeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cube_file = os.path.join(self.folder, 'tb13.nc')
+        self.reader = StubReader()
+        patcher = mock.patch.object(cube_functions,
+                                    'read_define_bounds_netcdf', self.reader)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def build(self, hhmms, band=13):
+        filenames = [os.path.join(self.folder,
+                                  NAME.format(band=band, hhmm=hhmm))
+                     for hhmm in hhmms]
+        return build_cube(self.cube_file, filenames, EXTENT,
+                          resolution=RESOLUTION)
+
+    def test_build_cube(self):
+        # Out of order, so the cube is sorted by build_cube()
+        self.assertEqual(self.build(['0500', '0015', '0000', '0030']), 4)
+        self.assertTrue(all(resolution == RESOLUTION
+                            for _, resolution in self.reader.calls))
+
+        with open_cube(self.cube_file) as cube:
+            times = cube['time'].to_index()
+            expected = pd.to_datetime(['2017-03-14 00:00:02.7',
+                                       '2017-03-14 00:15:02.7',
+                                       '2017-03-14 00:30:02.7',
+                                       '2017-03-14 05:00:02.7'])
+            self.assertEqual(len(times), len(expected))
+            # Seconds since 1970 as float: equal to the millisecond
+            self.assertTrue((abs(times - expected) <
+                             pd.Timedelta('1ms')).all())
+            lon, lat = get_remap_coordinates(EXTENT, RESOLUTION)
+            self.assertEqual(cube['tb'].shape, (4, lat.size, lon.size))
+            np.testing.assert_allclose(cube['tb'].values[:, -1, -1],
+                                       [200, 215, 230, 500])
+            # Masked pixels are NaN
+            self.assertTrue(np.isnan(cube['tb'].values[:, 0, 0]).all())
+
+    def test_skip_scenes(self):
+        self.assertEqual(self.build(['0000', '0015']), 2)
+        # Scenes already in the cube and of other bands are skipped
+        self.assertEqual(self.build(['0000', '0015', '0030']), 1)
+        self.assertEqual(self.build(['0045'], band=2), 0)
+        self.assertEqual(len(self.reader.calls), 3)
+
+        with open_cube(self.cube_file) as cube:
+            self.assertEqual(cube['time'].size, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()